@@ -248,6 +248,15 @@ export class Infrastructure extends cdk.Stack {
           ? cdk.RemovalPolicy.RETAIN
           : cdk.RemovalPolicy.DESTROY,
         autoDeleteObjects: !isPersistent,
+        lifecycleRules: [
+          {
+            // Because process-events offloads large task payloads here (claim checks) and nothing deletes them once
+            // the task has read them; a week outlasts the stream retention and any task retries
+            id: "expire-claim-checks",
+            prefix: "claim-checks/",
+            expiration: cdk.Duration.days(7),
+          },
+        ],
       }
     );
 
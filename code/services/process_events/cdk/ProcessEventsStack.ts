@@ -1,7 +1,7 @@
 import * as fs from "fs";
 import * as cdk from "aws-cdk-lib";
 import { Construct } from "constructs";
-import { Table } from "aws-cdk-lib/aws-dynamodb";
+import { AttributeType, BillingMode, Table } from "aws-cdk-lib/aws-dynamodb";
 
 import {
   Effect,
@@ -33,6 +33,7 @@ export class ProcessEventsStack extends cdk.Stack {
       eventLogTableStreamArn,
       eventLogTableName,
       auroraSecurityGroupId,
+      privateBucketName,
     } = this.lookUpInfrastructureStackValues(deploymentEnvironment) || {};
 
     const {
@@ -51,6 +52,14 @@ export class ProcessEventsStack extends cdk.Stack {
       eventLogTableArn: eventLogTableArn,
     });
 
+    const idempotencyTable = this.createIdempotencyTable({
+      deploymentEnvironment,
+    });
+
+    const streamFailureQueue = this.createStreamFailureQueue({
+      deploymentEnvironment,
+    });
+
     const processEventsLambda = this.createLambda({
       vpc,
       processTasksSecurityGroupId,
@@ -63,13 +72,22 @@ export class ProcessEventsStack extends cdk.Stack {
       libraryToken,
       eventLogTableName,
       deploymentEnvironment,
+      privateBucketName,
+      idempotencyTableName: idempotencyTable.tableName,
     });
 
     processEventsLambda.addEventSource(
       new cdk.aws_lambda_event_sources.DynamoEventSource(eventLogStreamTable, {
         startingPosition: cdk.aws_lambda.StartingPosition.TRIM_HORIZON,
-        batchSize: 5, // The number of records to send to the function in a single batch
-        retryAttempts: 1, // How many times we retry
+        // Because the handler works through a batch in STREAM_CHUNK_SIZE chunks and reports whatever is left at its
+        // deadline, large batches spread the invocation overhead without risking a timeout
+        batchSize: 500, // The number of records to send to the function in a single batch
+        maxBatchingWindow: cdk.Duration.seconds(1), // Because a quiet stream would otherwise invoke per trickle of records
+        retryAttempts: 5, // How many times we retry; records deferred at the deadline count as a retry too
+        reportBatchItemFailures: true, // Because the handler returns batchItemFailures, only failed records are retried
+        bisectBatchOnError: true, // Because a batch that errors as a whole is split until the failing records are isolated
+        // Because once the retries run out lambda drops the records, their stream positions are sent here to be replayed
+        onFailure: new cdk.aws_lambda_event_sources.SqsDlq(streamFailureQueue),
         // maxRecordAge: cdk.Duration.minutes(10), // Optional: Set max record age
       })
     );
@@ -92,6 +110,8 @@ export class ProcessEventsStack extends cdk.Stack {
     libraryToken,
     eventLogTableName,
     deploymentEnvironment,
+    privateBucketName,
+    idempotencyTableName,
   }) {
     const processEventsLambda = new cdk.aws_lambda.DockerImageFunction(
       this,
@@ -140,6 +160,17 @@ export class ProcessEventsStack extends cdk.Stack {
                 }),
               ],
             }),
+            // because large task payloads are offloaded to the process tasks bucket (claim check)
+            S3Policy: new PolicyDocument({
+              statements: [
+                new PolicyStatement({
+                  effect: Effect.ALLOW,
+                  actions: ["s3:PutObject"],
+                  resources: ["*"],
+                  // resources: [`arn:aws:s3:::${privateBucketName}/claim-checks/*`],
+                }),
+              ],
+            }),
             // because we need the lambda to have permission to write to mysql
             AuroraPolicy: new PolicyDocument({
               statements: [
@@ -207,6 +238,8 @@ export class ProcessEventsStack extends cdk.Stack {
         ),
 
         memorySize: 512,
+        // Because a full batch needs more than the 3 second default; the handler stops ROUTE_DEADLINE_MARGIN_MS early
+        timeout: cdk.Duration.seconds(60),
         reservedConcurrentExecutions: 10,
         environment: {
           PROCESS_TASKS_VPC_SUBNETS: processTasksVpcSubnets,
@@ -218,6 +251,9 @@ export class ProcessEventsStack extends cdk.Stack {
           EVENT_LOG_TABLE_STREAM_ARN: eventLogTableStreamArn,
           EVENT_SOURCE_TABLE_NAME: eventLogTableName,
           DEPLOYMENT_ENVIRONMENT: deploymentEnvironment,
+          PROCESS_TASKS_BUCKET_NAME: privateBucketName,
+          IDEMPOTENCY_TABLE_NAME: idempotencyTableName,
+          STREAM_CHUNK_SIZE: "100",
         },
       }
     );
@@ -225,6 +261,25 @@ export class ProcessEventsStack extends cdk.Stack {
     return processEventsLambda;
   }
 
+  // Because streams deliver at least once, the lambda claims each stream eventID here before processing it
+  createIdempotencyTable({ deploymentEnvironment }) {
+    return new Table(this, `${deploymentEnvironment}-process-events-idempotency`, {
+      partitionKey: { name: "event_id", type: AttributeType.STRING },
+      billingMode: BillingMode.PAY_PER_REQUEST,
+      timeToLiveAttribute: "expires_at",
+      removalPolicy: cdk.RemovalPolicy.DESTROY,
+    });
+  }
+
+  // Because a batch of up to 500 records would otherwise be dropped silently once its retries run out
+  createStreamFailureQueue({ deploymentEnvironment }) {
+    return new cdk.aws_sqs.Queue(this, `${deploymentEnvironment}-process-events-stream-failures`, {
+      retentionPeriod: cdk.Duration.days(14),
+      encryption: cdk.aws_sqs.QueueEncryption.SQS_MANAGED,
+      removalPolicy: cdk.RemovalPolicy.DESTROY,
+    });
+  }
+
   lookupVPC({ vpcId }) {
     return cdk.aws_ec2.Vpc.fromLookup(this, "VPC", {
       vpcId,
@@ -284,6 +339,7 @@ export class ProcessEventsStack extends cdk.Stack {
       eventLogTableStreamArn = "",
       eventLogTableName = "",
       auroraSecurityGroupId = "",
+      privateBucketName = "",
     } = infrastructureOutputs;
 
     if (
@@ -292,7 +348,8 @@ export class ProcessEventsStack extends cdk.Stack {
       !rdsDbClusterArn ||
       !eventLogTableStreamArn ||
       !eventLogTableName ||
-      !auroraSecurityGroupId
+      !auroraSecurityGroupId ||
+      !privateBucketName
     ) {
       console.warn(
         `Something is missing:
@@ -302,6 +359,7 @@ export class ProcessEventsStack extends cdk.Stack {
             - eventLogTableStreamArn: ${eventLogTableStreamArn}
             - eventLogTableName: ${eventLogTableName}
             - auroraSecurityGroupId: ${auroraSecurityGroupId}
+            - privateBucketName: ${privateBucketName}
           `
       );
     }
@@ -313,6 +371,7 @@ export class ProcessEventsStack extends cdk.Stack {
       eventLogTableStreamArn,
       eventLogTableName,
       auroraSecurityGroupId,
+      privateBucketName,
     };
   }
 
@@ -1,45 +1,119 @@
+import time
 from protocol.dynamo_protocol import Dynamo_Stream
-from protocol.event_protocol import Event_Helpers
-from protocol.request_task_protocol import Request_Tasks
-from routes.example_event import process_example_events
+from protocol.event_protocol import route_registry
+from protocol.idempotency_protocol import Idempotency_Guard
 from protocol.aws_protocol import AwsClients
-from protocol.logger_protocol import logger
+from protocol.logger_protocol import flush_logs, log_payload, logger
+from protocol.metrics_protocol import metrics
+from protocol.route_protocol import Route_Executor
+from static.constants import get_read_only_constants
+
+# Because route modules register their event types on import
+import routes.example_event  # noqa: F401
+import routes.task_example  # noqa: F401
 
 
 def handler(event, context):
-    # log incoming data
-    logger.info(f"triggering event: {event}")
-    logger.info(f"context: {context}")
+    try:
+        with metrics.timer("Handler"):
+            return handle_stream_event(event, context)
+    finally:
+        # one EMF document per invocation, written to stdout where lambda ships it to CloudWatch
+        metrics.flush()
+        # Because lambda may freeze the environment as soon as the handler returns
+        flush_logs()
+
+
+def handle_stream_event(event, context):
+    # log incoming data; the full event is large, so only a sampled, size-capped copy is written
+    logger.info("triggering event with %d records", len(event["Records"]))
+    log_payload("triggering event", event)
+    logger.info("context: %s", context)
+    metrics.add_count("StreamRecords", len(event["Records"]))
 
-    # authenticate aws sdks
+    # authenticate aws sdks; clients are only built once a route needs them
     aws_clients = AwsClients.initialize_clients()
 
-    # extract aws clients
-    ecs_client = aws_clients["ecs_client"]
-    event_source_table_client = aws_clients["event_source_table_client"]
-    mysql_client = aws_clients["mysql_client"]
-
-    failures = []
-    # "unpack" the dynamo db records from the input event
-    records = Dynamo_Stream.unpackDynamoValueFromStream(event)
-    inserts = records["inserts"]  # we only process records on inserts
-    updates = records["updates"]  # don't process updates
-    deletes = records["deletes"]  # don't process deletes
-
-    # organize the events
-    source_events_by_type = Event_Helpers.categorize_events_by_event_type(inserts)
-
-    # Something processed in this lambda
-    process_events = source_events_by_type.get("EVENT_EXAMPLE", [])
-    failed_to_process_events = process_example_events(process_events, mysql_client, event_source_table_client)
-
-    # Something processed in a fargate
-    example_events = source_events_by_type.get("TASK_EXAMPLE", [])
-    failed_to_process_task_request = Request_Tasks.request_tasks(
-        example_events,
-        ecs_client,
+    # a large batch is processed in bounded chunks so the handler can stop between them before the lambda deadline
+    constants = get_read_only_constants()
+    deadline = Route_Executor.deadline_from_context(context, constants["ROUTE_DEADLINE_MARGIN_MS"])
+    records = event["Records"]
+    chunk_size = max(1, constants["STREAM_CHUNK_SIZE"])
+    batch_item_failures = []
+    slowest_chunk_seconds = 0.0
+
+    for start in range(0, len(records), chunk_size):
+        if not has_time_for_chunk(deadline, slowest_chunk_seconds):
+            # Because lambda replays from the lowest reported sequence number, the remainder is retried as a whole
+            remainder = records[start:]
+            logger.info("Stopping before the deadline, reporting %d unprocessed records for retry", len(remainder))
+            metrics.add_count("DeferredRecords", len(remainder))
+            batch_item_failures.extend(
+                {"itemIdentifier": record["dynamodb"].get("SequenceNumber")} for record in remainder
+            )
+            break
+
+        started_at = time.monotonic()
+        chunk_event = {"Records": records[start : start + chunk_size]}
+        with metrics.timer("StreamChunk"):
+            chunk_response = process_stream_chunk(chunk_event, context, aws_clients)
+        batch_item_failures.extend(chunk_response["batchItemFailures"])
+        slowest_chunk_seconds = max(slowest_chunk_seconds, time.monotonic() - started_at)
+
+    # Because the mysql client is reused by the next warm invocation, we leave the connection open; the client pings,
+    # recycles or reopens it before its next statement
+
+    # report only the failed records so lambda does not replay the ones that already succeeded
+    metrics.add_count("FailedRecords", len(batch_item_failures))
+    if batch_item_failures:
+        logger.info("Reporting %d failed records for retry", len(batch_item_failures))
+
+    return {"batchItemFailures": batch_item_failures}
+
+
+def process_stream_chunk(event, context, aws_clients):
+    # decode the inserts of registered event types in one pass, grouped by route; updates, deletes and event types
+    # without a route are skipped before they are decoded
+    with metrics.timer("Dispatch"):
+        dispatched = route_registry.dispatch(event)
+
+    # build only the clients this batch needs, e.g. a batch of task requests never connects to aurora
+    required_clients = route_registry.required_clients(dispatched["source_events_by_type"])
+    if dispatched["source_events"]:
+        required_clients.append("idempotency_table_client")
+    with metrics.timer("Prefetch"):
+        aws_clients.prefetch(required_clients)
+
+    # streams deliver at least once, so records a previous attempt already processed skip aurora and ecs entirely
+    idempotency_guard = Idempotency_Guard.shared()
+    idempotency_table = aws_clients["idempotency_table_client"] if dispatched["source_events"] else None
+    claims = idempotency_guard.claim(
+        dispatched["source_events"], dispatched["event_ids"], idempotency_table, claim_expires_at(context)
     )
-    failures.extend(failed_to_process_task_request)
+    source_events_by_type = Idempotency_Guard.keep_claimed(dispatched["source_events_by_type"], claims["claimed"])
+
+    # the routes share no data, so they run concurrently within the lambda deadline
+    routes = route_registry.build_routes(source_events_by_type, aws_clients)
+    route_executor = Route_Executor(context)
+    with metrics.timer("Routes"):
+        failures = route_executor.run(routes)
+    idempotency_guard.settle(claims, failures, idempotency_table, route_executor.unfinished)
+    # Because another invocation still holds these, they are retried once its claim is settled or lapses
+    failures.extend(claims["in_progress"])
+
+    return Dynamo_Stream.batch_item_failures(failures, dispatched["source_events"], dispatched["sequence_numbers"])
+
+
+def has_time_for_chunk(deadline, slowest_chunk_seconds):
+    # Because a chunk that starts without the time the slowest one so far took would likely be cut off part way
+    if deadline is None:
+        return True
+    return deadline - time.monotonic() > slowest_chunk_seconds
+
 
-    # close connection
-    mysql_client.close_connection()
+def claim_expires_at(context):
+    # Because a claim must not outlive the invocation that holds it, it lapses at the lambda deadline
+    get_remaining_time_in_millis = getattr(context, "get_remaining_time_in_millis", None)
+    if not callable(get_remaining_time_in_millis):
+        return None
+    return time.time() + get_remaining_time_in_millis() / 1000
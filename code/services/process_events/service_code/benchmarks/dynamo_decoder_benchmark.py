@@ -0,0 +1,53 @@
+"""
+Compare the previous per-record TypeDeserializer path against Dynamo_Decoder on synthetic stream batches.
+
+Run from service_code: `python3 -m benchmarks.dynamo_decoder_benchmark --batch-size 500 --repeat 20`
+"""
+
+import argparse
+import json
+import timeit
+from decimal import Decimal
+from boto3.dynamodb.types import TypeDeserializer
+from protocol.dynamo_protocol import Dynamo_Decoder
+from benchmarks.synthetic_stream import build_stream_event
+
+
+def legacy_un_marshall_dynamodb_item(dynamodb_item):
+    # Because this is the decoder Dynamo_Stream used before Dynamo_Decoder, kept here as the baseline
+    deserializer = TypeDeserializer()
+    return {
+        key: (
+            str(deserializer.deserialize(value))
+            if isinstance(deserializer.deserialize(value), Decimal)
+            else deserializer.deserialize(value)
+        )
+        for key, value in dynamodb_item.items()
+    }
+
+
+def run(batch_size: int, repeat: int):
+    images = [record["dynamodb"]["NewImage"] for record in build_stream_event(batch_size)["Records"]]
+    candidates = {
+        "legacy_type_deserializer": lambda: [legacy_un_marshall_dynamodb_item(image) for image in images],
+        "decoder_str": lambda: [Dynamo_Decoder.shared("str").decode_item(image) for image in images],
+        "decoder_decimal": lambda: [Dynamo_Decoder.shared("decimal").decode_item(image) for image in images],
+        "decoder_projection": lambda: [
+            Dynamo_Decoder.shared("str", ("event_type", "message")).decode_item(image) for image in images
+        ],
+    }
+
+    results = {}
+    for name, candidate in candidates.items():
+        best = min(timeit.repeat(candidate, number=1, repeat=repeat))
+        results[name] = {"seconds_per_batch": best, "records_per_second": batch_size / best}
+
+    return {"batch_size": batch_size, "repeat": repeat, "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(run(args.batch_size, args.repeat), indent=2))
@@ -0,0 +1,295 @@
+"""
+Measure `app.handler` throughput on synthetic stream batches against local stand-ins for Aurora, DynamoDB, ECS and S3.
+
+Each stand-in sleeps for a configurable latency instead of calling AWS, so runs are offline and repeatable. The result
+is printed (and optionally written) as JSON so it can be compared between releases.
+
+Run from service_code:
+    `python3 -m benchmarks.handler_benchmark --batch-size 100 --invocations 50 --mix EVENT_EXAMPLE=3,TASK_EXAMPLE=1`
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import statistics
+import threading
+import time
+from contextlib import contextmanager, redirect_stdout
+from typing import Any, Dict, List, Optional
+from unittest.mock import patch
+from benchmarks.synthetic_stream import build_stream_event
+
+# Because the production ECS rate limit would dominate the measurement; pass --env to benchmark it instead
+DEFAULT_ENVIRONMENT = {
+    "PROCESS_TASKS_CLUSTER_NAME": "benchmark-cluster",
+    "PROCESS_TASKS_CONTAINER_NAME": "benchmark-container",
+    "PROCESS_TASKS_BUCKET_NAME": "benchmark-bucket",
+    "ECS_RUN_TASK_RATE_PER_SECOND": "100000",
+}
+
+DEFAULT_LATENCY_MS = {"aurora": 5.0, "aurora_per_row": 0.05, "dynamo": 8.0, "ecs": 40.0, "s3": 20.0}
+
+
+class Stage_Timer:
+    """
+    Accumulates wall time per stage across threads. Stand-in stages overlap when routes run concurrently, so their
+    totals can exceed the handler latency.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.seconds: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_seconds = time.perf_counter() - started_at
+            with self._lock:
+                self.seconds[name] = self.seconds.get(name, 0.0) + elapsed_seconds
+                self.calls[name] = self.calls.get(name, 0) + 1
+
+    def timed(self, name: str, function):
+        def wrapper(*args, **kwargs):
+            with self.stage(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    def reset(self):
+        with self._lock:
+            self.seconds = {}
+            self.calls = {}
+
+
+class Stand_In_Aurora:
+    def __init__(self, timer: Stage_Timer, latency_ms: float, per_row_latency_ms: float):
+        self.timer = timer
+        self.latency_ms = latency_ms
+        self.per_row_latency_ms = per_row_latency_ms
+
+    def save_records(self, table_name, records, max_rows_per_chunk=500):
+        with self.timer.stage("aurora"):
+            for start in range(0, len(records), max_rows_per_chunk):
+                chunk_rows = len(records[start : start + max_rows_per_chunk])
+                time.sleep((self.latency_ms + self.per_row_latency_ms * chunk_rows) / 1000)
+        return []
+
+
+class Stand_In_Dynamo_Table:
+    name = "benchmark-event-source"
+    key_schema = [{"AttributeName": "partition"}, {"AttributeName": "sort"}]
+
+    def __init__(self, timer: Stage_Timer, latency_ms: float):
+        self.timer = timer
+        self.latency_ms = latency_ms
+        # Because Dynamo_Batch_Writer calls table.meta.client.batch_write_item
+        self.meta = self
+        self.client = self
+
+    def batch_write_item(self, RequestItems):
+        with self.timer.stage("dynamo"):
+            time.sleep(self.latency_ms / 1000)
+        return {"UnprocessedItems": {}}
+
+
+class Stand_In_Idempotency_Table(Stand_In_Dynamo_Table):
+    name = "benchmark-idempotency"
+    key_schema = [{"AttributeName": "event_id"}]
+
+    def put_item(self, **kwargs):
+        # Because synthetic event IDs are unique per invocation, every conditional claim succeeds
+        with self.timer.stage("idempotency"):
+            time.sleep(self.latency_ms / 1000)
+        return {}
+
+
+class Stand_In_Ecs:
+    def __init__(self, timer: Stage_Timer, latency_ms: float):
+        self.timer = timer
+        self.latency_ms = latency_ms
+
+    def run_task(self, **kwargs):
+        with self.timer.stage("ecs"):
+            time.sleep(self.latency_ms / 1000)
+        return {"tasks": [{"taskArn": "arn:aws:ecs:benchmark"}], "failures": []}
+
+
+class Stand_In_S3:
+    def __init__(self, timer: Stage_Timer, latency_ms: float):
+        self.timer = timer
+        self.latency_ms = latency_ms
+
+    def put_object(self, **kwargs):
+        with self.timer.stage("s3"):
+            time.sleep(self.latency_ms / 1000)
+        return {}
+
+
+class Stand_In_Clients(dict):
+    """
+    Dict of stand-in clients with the `prefetch` hook of Lazy_Aws_Clients.
+    """
+
+    def __init__(self, timer: Stage_Timer, **clients):
+        super().__init__(**clients)
+        self.timer = timer
+
+    def prefetch(self, names):
+        return None
+
+
+class Benchmark_Context:
+    def __init__(self, timeout_ms: float):
+        self.deadline = time.monotonic() + timeout_ms / 1000
+
+    def get_remaining_time_in_millis(self):
+        return max(0, int((self.deadline - time.monotonic()) * 1000))
+
+
+def percentile(values: List[float], percent: float) -> float:
+    # Because nearest-rank keeps the reported value one that was actually observed
+    ordered = sorted(values)
+    rank = max(1, math.ceil(percent / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def run(
+    batch_size: int = 100,
+    invocations: int = 20,
+    warmup: int = 2,
+    event_type_mix: Optional[Dict[str, float]] = None,
+    event_name_mix: Optional[Dict[str, float]] = None,
+    latency_ms: Optional[Dict[str, float]] = None,
+    environment: Optional[Dict[str, str]] = None,
+    timeout_ms: float = 900000,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    latency_ms = {**DEFAULT_LATENCY_MS, **(latency_ms or {})}
+    environment = {**DEFAULT_ENVIRONMENT, **(environment or {})}
+
+    with patch.dict(os.environ, environment):
+        import app
+        from protocol.dynamo_protocol import Dynamo_Stream
+        from protocol.route_protocol import Route_Executor
+
+        timer = Stage_Timer()
+        clients = Stand_In_Clients(
+            timer,
+            mysql_client=Stand_In_Aurora(timer, latency_ms["aurora"], latency_ms["aurora_per_row"]),
+            event_source_table_client=Stand_In_Dynamo_Table(timer, latency_ms["dynamo"]),
+            idempotency_table_client=Stand_In_Idempotency_Table(timer, latency_ms["dynamo"]),
+            ecs_client=Stand_In_Ecs(timer, latency_ms["ecs"]),
+            s3_client=Stand_In_S3(timer, latency_ms["s3"]),
+        )
+
+        stage_patches = [
+            patch.object(app.AwsClients, "initialize_clients", return_value=clients),
+            patch.object(app.route_registry, "dispatch", timer.timed("dispatch", app.route_registry.dispatch)),
+            patch.object(clients, "prefetch", timer.timed("prefetch", clients.prefetch)),
+            patch.object(Route_Executor, "run", timer.timed("routes", Route_Executor.run)),
+            patch.object(
+                Dynamo_Stream, "batch_item_failures", timer.timed("response", Dynamo_Stream.batch_item_failures)
+            ),
+        ]
+        for stage_patch in stage_patches:
+            stage_patch.start()
+
+        latencies = []
+        stage_seconds: Dict[str, List[float]] = {}
+        reported_failures = 0
+        # Because the handler writes its EMF metrics to stdout, which is where the benchmark prints its result
+        devnull = open(os.devnull, "w")
+        try:
+            for invocation in range(warmup + invocations):
+                stream_event = build_stream_event(batch_size, event_type_mix, event_name_mix, seed + invocation)
+                timer.reset()
+                started_at = time.perf_counter()
+                with redirect_stdout(devnull):
+                    response = app.handler(stream_event, Benchmark_Context(timeout_ms))
+                elapsed_seconds = time.perf_counter() - started_at
+                if invocation < warmup:
+                    continue
+
+                latencies.append(elapsed_seconds)
+                reported_failures += len(response["batchItemFailures"])
+                for name, seconds in timer.seconds.items():
+                    stage_seconds.setdefault(name, []).append(seconds)
+        finally:
+            devnull.close()
+            for stage_patch in reversed(stage_patches):
+                stage_patch.stop()
+
+    total_seconds = sum(latencies)
+    return {
+        "config": {
+            "batch_size": batch_size,
+            "invocations": invocations,
+            "warmup": warmup,
+            "event_type_mix": event_type_mix,
+            "event_name_mix": event_name_mix,
+            "latency_ms": latency_ms,
+            "seed": seed,
+        },
+        "records_per_second": batch_size * invocations / total_seconds if total_seconds else None,
+        "reported_failures": reported_failures,
+        "handler_latency_ms": {
+            "mean": statistics.mean(latencies) * 1000,
+            "p50": percentile(latencies, 50) * 1000,
+            "p95": percentile(latencies, 95) * 1000,
+            "p99": percentile(latencies, 99) * 1000,
+            "max": max(latencies) * 1000,
+        },
+        # Because stages an invocation never entered count as zero rather than being left out of the mean
+        "stage_ms_per_invocation": {
+            name: sum(seconds) / invocations * 1000 for name, seconds in sorted(stage_seconds.items())
+        },
+    }
+
+
+def parse_pairs(raw: Optional[str], value_type=float) -> Optional[Dict[str, Any]]:
+    if not raw:
+        return None
+    pairs = (pair.split("=", 1) for pair in raw.split(",") if pair)
+    return {key.strip(): value_type(value) for key, value in pairs}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--invocations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--mix", help="event_type weights, e.g. EVENT_EXAMPLE=3,TASK_EXAMPLE=1")
+    parser.add_argument("--event-names", help="eventName weights, e.g. INSERT=8,MODIFY=1,REMOVE=1")
+    parser.add_argument("--latency-ms", help=f"stand-in latencies, defaults {DEFAULT_LATENCY_MS}")
+    parser.add_argument("--env", help="environment overrides, e.g. TASK_BATCH_SIZE=10,ECS_RUN_TASK_MAX_WORKERS=4")
+    parser.add_argument("--timeout-ms", type=float, default=900000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the JSON result to this path")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    # Because the handler logs every event it receives, which would be measured along with it
+    logging.getLogger("Run-Lambda").setLevel(args.log_level)
+
+    result = run(
+        batch_size=args.batch_size,
+        invocations=args.invocations,
+        warmup=args.warmup,
+        event_type_mix=parse_pairs(args.mix),
+        event_name_mix=parse_pairs(args.event_names),
+        latency_ms=parse_pairs(args.latency_ms),
+        environment=parse_pairs(args.env, str),
+        timeout_ms=args.timeout_ms,
+        seed=args.seed,
+    )
+    serialized = json.dumps(result, indent=2)
+    print(serialized)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(serialized + "\n")
@@ -0,0 +1,94 @@
+"""
+Measure cold-start import cost of a service entry point and fail when it exceeds the startup budget.
+
+Each run starts a fresh interpreter with `-X importtime`, so the numbers include everything the module pulls in at
+init. Run from service_code:
+
+    python3 -m benchmarks.import_time_benchmark --budget-ms 150
+    python3 -m benchmarks.import_time_benchmark --service-path ../../process_tasks/service_code --module process_task
+
+Exits with status 1 when the median init time is over budget or a deferred module is imported at init.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List
+
+SERVICE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Because these are only needed on specific code paths or by type checkers, importing them at init is a regression
+DEFERRED_PACKAGES = ("boto3", "botocore", "mysql", "mypy_boto3_dynamodb", "mypy_boto3_ecs", "cryptography")
+
+MEASURE_SCRIPT = (
+    "import sys, time\n"
+    "started_at = time.perf_counter()\n"
+    "import {module}\n"
+    "elapsed = time.perf_counter() - started_at\n"
+    "sys.stdout.write(str(elapsed))\n"
+)
+
+
+def run_once(service_path: str, module: str) -> Dict:
+    environment = dict(os.environ, PYTHONPATH=service_path, PYTHONDONTWRITEBYTECODE="")
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", MEASURE_SCRIPT.format(module=module)],
+        cwd=service_path,
+        env=environment,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return {"wall_ms": float(completed.stdout) * 1000, "imports": parse_importtime(completed.stderr)}
+
+
+def parse_importtime(stderr: str) -> List[Dict]:
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        imports.append({"module": name.strip(), "self_us": int(self_us), "cumulative_us": int(cumulative_us)})
+    return imports
+
+
+def self_time_by_package(imports: List[Dict]) -> Dict[str, float]:
+    totals: Dict[str, float] = defaultdict(float)
+    for entry in imports:
+        totals[entry["module"].split(".")[0]] += entry["self_us"] / 1000
+    return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+
+def measure(service_path: str = SERVICE_PATH, module: str = "app", repeat: int = 5, top: int = 15) -> Dict:
+    runs = [run_once(service_path, module) for _ in range(repeat)]
+    last_imports = runs[-1]["imports"]
+    loaded_packages = {entry["module"].split(".")[0] for entry in last_imports}
+
+    return {
+        "module": module,
+        "repeat": repeat,
+        "wall_ms_median": statistics.median(run["wall_ms"] for run in runs),
+        "wall_ms_max": max(run["wall_ms"] for run in runs),
+        "import_count": len(last_imports),
+        "self_ms_by_package": dict(list(self_time_by_package(last_imports).items())[:top]),
+        "deferred_packages_loaded": sorted(loaded_packages.intersection(DEFERRED_PACKAGES)),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--service-path", default=SERVICE_PATH)
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--budget-ms", type=float, default=150)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    result = measure(os.path.abspath(args.service_path), args.module, args.repeat, args.top)
+    result["budget_ms"] = args.budget_ms
+    result["within_budget"] = result["wall_ms_median"] <= args.budget_ms and not result["deferred_packages_loaded"]
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result["within_budget"] else 1)
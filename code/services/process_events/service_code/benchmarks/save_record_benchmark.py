@@ -0,0 +1,103 @@
+"""
+Compare per-row `AuroraMysql.save_record` latency with the previous unprepared path, against a real MySQL server.
+
+Statement parsing happens on the server, so unlike the handler benchmark this needs a database; a local one is enough:
+    `docker run --rm -e MYSQL_ROOT_PASSWORD=benchmark -e MYSQL_DATABASE=benchmark -p 3306:3306 mysql:8.0`
+
+Run from service_code (add --use-pure to measure the pure Python connector instead of the C extension):
+    `python3 -m benchmarks.save_record_benchmark --rows 2000 --password benchmark`
+
+Each candidate inserts `--rows` rows into its own scratch table, which is dropped afterwards.
+"""
+
+import argparse
+import json
+import time
+from benchmarks.handler_benchmark import percentile
+from protocol.mysql_protocol import AuroraMysql
+
+TABLE_DEFINITION = "(id BIGINT PRIMARY KEY, event_type VARCHAR(64), message VARCHAR(255), created_at BIGINT)"
+
+
+class Stand_In_Secrets_Manager:
+    """
+    Hands AuroraMysql the connection settings from the command line in place of Secrets Manager.
+    """
+
+    def __init__(self, host: str, port: int, user: str, password: str, database: str):
+        self.secret = {"host": host, "port": port, "username": user, "password": password, "dbname": database}
+
+    def get_secret_value(self, SecretId):
+        return {"SecretString": json.dumps(self.secret)}
+
+
+def legacy_save_record(aurora: AuroraMysql, table_name: str, record):
+    # Because this is how save_record built and sent each INSERT before the statement cache, kept as the baseline
+    columns = ", ".join(record.keys())
+    values_placeholder = ", ".join(["%s"] * len(record))
+    sql = f"INSERT INTO {table_name} ({columns}) VALUES ({values_placeholder})"
+
+    aurora.ensure_connection()
+    aurora.cursor.execute(sql, tuple(record.values()))
+    aurora.connection.commit()
+
+
+def build_record(index: int):
+    return {"id": index, "event_type": "EVENT_EXAMPLE", "message": f"benchmark message {index}", "created_at": index}
+
+
+def run(rows: int, secrets_manager_client, use_pure: bool = False):
+    aurora = AuroraMysql(
+        {"DEPLOYMENT_ENVIRONMENT": "benchmark", "MYSQL_USE_PURE": "true" if use_pure else ""}, secrets_manager_client
+    )
+    # Because the C extension is only used when it is installed, report which connector actually ran
+    connector = type(aurora.connection).__name__
+    candidates = {
+        "unprepared_per_call_sql": lambda table_name, record: legacy_save_record(aurora, table_name, record),
+        "cached_prepared_statement": aurora.save_record,
+    }
+
+    results = {}
+    try:
+        for name, save in candidates.items():
+            table_name = f"save_record_benchmark_{name}"
+            aurora.cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
+            aurora.cursor.execute(f"CREATE TABLE {table_name} {TABLE_DEFINITION}")
+
+            latencies_ms = []
+            started_at = time.perf_counter()
+            for index in range(rows):
+                record = build_record(index)
+                row_started_at = time.perf_counter()
+                save(table_name, record)
+                latencies_ms.append((time.perf_counter() - row_started_at) * 1000)
+            elapsed_seconds = time.perf_counter() - started_at
+
+            aurora.cursor.execute(f"DROP TABLE {table_name}")
+            results[name] = {
+                "rows_per_second": rows / elapsed_seconds,
+                "row_latency_ms": {
+                    "p50": percentile(latencies_ms, 50),
+                    "p95": percentile(latencies_ms, 95),
+                    "p99": percentile(latencies_ms, 99),
+                },
+            }
+    finally:
+        aurora.close_connection()
+
+    return {"rows": rows, "connector": connector, "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3306)
+    parser.add_argument("--user", default="root")
+    parser.add_argument("--password", default="")
+    parser.add_argument("--database", default="benchmark")
+    parser.add_argument("--use-pure", action="store_true")
+    args = parser.parse_args()
+
+    secrets = Stand_In_Secrets_Manager(args.host, args.port, args.user, args.password, args.database)
+    print(json.dumps(run(args.rows, secrets, args.use_pure), indent=2))
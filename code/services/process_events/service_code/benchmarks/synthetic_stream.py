@@ -0,0 +1,78 @@
+import random
+import string
+from typing import Any, Dict, List, Optional
+
+
+def _random_text(randomizer: random.Random, length: int) -> str:
+    return "".join(randomizer.choices(string.ascii_letters, k=length))
+
+
+def build_new_image(randomizer: random.Random, event_type: str, sequence: int) -> Dict[str, Any]:
+    return {
+        "partition": {"S": f"partition-{sequence}"},
+        "sort": {"S": f"sort-{sequence}"},
+        "event_type": {"S": event_type},
+        "message": {"S": _random_text(randomizer, 64)},
+        "attempt": {"N": str(randomizer.randint(0, 10))},
+        "amount": {"N": f"{randomizer.uniform(0, 10_000):.2f}"},
+        "is_test": {"BOOL": randomizer.random() < 0.5},
+        "note": {"NULL": True},
+        "tags": {"SS": [_random_text(randomizer, 8) for _ in range(3)]},
+        "metadata": {
+            "M": {
+                "source": {"S": "synthetic"},
+                "version": {"N": "3"},
+                "steps": {"L": [{"S": _random_text(randomizer, 6)}, {"N": str(sequence)}]},
+            }
+        },
+    }
+
+
+def build_stream_event(
+    batch_size: int,
+    event_type_mix: Optional[Dict[str, float]] = None,
+    event_name_mix: Optional[Dict[str, float]] = None,
+    seed: int = 0,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Build a synthetic DynamoDB stream event shaped like the payload lambda receives.
+
+    Args:
+        batch_size (int): Number of stream records.
+        event_type_mix (dict): Relative weights per `event_type`, e.g. {"EVENT_EXAMPLE": 1, "TASK_EXAMPLE": 1}.
+        event_name_mix (dict): Relative weights per stream `eventName`, defaults to inserts only.
+        seed (int): Seed so that runs are reproducible.
+    """
+    randomizer = random.Random(seed)
+    event_type_mix = event_type_mix or {"EVENT_EXAMPLE": 1.0, "TASK_EXAMPLE": 1.0}
+    event_name_mix = event_name_mix or {"INSERT": 1.0}
+    event_types = randomizer.choices(list(event_type_mix), weights=list(event_type_mix.values()), k=batch_size)
+    event_names = randomizer.choices(list(event_name_mix), weights=list(event_name_mix.values()), k=batch_size)
+
+    records = []
+    for sequence, (event_type, event_name) in enumerate(zip(event_types, event_names)):
+        new_image = build_new_image(randomizer, event_type, sequence)
+        dynamodb = {
+            "Keys": {"partition": new_image["partition"], "sort": new_image["sort"]},
+            "SequenceNumber": str(100_000 + sequence),
+            "SizeBytes": 256,
+            "StreamViewType": "NEW_AND_OLD_IMAGES",
+        }
+        if event_name != "REMOVE":
+            dynamodb["NewImage"] = new_image
+        if event_name != "INSERT":
+            dynamodb["OldImage"] = new_image
+
+        records.append(
+            {
+                "eventID": f"event-{seed}-{sequence}",
+                "eventName": event_name,
+                "eventVersion": "1.1",
+                "eventSource": "aws:dynamodb",
+                "awsRegion": "us-west-2",
+                "dynamodb": dynamodb,
+                "eventSourceARN": "arn:aws:dynamodb:us-west-2:account-id:table/synthetic/stream",
+            }
+        )
+
+    return {"Records": records}
@@ -1,44 +1,151 @@
-import boto3
-from protocol.mysql_protocol import AuroraMysql
-from static.types import AwsClientsDict
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Optional
+from protocol.logger_protocol import logger
+from protocol.metrics_protocol import metrics
 from static.constants import get_read_only_constants
-from typing import Optional
 
-aws_clients: Optional[AwsClientsDict] = None
+aws_clients: Optional["Lazy_Aws_Clients"] = None
 
+# Because clients are built in dependency order, these are created on the calling thread in this order
+CLIENT_BUILD_ORDER = (
+    "secrets_manager_client",
+    "dynamo_client",
+    "event_source_table_client",
+    "idempotency_table_client",
+    "ecs_client",
+    "s3_client",
+)
+# Because these spend their time on the network (secret fetch, TLS and auth handshake), they are built in the background
+BACKGROUND_CLIENTS = ("mysql_client",)
 
+
+class Lazy_Aws_Clients:
+    """
+    Dict-like holder that builds each client the first time it is read, e.g. `aws_clients["ecs_client"]`.
+
+    `prefetch` builds the clients a batch needs up front: network-bound clients (Aurora) start in a background thread
+    while the others are built on the calling thread. Each client is built once behind a future of its own, so only
+    callers of a client that is still being built wait for it. The build time of every client is logged.
+    """
+
+    _executor: Optional[ThreadPoolExecutor] = None
+
+    def __init__(self, constants):
+        self.constants = constants
+        self._clients: Dict[str, Any] = {}
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._factories: Dict[str, Callable[[], Any]] = {
+            "dynamo_client": lambda: AwsClients.dynamo_client(constants),
+            "event_source_table_client": lambda: AwsClients.event_source_table_client(constants, self["dynamo_client"]),
+            "idempotency_table_client": lambda: AwsClients.idempotency_table_client(constants, self),
+            "ecs_client": lambda: AwsClients.ecs_client(constants),
+            "s3_client": lambda: AwsClients.s3_client(constants),
+            "secrets_manager_client": lambda: AwsClients.secret_manager_client(constants),
+            "mysql_client": lambda: AwsClients.mysql_client(constants, self["secrets_manager_client"]),
+        }
+
+    def __getitem__(self, name: str):
+        with self._lock:
+            if name in self._clients:
+                return self._clients[name]
+        future, is_owner = self._claim_build(name)
+        if is_owner:
+            self._build_into(name, future)
+        # Because the lock is not held while a client builds, lookups of other clients are not held up by it
+        return future.result()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._factories
+
+    def is_initialized(self, name: str) -> bool:
+        return name in self._clients
+
+    def get(self, name: str, default=None):
+        return self[name] if name in self._factories else default
+
+    def prefetch(self, names: Iterable[str]):
+        names = set(names)
+        if "mysql_client" in names:
+            names.add("secrets_manager_client")
+
+        for name in CLIENT_BUILD_ORDER:
+            if name in names:
+                self[name]
+            # Because the secrets manager client is built first, Aurora can start connecting right away
+            if name == "secrets_manager_client":
+                for background_name in BACKGROUND_CLIENTS:
+                    if background_name in names:
+                        self._build_in_background(background_name)
+
+    def _build_in_background(self, name: str):
+        future, is_owner = self._claim_build(name)
+        if not is_owner:
+            return
+        with self._lock:
+            if Lazy_Aws_Clients._executor is None:
+                Lazy_Aws_Clients._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="aws-clients")
+        Lazy_Aws_Clients._executor.submit(self._build_into, name, future)
+
+    def _claim_build(self, name: str):
+        # Returns the future the client lands in, and whether the caller is the one that has to build it
+        with self._lock:
+            if name in self._clients:
+                future: Future = Future()
+                future.set_result(self._clients[name])
+                return future, False
+            if name in self._pending:
+                return self._pending[name], False
+            self._pending[name] = Future()
+            return self._pending[name], True
+
+    def _build_into(self, name: str, future: Future):
+        try:
+            client = self._build(name)
+        except BaseException as e:
+            # Because a failed build is retried by the next lookup rather than cached
+            with self._lock:
+                self._pending.pop(name, None)
+            future.set_exception(e)
+            return
+        with self._lock:
+            self._clients[name] = client
+            self._pending.pop(name, None)
+        future.set_result(client)
+
+    def _build(self, name: str):
+        started_at = time.perf_counter()
+        client = self._factories[name]()
+        elapsed_ms = (time.perf_counter() - started_at) * 1000
+        logger.info(f"Initialized {name} in {elapsed_ms:.1f}ms")
+        metrics.put_timing(f"ClientSetup.{name}", elapsed_ms)
+        return client
+
+
+# Because boto3 and mysql.connector dominate cold start, each factory imports them only when it builds a client
 class AwsClients:
     @staticmethod
     # We want to maintain a connection across multiple invocations so we save them to a global variable if they are not present
     # We set global inside handler because of the limitations of python testing: cannot set globals before tests execute
-    def initialize_clients():
+    def initialize_clients() -> Lazy_Aws_Clients:
         # use preset global value from previous invocation
         global aws_clients
         if aws_clients:
             return aws_clients
 
-        # otherwise, initialize necessary clients
+        # otherwise, prepare the clients; each one is built the first time it is used
         constants = get_read_only_constants()
-        dynamo_client = AwsClients.dynamo_client(constants)
-        event_source_table_client = AwsClients.event_source_table_client(constants, dynamo_client)
-        ecs_client = AwsClients.ecs_client(constants)
-        secrets_manager_client = AwsClients.secret_manager_client(constants)
-        mysql_client = AwsClients.mysql_client(constants, secrets_manager_client)
-
-        # set the global value for use next time
-        aws_clients = {
-            "dynamo_client": dynamo_client,
-            "event_source_table_client": event_source_table_client,
-            "ecs_client": ecs_client,
-            "secrets_manager_client": secrets_manager_client,
-            "mysql_client": mysql_client,
-        }
+        aws_clients = Lazy_Aws_Clients(constants)
 
         return aws_clients
 
     #
     @staticmethod
     def dynamo_client(constants):
+        import boto3
+
         aws_region = constants["AWS_REGION"]
         return boto3.resource("dynamodb", region_name=aws_region)
 
@@ -47,16 +154,37 @@ class AwsClients:
         event_source_table_client_name = constants["EVENT_SOURCE_TABLE_NAME"]
         return dynamo_client.Table(event_source_table_client_name)
 
+    @staticmethod
+    def idempotency_table_client(constants, aws_clients):
+        # Because deduplication falls back to the in-process cache when no table is configured
+        idempotency_table_name = constants["IDEMPOTENCY_TABLE_NAME"]
+        if not idempotency_table_name:
+            return None
+        return aws_clients["dynamo_client"].Table(idempotency_table_name)
+
     @staticmethod
     def ecs_client(constants):
+        import boto3
+
         aws_region = constants["AWS_REGION"]
         return boto3.client("ecs", region_name=aws_region)
 
     @staticmethod
     def secret_manager_client(constants):
+        import boto3
+
         aws_region = constants["AWS_REGION"]
         return boto3.client("secretsmanager", region_name=aws_region)
 
+    @staticmethod
+    def s3_client(constants):
+        import boto3
+
+        aws_region = constants["AWS_REGION"]
+        return boto3.client("s3", region_name=aws_region)
+
     @staticmethod
     def mysql_client(constants, secrets_manager_client):
+        from protocol.mysql_protocol import AuroraMysql
+
         return AuroraMysql(constants, secrets_manager_client)
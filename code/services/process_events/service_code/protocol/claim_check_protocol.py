@@ -0,0 +1,54 @@
+import gzip
+import json
+import uuid
+from typing import Any, Dict
+from protocol.aws_protocol import AwsClients
+from protocol.logger_protocol import logger
+from protocol.metrics_protocol import metrics
+from static.constants import get_read_only_constants
+
+# Because process_tasks recognizes an offloaded payload by this key (see helpers/parse_source_event.py)
+CLAIM_CHECK_KEY = "claim_check"
+
+
+class Claim_Check:
+    @staticmethod
+    def get_s3_client():
+        # Because pack runs on the run-task threads and boto3's default session is not thread-safe, the client comes
+        # from the shared holder, which builds it once under its lock; the task route prefetches it before they start
+        return AwsClients.initialize_clients()["s3_client"]
+
+    @staticmethod
+    def pack(serialized_payload: str, event_type: str) -> str:
+        """
+        Return the value to pass to the task: the payload itself when it is small, otherwise a pointer to a gzip
+        compressed copy written to the process_tasks bucket.
+
+        :param serialized_payload: JSON payload destined for a container environment override.
+        :param event_type: Used to group offloaded payloads under a readable key prefix.
+        """
+        constants = get_read_only_constants()
+        payload_bytes = serialized_payload.encode("utf-8")
+        if len(payload_bytes) <= constants["CLAIM_CHECK_THRESHOLD_BYTES"]:
+            return serialized_payload
+
+        bucket_name = constants["PROCESS_TASKS_BUCKET_NAME"]
+        if not bucket_name:
+            raise Exception("Payload exceeds the claim check threshold but PROCESS_TASKS_BUCKET_NAME is not set")
+
+        key = f"claim-checks/{event_type}/{uuid.uuid4()}.json.gz"
+        body = gzip.compress(payload_bytes, compresslevel=6)
+        with metrics.timer("ClaimCheckPut"):
+            Claim_Check.get_s3_client().put_object(
+                Bucket=bucket_name,
+                Key=key,
+                Body=body,
+                ContentType="application/json",
+                ContentEncoding="gzip",
+            )
+        logger.info(f"Offloaded {len(payload_bytes)} byte payload to s3://{bucket_name}/{key}")
+
+        pointer: Dict[str, Any] = {
+            CLAIM_CHECK_KEY: {"bucket": bucket_name, "key": key, "compression": "gzip", "size": len(payload_bytes)}
+        }
+        return json.dumps(pointer)
@@ -1,55 +1,414 @@
-from boto3.dynamodb.types import TypeDeserializer
-from decimal import Decimal
+import base64
+import random
+import time
+from collections.abc import Mapping
+from decimal import Clamped, Context, Inexact, Overflow, Rounded, Underflow
+from functools import lru_cache
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Sequence
+from protocol.logger_protocol import logger
+from protocol.metrics_protocol import metrics
+
+# Because importing boto3.dynamodb.types loads all of boto3 and botocore, we mirror its decimal context here
+DYNAMODB_CONTEXT = Context(Emin=-128, Emax=126, prec=38, traps=[Clamped, Overflow, Inexact, Rounded, Underflow])
+STREAM_EVENT_NAMES = ("INSERT", "MODIFY", "REMOVE")
+# Because these are the only BatchWriteItem errors a retry can fix; anything else (e.g. ValidationException) fails fast
+THROTTLING_ERROR_CODES = {"ProvisionedThroughputExceededException", "ThrottlingException", "RequestLimitExceeded"}
+
+
+class Dynamo_Decoder:
+    """
+    Single-pass decoder for DynamoDB attribute values.
+
+    Each attribute is visited once through a type-tag dispatch table that is built when the decoder is created, so
+    a decoder can be shared across every record in a batch (see `Dynamo_Decoder.shared`).
+
+    Args:
+        number_format (str): How "N"/"NS" values are returned: "str", "int", "float" or "decimal".
+            "int" returns integral values as int and keeps non-integral values as Decimal so nothing is truncated.
+        attributes (Iterable[str], optional): Top level attributes to decode; all other attributes are skipped.
+    """
+
+    NUMBER_FORMATS = ("str", "int", "float", "decimal")
+
+    def __init__(self, number_format: str = "str", attributes: Optional[Iterable[str]] = None):
+        if number_format not in Dynamo_Decoder.NUMBER_FORMATS:
+            raise ValueError(f"Unsupported number format: {number_format}")
+
+        self.number_format = number_format
+        self.attributes: Optional[FrozenSet[str]] = frozenset(attributes) if attributes is not None else None
+
+        decode_number = Dynamo_Decoder._number_decoders()[number_format]
+        self._dispatch: Dict[str, Callable[[Any], Any]] = {
+            "S": Dynamo_Decoder._decode_identity,
+            "N": decode_number,
+            "B": Dynamo_Decoder._decode_binary,
+            "BOOL": Dynamo_Decoder._decode_identity,
+            "NULL": Dynamo_Decoder._decode_null,
+            "M": self.decode_item_all,
+            "L": self._decode_list,
+            "SS": set,
+            "NS": lambda values: {decode_number(value) for value in values},
+            "BS": lambda values: {Dynamo_Decoder._decode_binary(value) for value in values},
+        }
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _shared(number_format: str, attributes: Optional[FrozenSet[str]]) -> "Dynamo_Decoder":
+        return Dynamo_Decoder(number_format, attributes)
+
+    @staticmethod
+    def shared(number_format: str = "str", attributes: Optional[Iterable[str]] = None) -> "Dynamo_Decoder":
+        # Because building the dispatch table per record is wasted work, decoders are cached per configuration
+        return Dynamo_Decoder._shared(number_format, frozenset(attributes) if attributes is not None else None)
+
+    def decode_value(self, value: Dict[str, Any]) -> Any:
+        for type_tag, payload in value.items():
+            try:
+                decode = self._dispatch[type_tag]
+            except KeyError:
+                raise TypeError(f"Dynamodb type {type_tag} is not supported")
+            return decode(payload)
+
+        raise TypeError("Value must be a nonempty dictionary whose key is a valid dynamodb type.")
+
+    def decode_item(self, dynamodb_item: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        if not dynamodb_item:
+            return {}
+        if self.attributes is None:
+            return self.decode_item_all(dynamodb_item)
+
+        decode_value = self.decode_value
+        return {key: decode_value(value) for key, value in dynamodb_item.items() if key in self.attributes}
+
+    def decode_item_all(self, dynamodb_item: Dict[str, Any]) -> Dict[str, Any]:
+        # Because nested maps ignore the projection, which only applies to top level attributes
+        decode_value = self.decode_value
+        return {key: decode_value(value) for key, value in dynamodb_item.items()}
+
+    def _decode_list(self, values):
+        decode_value = self.decode_value
+        return [decode_value(value) for value in values]
+
+    @staticmethod
+    def _number_decoders() -> Dict[str, Callable[[str], Any]]:
+        return {
+            "str": Dynamo_Decoder._decode_identity,
+            "int": Dynamo_Decoder._decode_int,
+            "float": float,
+            "decimal": DYNAMODB_CONTEXT.create_decimal,
+        }
+
+    @staticmethod
+    def _decode_identity(value):
+        return value
+
+    @staticmethod
+    def _decode_null(value):
+        return None
+
+    @staticmethod
+    def _decode_int(value: str):
+        try:
+            return int(value)
+        except ValueError:
+            number = DYNAMODB_CONTEXT.create_decimal(value)
+            return int(number) if number == number.to_integral_value() else number
+
+    @staticmethod
+    def _decode_binary(value):
+        from boto3.dynamodb.types import Binary
+
+        # Because lambda delivers stream binaries as base64 strings rather than bytes
+        if isinstance(value, str):
+            value = base64.b64decode(value)
+        return Binary(value)
+
+
+class Dynamo_Image(Mapping):
+    """
+    Read-only view of a DynamoDB image that decodes an attribute the first time it is read and keeps the result.
+
+    A caller that only reads a few attributes of a wide item never pays to decode the rest. The view compares equal to
+    the fully decoded dict, and `to_dict` decodes everything at once.
+    """
+
+    __slots__ = ("raw", "_decoder", "_decoded")
+
+    def __init__(self, raw: Dict[str, Any], decoder: Dynamo_Decoder):
+        self.raw = raw
+        self._decoder = decoder
+        self._decoded: Dict[str, Any] = {}
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return self._decoded[key]
+        except KeyError:
+            value = self._decoded[key] = self._decoder.decode_value(self.raw[key])
+            return value
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.raw)
+
+    def __len__(self) -> int:
+        return len(self.raw)
+
+    def __repr__(self) -> str:
+        return f"Dynamo_Image({sorted(self.raw)})"
+
+    def __reduce__(self):
+        # Because the decoder's dispatch table holds lambdas, a view is pickled as the dict it decodes to
+        return (dict, (self.to_dict(),))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: self[key] for key in self.raw}
+
+
+class Dynamo_Stream_Record:
+    """
+    One stream record as lazy views: `new_image` for inserts and updates, `old_image` and `keys` when requested.
+    """
+
+    __slots__ = ("raw", "event_name", "event_id", "sequence_number", "event_type", "new_image", "old_image", "keys")
+
+    def __init__(
+        self,
+        record: Dict[str, Any],
+        event_type: Optional[str],
+        decoder: Dynamo_Decoder,
+        include_keys: bool = False,
+        include_old_image: bool = False,
+    ):
+        dynamodb = record["dynamodb"]
+        self.raw = record
+        self.event_name = record["eventName"]
+        self.event_id = record.get("eventID")
+        self.sequence_number = dynamodb.get("SequenceNumber")
+        self.event_type = event_type
+        new_image = dynamodb.get("NewImage")
+        old_image = dynamodb.get("OldImage")
+        self.new_image = Dynamo_Image(new_image, decoder) if new_image is not None else None
+        self.old_image = Dynamo_Image(old_image, decoder) if include_old_image and old_image is not None else None
+        self.keys = Dynamo_Image(dynamodb.get("Keys") or {}, decoder) if include_keys else None
+
+    def deleted_image(self, decoder: Dynamo_Decoder) -> Dynamo_Image:
+        # Because a REMOVE carries no new image, only the old image (when the stream records it) and the keys
+        dynamodb = self.raw["dynamodb"]
+        return self.old_image or Dynamo_Image(dynamodb.get("OldImage") or dynamodb.get("Keys") or {}, decoder)
+
+
+class Dynamo_Batch_Writer:
+    """
+    Collects put requests for one table and flushes them with BatchWriteItem.
+
+    Writes that share a primary key are collapsed (last write wins) because DynamoDB rejects duplicate keys within
+    one batch. UnprocessedItems and throttled calls are retried with full-jitter exponential backoff; any other error
+    fails the batch at once. The outcome is reported for every source event that contributed a write.
+
+    Args:
+        table: boto3 dynamodb Table resource.
+        key_names (Sequence[str], optional): Primary key attribute names; read from the table's key schema if omitted.
+    """
+
+    MAX_BATCH_SIZE = 25
+
+    def __init__(
+        self,
+        table,
+        key_names: Optional[Sequence[str]] = None,
+        max_attempts: int = 5,
+        base_delay_seconds: float = 0.05,
+        max_delay_seconds: float = 1.0,
+    ):
+        self.table = table
+        self.key_names = tuple(key_names) if key_names else tuple(key["AttributeName"] for key in table.key_schema)
+        self.max_attempts = max_attempts
+        self.base_delay_seconds = base_delay_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self._items_by_key: Dict[tuple, Dict[str, Any]] = {}
+        self._source_events_by_key: Dict[tuple, List[Any]] = {}
+
+    def put_item(self, item: Dict[str, Any], source_event: Any = None):
+        key = self._key(item)
+        self._items_by_key[key] = item
+        self._source_events_by_key.setdefault(key, []).append(source_event)
+
+    def flush(self) -> List[Dict[str, Any]]:
+        """
+        Write every collected item.
+
+        Returns:
+            list: One {"source_event": ..., "error": ...} entry per source event whose write did not succeed.
+        """
+        pending_keys = list(self._items_by_key)
+        errors: Dict[tuple, Exception] = {}
+        for start in range(0, len(pending_keys), Dynamo_Batch_Writer.MAX_BATCH_SIZE):
+            batch_keys = pending_keys[start : start + Dynamo_Batch_Writer.MAX_BATCH_SIZE]
+            errors.update(self._write_batch(batch_keys))
+
+        failures = [
+            {"source_event": source_event, "error": error}
+            for key, error in errors.items()
+            for source_event in self._source_events_by_key[key]
+        ]
+        self._items_by_key = {}
+        self._source_events_by_key = {}
+        return failures
+
+    def _write_batch(self, batch_keys: List[tuple]) -> Dict[tuple, Exception]:
+        table_name = self.table.name
+        client = self.table.meta.client
+        remaining = {key: self._items_by_key[key] for key in batch_keys}
+        last_error: Exception = Exception("Unprocessed items remained after retries")
+
+        for attempt in range(self.max_attempts):
+            if attempt:
+                time.sleep(random.uniform(0, min(self.max_delay_seconds, self.base_delay_seconds * 2**attempt)))
+            try:
+                with metrics.timer("DynamoBatchWrite"):
+                    response = client.batch_write_item(
+                        RequestItems={table_name: [{"PutRequest": {"Item": item}} for item in remaining.values()]}
+                    )
+            except Exception as e:
+                logger.info(f"BatchWriteItem attempt {attempt + 1} to {table_name} failed: {e}")
+                last_error = e
+                if not Dynamo_Batch_Writer.is_throttling_error(e):
+                    break
+                continue
+
+            unprocessed = response.get("UnprocessedItems", {}).get(table_name, [])
+            unprocessed_items = [request["PutRequest"]["Item"] for request in unprocessed]
+            remaining = {self._key(item): item for item in unprocessed_items}
+            if not remaining:
+                return {}
+            last_error = Exception("Unprocessed items remained after retries")
+
+        return {key: last_error for key in remaining}
+
+    @staticmethod
+    def is_throttling_error(error: Exception) -> bool:
+        response = getattr(error, "response", None) or {}
+        return response.get("Error", {}).get("Code") in THROTTLING_ERROR_CODES
+
+    def _key(self, item: Dict[str, Any]) -> tuple:
+        return tuple(item.get(key_name) for key_name in self.key_names)
 
 
 class Dynamo_Stream:
     @staticmethod
-    def unpackDynamoValueFromStream(streamEvent):
+    def batch_item_failures(failed_source_events, source_events, sequence_numbers):
+        """
+        Build the partial batch response lambda expects when ReportBatchItemFailures is enabled.
+
+        Lambda resumes from the lowest reported sequence number, so only the failed record and the ones after it
+        are replayed rather than the whole batch.
+
+        Args:
+            failed_source_events (list): Decoded source events that failed, as returned by the routes.
+            source_events (list): Every decoded source event, in stream order.
+            sequence_numbers (list): The stream sequence number of each entry in `source_events`.
+        """
+        failed_ids = {id(source_event) for source_event in failed_source_events}
+        return {
+            "batchItemFailures": [
+                {"itemIdentifier": sequence_number}
+                for source_event, sequence_number in zip(source_events, sequence_numbers)
+                if id(source_event) in failed_ids
+            ]
+        }
+
+    @staticmethod
+    def iter_records(
+        stream_event,
+        event_names: Iterable[str] = STREAM_EVENT_NAMES,
+        event_types: Optional[Iterable[str]] = None,
+        include_keys: bool = False,
+        include_old_image: bool = False,
+        number_format: str = "str",
+    ) -> Iterator[Dynamo_Stream_Record]:
+        """
+        Yield a `Dynamo_Stream_Record` for each record whose eventName and raw event_type were asked for.
+
+        Both are read from the raw record before anything is decoded, so filtered out records cost nothing; a REMOVE
+        is matched on its old image's event_type, so with an event_types filter it needs a stream that records old
+        images. Nothing in a yielded record is decoded until it is read.
+        """
+        event_names = frozenset(event_names)
+        event_types = frozenset(event_types) if event_types is not None else None
+        decoder = Dynamo_Decoder.shared(number_format)
+        for record in stream_event["Records"]:
+            event_name = record["eventName"]
+            if event_name not in event_names:
+                continue
+
+            dynamodb = record["dynamodb"]
+            image = dynamodb.get("OldImage") if event_name == "REMOVE" else dynamodb.get("NewImage")
+            event_type = (image or {}).get("event_type", {}).get("S")
+            if event_types is not None and event_type not in event_types:
+                continue
+
+            yield Dynamo_Stream_Record(record, event_type, decoder, include_keys, include_old_image)
+
+    @staticmethod
+    def unpackDynamoValueFromStream(
+        streamEvent,
+        event_names: Iterable[str] = STREAM_EVENT_NAMES,
+        event_types: Optional[Iterable[str]] = None,
+        include_keys: bool = False,
+        include_old_image: bool = False,
+        number_format: str = "str",
+        lazy: bool = False,
+    ):
+        """
+        Group the requested records of a stream event by operation, as plain dicts.
+
+        Inserts and updates are their new images; one without a new image (a stream that only records keys or old
+        images) is left out of them. A delete is its old image, or its keys when the stream does not record old
+        images. "records" holds every `Dynamo_Stream_Record` in stream order, with keys and old images
+        when they were requested. Records that were not asked for are never decoded; with `lazy` the images are
+        `Dynamo_Image` views instead, which also skip decoding the attributes that are never read.
+        """
         inserts = []
         updates = []
         deletes = []
+        # Because partial batch failures are reported by stream sequence number, we keep one per insert
+        insert_sequence_numbers = []
+        records = []
+        decoder = Dynamo_Decoder.shared(number_format)
 
-        # Because each stream event can have multiple records
-        for record in streamEvent["Records"]:
-            # Because for now, we are only checking INSERT, DELETE operations
-            if record["eventName"] == "INSERT":
-                # Because AWS gives us awkward dynamodb formatted records
-                new_dynamo_db_record = record["dynamodb"].get("NewImage")
-                un_marshalled_insert_record = Dynamo_Stream.un_marshall_dynamodb_item(new_dynamo_db_record)
-                inserts.append(un_marshalled_insert_record)
-                continue
-            if record["eventName" == "REMOVE"]:
-                new_dynamo_db_record = record["dynamodb"].get("NewImage")
-                # Because AWS gives us awkward dynamodb formatted records
-                un_marshalled_delete_record = Dynamo_Stream.un_marshall_dynamodb_item(new_dynamo_db_record)
-                deletes.append(un_marshalled_delete_record)
-                continue
-            if record["eventName" == "MODIFY"]:
-                new_dynamo_db_record = record["dynamodb"].get("NewImage")
-                # Because AWS gives us awkward dynamodb formatted records
-                un_marshalled_update_record = Dynamo_Stream.un_marshall_dynamodb_item(new_dynamo_db_record)
-                updates.append(un_marshalled_update_record)
+        for stream_record in Dynamo_Stream.iter_records(
+            streamEvent, event_names, event_types, include_keys, include_old_image, number_format
+        ):
+            records.append(stream_record)
+            if stream_record.event_name != "REMOVE" and stream_record.new_image is None:
                 continue
+            if stream_record.event_name == "INSERT":
+                inserts.append(stream_record.new_image if lazy else stream_record.new_image.to_dict())
+                insert_sequence_numbers.append(stream_record.sequence_number)
+            elif stream_record.event_name == "MODIFY":
+                updates.append(stream_record.new_image if lazy else stream_record.new_image.to_dict())
+            elif stream_record.event_name == "REMOVE":
+                deleted_image = stream_record.deleted_image(decoder)
+                deletes.append(deleted_image if lazy else deleted_image.to_dict())
 
-        return {"inserts": inserts, "deletes": deletes, "updates": updates}
+        return {
+            "inserts": inserts,
+            "deletes": deletes,
+            "updates": updates,
+            "insert_sequence_numbers": insert_sequence_numbers,
+            "records": records,
+        }
 
     @staticmethod
-    def un_marshall_dynamodb_item(dynamodb_item):
+    def un_marshall_dynamodb_item(dynamodb_item, number_format="str", attributes=None):
         """
         Unmarshals a DynamoDB item into a normal Python dictionary.
 
         Args:
             dynamodb_item (dict): The DynamoDB item (a dict with DynamoDB types).
+            number_format (str): Representation for numbers: "str", "int", "float" or "decimal".
+            attributes (Iterable[str], optional): Only decode these top level attributes.
 
         Returns:
             dict: A Python dictionary with native types.
         """
-        deserializer = TypeDeserializer()
-        return {
-            key: (
-                str(deserializer.deserialize(value))
-                if isinstance(deserializer.deserialize(value), Decimal)
-                else deserializer.deserialize(value)
-            )
-            for key, value in dynamodb_item.items()
-        }
+        return Dynamo_Decoder.shared(number_format, attributes).decode_item(dynamodb_item)
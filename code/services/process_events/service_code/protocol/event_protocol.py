@@ -1,17 +1,139 @@
-from typing import Dict, List, Any
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+from protocol.dynamo_protocol import Dynamo_Stream
 from protocol.logger_protocol import logger
+from protocol.metrics_protocol import metrics
 
+WORKLOADS = ("io", "cpu")
+
+
+class Route_Registry:
+    """
+    Maps event types to the route that processes them.
+
+    A route module registers its event type once at import time; the handler then dispatches a stream event in a single
+    pass, decoding only the inserts whose raw event_type has a registered route, and builds the route dicts that
+    `Route_Executor` runs.
+
+    A registration declares:
+        process (callable): Takes (source_events, aws_clients) and returns the source events that failed.
+        required_clients (Sequence[str]): aws_clients the route reads, prefetched only when the route has events.
+        batch_size (int, optional): Source events per chunk, defaults to all of them.
+        max_concurrency (int): Chunks of the route allowed to run at once.
+        workload (str): "io" for routes that mostly wait on network calls, "cpu" for routes that mostly compute.
+    """
+
+    def __init__(self):
+        self._routes: Dict[str, Dict[str, Any]] = {}
+
+    def register(
+        self,
+        event_type: str,
+        process: Callable[[List[Any], Any], List[Any]],
+        required_clients: Sequence[str] = (),
+        batch_size: Optional[int] = None,
+        max_concurrency: int = 1,
+        workload: str = "io",
+    ) -> Callable[[List[Any], Any], List[Any]]:
+        if workload not in WORKLOADS:
+            raise ValueError(f"Unsupported workload: {workload}")
+        if event_type in self._routes:
+            raise ValueError(f"A route is already registered for {event_type}")
+
+        self._routes[event_type] = {
+            "name": event_type,
+            "process": process,
+            "required_clients": tuple(required_clients),
+            "batch_size": batch_size,
+            "max_concurrency": max_concurrency,
+            "workload": workload,
+        }
+        return process
+
+    def route(self, event_type: str, **options) -> Callable:
+        """
+        Decorator form of `register`.
+        """
+
+        def decorator(process):
+            return self.register(event_type, process, **options)
+
+        return decorator
+
+    def unregister(self, event_type: str):
+        self._routes.pop(event_type, None)
+
+    def event_types(self) -> Iterable[str]:
+        return self._routes.keys()
+
+    def dispatch(self, stream_event) -> Dict[str, Any]:
+        """
+        Group the registered inserts of a stream event by event type.
+
+        Each source event is the insert's new image as a `Dynamo_Image`, so a route only pays to decode the attributes
+        it reads; inserts of other event types, or without a new image, are counted and never decoded.
+
+        Returns:
+            dict: "source_events_by_type" for the routes, plus "source_events", "sequence_numbers" and "event_ids"
+                holding every source event in stream order for the partial batch response and deduplication.
+        """
+        source_events_by_type: Dict[str, List[Any]] = {}
+        source_events = []
+        sequence_numbers = []
+        event_ids = []
+        skipped = 0
+
+        for stream_record in Dynamo_Stream.iter_records(stream_event, event_names=("INSERT",)):
+            source_event = stream_record.new_image
+            if source_event is None or stream_record.event_type not in self._routes:
+                skipped += 1
+                continue
+            source_events_by_type.setdefault(stream_record.event_type, []).append(source_event)
+            source_events.append(source_event)
+            sequence_numbers.append(stream_record.sequence_number)
+            event_ids.append(stream_record.event_id)
+
+        if skipped:
+            logger.info("Skipped %d inserts without a registered route", skipped)
+        metrics.add_count("SkippedRecords", skipped)
+        metrics.add_count("RoutedRecords", len(source_events))
+
+        return {
+            "source_events_by_type": source_events_by_type,
+            "source_events": source_events,
+            "sequence_numbers": sequence_numbers,
+            "event_ids": event_ids,
+        }
+
+    def required_clients(self, source_events_by_type: Dict[str, List[Any]]) -> List[str]:
+        required_clients = []
+        for event_type, source_events in source_events_by_type.items():
+            if not source_events:
+                continue
+            for client_name in self._routes[event_type]["required_clients"]:
+                if client_name not in required_clients:
+                    required_clients.append(client_name)
+        return required_clients
+
+    def build_routes(self, source_events_by_type: Dict[str, List[Any]], aws_clients) -> List[Dict[str, Any]]:
+        routes = []
+        for event_type, source_events in source_events_by_type.items():
+            registration = self._routes[event_type]
+            routes.append(
+                {
+                    "name": event_type,
+                    "source_events": source_events,
+                    "process": Route_Registry._bind(registration["process"], aws_clients),
+                    "batch_size": registration["batch_size"],
+                    "max_concurrency": registration["max_concurrency"],
+                    "workload": registration["workload"],
+                }
+            )
+        return routes
 
-class Event_Helpers:
     @staticmethod
-    def categorize_events_by_event_type(source_events) -> Dict[str, List[Any]]:
-        source_events_by_type = {}
-        for source_event in source_events:
-            # if its not in the dict, instantiate a list with the new event
-            append_log_for_source_event_type = source_events_by_type.get(source_event["event_type"], [])
-            # apply the next source event
-            append_log_for_source_event_type.append(source_event)
-            # save the array of source events of this type
-            source_events_by_type[source_event["event_type"]] = append_log_for_source_event_type
-
-        return source_events_by_type
+    def _bind(process, aws_clients):
+        return lambda source_events: process(source_events, aws_clients)
+
+
+# Because route modules register themselves on import, the handler and the routes share this registry
+route_registry = Route_Registry()
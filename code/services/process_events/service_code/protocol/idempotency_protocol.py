@@ -0,0 +1,182 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from protocol.dynamo_protocol import Dynamo_Batch_Writer
+from protocol.logger_protocol import logger
+from protocol.metrics_protocol import metrics
+from static.constants import get_read_only_constants
+
+CLAIM_STATUS_IN_PROGRESS = "IN_PROGRESS"
+CLAIM_STATUS_COMPLETED = "COMPLETED"
+CLAIM_STATUS_RELEASED = "RELEASED"
+
+idempotency_guard: Optional["Idempotency_Guard"] = None
+
+
+class Idempotency_Guard:
+    """
+    Skips stream records that were already processed, keyed by the stream eventID.
+
+    Lookups go to an in-process LRU of completed event IDs first, then to a claim record in the idempotency table
+    written with a conditional put. A claim is IN_PROGRESS until the invocation's deadline, COMPLETED (kept for
+    `completed_ttl_seconds`, the stream retention) once every route succeeded for the record, or RELEASED when its
+    route returned it as failed (or it never started) so the stream retry can claim it again. A record whose route
+    was still running at the deadline is retried too, but stays IN_PROGRESS for `in_progress_seconds` so the retry
+    does not process it while the first attempt may still write. Expired claims can be taken over, and the table's
+    TTL on `expires_at` removes them.
+
+    Without a table only the LRU is used. When the table cannot be reached the record is processed anyway, because a
+    duplicate is cheaper than a lost record.
+    """
+
+    def __init__(self, cache_size: int, completed_ttl_seconds: int, in_progress_seconds: int, max_workers: int):
+        self.cache_size = cache_size
+        self.completed_ttl_seconds = completed_ttl_seconds
+        self.in_progress_seconds = in_progress_seconds
+        self.max_workers = max_workers
+        self._completed: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def shared() -> "Idempotency_Guard":
+        # Because the LRU has to outlive the invocation to catch replays on a warm container
+        global idempotency_guard
+        if not idempotency_guard:
+            constants = get_read_only_constants()
+            idempotency_guard = Idempotency_Guard(
+                constants["IDEMPOTENCY_CACHE_SIZE"],
+                constants["IDEMPOTENCY_COMPLETED_TTL_SECONDS"],
+                constants["IDEMPOTENCY_IN_PROGRESS_SECONDS"],
+                constants["IDEMPOTENCY_MAX_WORKERS"],
+            )
+        return idempotency_guard
+
+    def claim(self, source_events: List[Any], event_ids: List[Optional[str]], table=None, expires_at=None):
+        """
+        Claim every source event before it is processed.
+
+        :param expires_at: Epoch second the IN_PROGRESS claims lapse at, normally the invocation deadline.
+        :return: {"claimed": source events to process, "completed": already processed ones to skip, "in_progress":
+            ones another invocation holds, to report as failed, "event_ids": {id(source_event): event_id}}.
+        """
+        claims: Dict[str, Any] = {"claimed": [], "completed": [], "in_progress": [], "event_ids": {}}
+        to_claim = []
+        for source_event, event_id in zip(source_events, event_ids):
+            if event_id is None:
+                # Because there is nothing to deduplicate on
+                claims["claimed"].append(source_event)
+            elif self.is_completed(event_id):
+                claims["completed"].append(source_event)
+            else:
+                claims["event_ids"][id(source_event)] = event_id
+                to_claim.append((source_event, event_id))
+
+        if table is None or not to_claim:
+            claims["claimed"].extend(source_event for source_event, _ in to_claim)
+        else:
+            expires_at = int(expires_at or time.time() + self.in_progress_seconds)
+            with metrics.timer("IdempotencyClaim"):
+                with ThreadPoolExecutor(max_workers=min(self.max_workers, len(to_claim))) as executor:
+                    outcomes = list(
+                        executor.map(lambda claim: self._put_claim(table, claim[1], expires_at), to_claim)
+                    )
+            for (source_event, event_id), outcome in zip(to_claim, outcomes):
+                claims[outcome].append(source_event)
+                if outcome == "completed":
+                    self.remember(event_id)
+
+        metrics.add_count("DuplicateRecords", len(claims["completed"]))
+        metrics.add_count("InProgressRecords", len(claims["in_progress"]))
+        if claims["completed"] or claims["in_progress"]:
+            logger.info(
+                "Skipping %d processed and %d in progress records", len(claims["completed"]), len(claims["in_progress"])
+            )
+        return claims
+
+    def settle(
+        self, claims: Dict[str, Any], failed_source_events: List[Any], table=None, unfinished_source_events=()
+    ):
+        """
+        Mark the claimed records that succeeded as completed and release the ones that failed.
+
+        :param unfinished_source_events: Records still being processed (a route chunk that was running at the
+            deadline). Those also reported as failed keep their claims IN_PROGRESS, pushed out by
+            `in_progress_seconds` because the chunk may resume when the environment thaws, after this invocation's
+            deadline; the retry is held off until the claim lapses. Any other unfinished record is released, because
+            no retry would come for it once its claim lapsed.
+        """
+        failed_ids = {id(source_event) for source_event in failed_source_events}
+        unfinished_ids = {id(source_event) for source_event in unfinished_source_events}
+        now = int(time.time())
+        writer = Dynamo_Batch_Writer(table, key_names=("event_id",)) if table is not None else None
+
+        for source_event in claims["claimed"]:
+            event_id = claims["event_ids"].get(id(source_event))
+            if event_id is None:
+                continue
+            if id(source_event) in unfinished_ids and id(source_event) in failed_ids:
+                expires_at = now + self.in_progress_seconds
+                item = {"event_id": event_id, "status": CLAIM_STATUS_IN_PROGRESS, "expires_at": expires_at}
+            elif id(source_event) in failed_ids or id(source_event) in unfinished_ids:
+                # Because the claim condition only takes over claims whose expires_at is strictly in the past
+                item = {"event_id": event_id, "status": CLAIM_STATUS_RELEASED, "expires_at": now - 1}
+            else:
+                self.remember(event_id)
+                expires_at = now + self.completed_ttl_seconds
+                item = {"event_id": event_id, "status": CLAIM_STATUS_COMPLETED, "expires_at": expires_at}
+            if writer:
+                writer.put_item(item, source_event)
+
+        if writer:
+            for failure in writer.flush():
+                logger.info("Could not settle the idempotency claim of a record: %s", failure["error"])
+
+    def is_completed(self, event_id: str) -> bool:
+        with self._lock:
+            if event_id not in self._completed:
+                return False
+            self._completed.move_to_end(event_id)
+            return True
+
+    def remember(self, event_id: str):
+        with self._lock:
+            self._completed[event_id] = None
+            self._completed.move_to_end(event_id)
+            while len(self._completed) > self.cache_size:
+                self._completed.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._completed.clear()
+
+    @staticmethod
+    def keep_claimed(source_events_by_type: Dict[str, List[Any]], claimed: List[Any]) -> Dict[str, List[Any]]:
+        claimed_ids = {id(source_event) for source_event in claimed}
+        return {
+            event_type: [source_event for source_event in source_events if id(source_event) in claimed_ids]
+            for event_type, source_events in source_events_by_type.items()
+        }
+
+    @staticmethod
+    def _put_claim(table, event_id: str, expires_at: int) -> str:
+        try:
+            table.put_item(
+                Item={"event_id": event_id, "status": CLAIM_STATUS_IN_PROGRESS, "expires_at": expires_at},
+                ConditionExpression="attribute_not_exists(event_id) OR expires_at < :now",
+                ExpressionAttributeValues={":now": int(time.time())},
+                ReturnValuesOnConditionCheckFailure="ALL_OLD",
+            )
+            return "claimed"
+
+        except Exception as e:
+            response = getattr(e, "response", None) or {}
+            if response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                logger.info("Could not claim record %s, processing it unclaimed: %s", event_id, e)
+                return "claimed"
+
+            # Because the low level error carries the existing item in attribute value form
+            status = response.get("Item", {}).get("status")
+            status = status.get("S") if isinstance(status, dict) else status
+            return "completed" if status == CLAIM_STATUS_COMPLETED else "in_progress"
@@ -1,5 +1,17 @@
 import os
+import json
+import queue
+import atexit
+import random
 import logging
+import logging.handlers
+from typing import Any, Optional
+
+# Settings (environment): LOG_ASYNC=false writes on the calling thread, LOG_PAYLOAD_SAMPLE_RATE is the share of
+# payload logs kept (0 to 1), LOG_PAYLOAD_MAX_CHARS caps how much of a payload is written
+LOG_ASYNC = os.environ.get("LOG_ASYNC", "true").lower() not in ("0", "false", "no")
+LOG_PAYLOAD_SAMPLE_RATE = float(os.environ.get("LOG_PAYLOAD_SAMPLE_RATE", 0.1))
+LOG_PAYLOAD_MAX_CHARS = int(os.environ.get("LOG_PAYLOAD_MAX_CHARS", 2048))
 
 default_log_args = {
     "level": logging.DEBUG if os.environ.get("DEBUG", False) else logging.INFO,
@@ -8,5 +20,71 @@ default_log_args = {
     "force": True,
 }
 
+
+class Deferred_Queue_Handler(logging.handlers.QueueHandler):
+    """
+    Hands records to the listener thread untouched.
+
+    The stock QueueHandler formats the message on the calling thread so records can be pickled; this queue never
+    leaves the process, so formatting (including `Payload_Summary` rendering) is left to the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class Payload_Summary:
+    """
+    Renders a payload as JSON capped at `max_chars`, only when a handler actually formats the record.
+    """
+
+    def __init__(self, payload: Any, max_chars: Optional[int] = None):
+        self.payload = payload
+        self.max_chars = max_chars if max_chars is not None else LOG_PAYLOAD_MAX_CHARS
+
+    def __str__(self) -> str:
+        try:
+            rendered = json.dumps(self.payload, default=str, separators=(",", ":"))
+        except (TypeError, ValueError):
+            rendered = repr(self.payload)
+        if len(rendered) <= self.max_chars:
+            return rendered
+        return f"{rendered[: self.max_chars]}...({len(rendered) - self.max_chars} more chars)"
+
+
+def log_payload(message: str, payload: Any, level: int = logging.INFO, sample_rate: Optional[float] = None):
+    """
+    Log a size-capped payload for a sampled share of calls; DEBUG logging keeps every one.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    sample_rate = sample_rate if sample_rate is not None else LOG_PAYLOAD_SAMPLE_RATE
+    if not logger.isEnabledFor(logging.DEBUG) and random.random() >= sample_rate:
+        return
+    logger.log(level, "%s: %s", message, Payload_Summary(payload))
+
+
+def flush_logs():
+    """
+    Block until the listener has written every queued record, e.g. before lambda freezes the environment.
+    """
+    if log_listener is not None:
+        log_queue.join()
+
+
 logging.basicConfig(**default_log_args)
+log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue()
+log_listener: Optional[logging.handlers.QueueListener] = None
+
+if LOG_ASYNC:
+    # Because writing to stderr can block, the processing threads only enqueue and one listener thread writes
+    root_logger = logging.getLogger()
+    stream_handlers = root_logger.handlers[:]
+    for stream_handler in stream_handlers:
+        root_logger.removeHandler(stream_handler)
+    root_logger.addHandler(Deferred_Queue_Handler(log_queue))
+    log_listener = logging.handlers.QueueListener(log_queue, *stream_handlers, respect_handler_level=True)
+    log_listener.start()
+    atexit.register(log_listener.stop)
+
 logger = logging.getLogger("Run-Lambda")
@@ -0,0 +1,127 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List
+
+# Because CloudWatch rejects EMF documents with more than 100 values for one metric
+MAX_VALUES_PER_METRIC = 100
+
+
+class Invocation_Metrics:
+    """
+    Collects stage timings and counts for one invocation and writes them to stdout in CloudWatch Embedded Metric
+    Format, which the log pipeline turns into metrics without an agent or an API call.
+
+    Timings keep every observation so CloudWatch can compute percentiles; counts are summed. Every document carries the
+    Service and ColdStart ("cold" or "warm") dimensions, and `flush` is called once at the end of each invocation.
+    """
+
+    def __init__(self, namespace: str, service: str):
+        self.namespace = namespace
+        self.service = service
+        self.cold_start = True
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._timings: Dict[str, List[float]] = {}
+        self._counts: Dict[str, float] = {}
+        self._dimensions: Dict[str, str] = {}
+        self._properties: Dict[str, Any] = {}
+
+    def put_timing(self, name: str, milliseconds: float):
+        with self._lock:
+            self._timings.setdefault(name, []).append(round(milliseconds, 3))
+
+    def add_count(self, name: str, value: float = 1):
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + value
+
+    def set_dimension(self, name: str, value: str):
+        with self._lock:
+            self._dimensions[name] = str(value)
+
+    def set_property(self, name: str, value: Any):
+        with self._lock:
+            self._properties[name] = value
+
+    @contextmanager
+    def timer(self, name: str):
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.put_timing(name, (time.perf_counter() - started_at) * 1000)
+
+    def documents(self) -> List[Dict[str, Any]]:
+        """
+        Build the EMF documents for everything recorded since the last flush; timings with more than
+        MAX_VALUES_PER_METRIC observations are spread over several documents.
+        """
+        with self._lock:
+            timings = {name: list(values) for name, values in self._timings.items()}
+            counts = dict(self._counts)
+            dimensions = {
+                "Service": self.service,
+                "ColdStart": "cold" if self.cold_start else "warm",
+                **self._dimensions,
+            }
+            properties = dict(self._properties)
+
+        if not timings and not counts:
+            return []
+
+        document_count = max([1] + [-(-len(values) // MAX_VALUES_PER_METRIC) for values in timings.values()])
+        documents = []
+        for index in range(document_count):
+            start = index * MAX_VALUES_PER_METRIC
+            metric_values: Dict[str, Any] = {
+                name: values[start : start + MAX_VALUES_PER_METRIC]
+                for name, values in timings.items()
+                if values[start : start + MAX_VALUES_PER_METRIC]
+            }
+            units = {name: "Milliseconds" for name in metric_values}
+            # Because counts are totals for the invocation, they are only written once
+            if index == 0:
+                metric_values.update(counts)
+                units.update({name: "Count" for name in counts})
+
+            documents.append(
+                {
+                    "_aws": {
+                        "Timestamp": int(time.time() * 1000),
+                        "CloudWatchMetrics": [
+                            {
+                                "Namespace": self.namespace,
+                                "Dimensions": [list(dimensions)],
+                                "Metrics": [{"Name": name, "Unit": unit} for name, unit in units.items()],
+                            }
+                        ],
+                    },
+                    **properties,
+                    **dimensions,
+                    **metric_values,
+                }
+            )
+        return documents
+
+    def flush(self):
+        """
+        Write the invocation's metrics to stdout and start the next invocation warm.
+        """
+        for document in self.documents():
+            sys.stdout.write(json.dumps(document, default=str) + "\n")
+        sys.stdout.flush()
+
+        with self._lock:
+            self._reset()
+            self.cold_start = False
+
+
+metrics = Invocation_Metrics(
+    namespace=os.environ.get("METRICS_NAMESPACE", "ProcessEvents"),
+    service=os.environ.get("METRICS_SERVICE", "process_events"),
+)
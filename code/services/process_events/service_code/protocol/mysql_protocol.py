@@ -1,8 +1,44 @@
-import mysql.connector
+import time
+from collections import OrderedDict
+from functools import lru_cache
 from protocol.secrets_manager_protocol import Secrets_Manager
 from protocol.logger_protocol import logger
+from protocol.metrics_protocol import metrics
 from static.formatting import format_secret_key
 
+# Because MySQL 5.7 / Aurora v2 default to 4MiB when the server value cannot be read
+DEFAULT_MAX_ALLOWED_PACKET = 4 * 1024 * 1024
+PACKET_SAFETY_RATIO = 0.8
+
+# Because warm containers can sit idle long enough for the server or network to drop the connection
+DEFAULT_MAX_IDLE_SECONDS = 300
+DEFAULT_MAX_AGE_SECONDS = 3600
+PING_AFTER_IDLE_SECONDS = 5
+RECONNECT_ATTEMPTS = 3
+RECONNECT_BASE_DELAY_SECONDS = 0.2
+RECONNECT_MAX_DELAY_SECONDS = 2
+# Because this is the server error for a wrong user or password, e.g. after the secret was rotated
+ER_ACCESS_DENIED_ERROR = 1045
+# Because each prepared statement holds server memory, and max_prepared_stmt_count is shared by every connection
+STATEMENT_CACHE_SIZE = 32
+
+
+class Query_Chunk:
+    """
+    One chunk of rows from `AuroraMysql.iter_query` / `iter_table`; `column_names` is resolved once per query.
+    """
+
+    def __init__(self, rows, column_names, last_key=None):
+        self.rows = rows
+        self.column_names = column_names
+        self.last_key = last_key
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
 
 class AuroraMysql:
     database_host = ""
@@ -10,57 +46,394 @@ class AuroraMysql:
     database_user = ""
     connection = None
     cursor = None
+    max_allowed_packet = None
+    connected_at = 0.0
+    last_used_at = 0.0
+    statement_cache = None
 
     def __init__(self, constants, secret_manager_client):
         deployment_environment = constants["DEPLOYMENT_ENVIRONMENT"]
         if not deployment_environment:
             raise Exception(f"Missing deployment environment: {deployment_environment}")
 
+        self.max_idle_seconds = float(constants.get("MYSQL_MAX_IDLE_SECONDS") or DEFAULT_MAX_IDLE_SECONDS)
+        self.max_age_seconds = float(constants.get("MYSQL_MAX_AGE_SECONDS") or DEFAULT_MAX_AGE_SECONDS)
+        self.use_pure = str(constants.get("MYSQL_USE_PURE") or "").lower() in ("1", "true", "yes")
+
         try:
             # extract DB secrets
-            secret_lookup_id = format_secret_key("mysqlSecret", deployment_environment)
-            secret_manager_response = Secrets_Manager.get_secret(secret_lookup_id, secret_manager_client)
-            self.database_host = secret_manager_response["host"]
-            self.database_name = secret_manager_response["dbname"]
-            self.database_user = secret_manager_response["username"]
-            self.database_port = secret_manager_response["port"]
-            password = secret_manager_response["password"]
-
-            self.connection = mysql.connector.connect(
-                host=self.database_host,
-                database=self.database_name,
-                user=self.database_user,
-                password=password,
-                port=self.database_port,
-                connection_timeout=30,
-            )
-
-            self.cursor = self.connection.cursor()  # Ensure cursor is created
+            self._secret_lookup_id = format_secret_key("mysqlSecret", deployment_environment)
+            self._secret_manager_client = secret_manager_client
+            self.load_credentials()
+
+            self.connect()
 
         except Exception as e:
             self.close_connection()
             logger.info(f"Error on mysql connection: {e}")
             raise Exception(e)
 
+    def load_credentials(self, force_refresh=False):
+        secret_manager_response = Secrets_Manager.get_secret(
+            self._secret_lookup_id, self._secret_manager_client, force_refresh=force_refresh
+        )
+        self.database_host = secret_manager_response["host"]
+        self.database_name = secret_manager_response["dbname"]
+        self.database_user = secret_manager_response["username"]
+        self.database_port = secret_manager_response["port"]
+        self._password = secret_manager_response["password"]
+
+    def connect(self):
+        """
+        Open a fresh connection and cursor, retrying transient failures with bounded exponential backoff.
+
+        An access denied error re-fetches the secret once, so a rotated password is picked up without a redeploy.
+        """
+        # Because mysql.connector is slow to import, it is loaded the first time a connection is opened
+        import mysql.connector
+
+        try:
+            self._connect_with_backoff()
+        except mysql.connector.errors.ProgrammingError as e:
+            if e.errno != ER_ACCESS_DENIED_ERROR:
+                raise
+            logger.info("Mysql rejected cached credentials, refreshing the secret and reconnecting")
+            self.load_credentials(force_refresh=True)
+            self._connect_with_backoff()
+
+    def _connect_with_backoff(self):
+        self.close_connection()
+        with metrics.timer("AuroraConnect"):
+            self._open_connection()
+
+    def _open_connection(self):
+        import mysql.connector
+
+        for attempt in range(RECONNECT_ATTEMPTS):
+            try:
+                self.connection = mysql.connector.connect(
+                    host=self.database_host,
+                    database=self.database_name,
+                    user=self.database_user,
+                    password=self._password,
+                    port=self.database_port,
+                    connection_timeout=30,
+                    # Because the C extension parses rows and binds parameters in C, it is used whenever installed
+                    use_pure=self.use_pure or not mysql.connector.HAVE_CEXT,
+                )
+                self.cursor = self.connection.cursor()  # Ensure cursor is created
+                self.connected_at = self.last_used_at = time.monotonic()
+                self.max_allowed_packet = None
+                return
+
+            # Because bad credentials or a missing database will not fix themselves with a retry
+            except mysql.connector.errors.ProgrammingError:
+                raise
+            except Exception as e:
+                if attempt == RECONNECT_ATTEMPTS - 1:
+                    raise
+                delay = min(RECONNECT_MAX_DELAY_SECONDS, RECONNECT_BASE_DELAY_SECONDS * 2**attempt)
+                logger.info(f"Mysql connection attempt {attempt + 1} failed, retrying in {delay}s: {e}")
+                time.sleep(delay)
+
+    def ensure_connection(self):
+        """
+        Make sure the connection is usable before a statement runs.
+
+        The connection is recycled once it exceeds its maximum age or idle time, pinged when it has been idle for a
+        while (e.g. across warm invocations), and lazily reopened when the ping fails or it was closed.
+        """
+        now = time.monotonic()
+        if not (self.connection and self.cursor):
+            self.connect()
+        elif now - self.connected_at > self.max_age_seconds or now - self.last_used_at > self.max_idle_seconds:
+            logger.info("Recycling mysql connection after reaching its maximum age or idle time")
+            self.connect()
+        elif now - self.last_used_at > PING_AFTER_IDLE_SECONDS:
+            try:
+                self.connection.ping(reconnect=False)
+            except Exception as e:
+                logger.info(f"Mysql connection failed liveness check, reconnecting: {e}")
+                self.connect()
+        self.last_used_at = time.monotonic()
+
     def close_connection(self):
-        if self.cursor:
-            self.cursor.close()
-        if self.connection and self.connection.is_connected():
-            self.connection.close()
+        try:
+            # Because prepared statements belong to the connection, they are closed (deallocated) along with it
+            for statement_cursor in (self.statement_cache or {}).values():
+                statement_cursor.close()
+            if self.cursor:
+                self.cursor.close()
+            if self.connection and self.connection.is_connected():
+                self.connection.close()
+        except Exception as e:
+            # Because a connection that was dropped by the server can fail to close cleanly
+            logger.info(f"Error closing mysql connection: {e}")
+        finally:
+            self.cursor = None
+            self.connection = None
+            self.statement_cache = OrderedDict()
 
     def save_record(self, table_name, record):
         """
         Save a record to the specified table.
 
+        The INSERT is executed through a server-side prepared statement that is cached per (table, columns) for the
+        life of the connection, so repeated saves skip building the SQL and the server skips parsing it.
+
         :param table_name: The name of the table to insert the record into.
         :param record: A dictionary representing the record to insert.
         """
-        columns = ", ".join(record.keys())
-        values_placeholder = ", ".join(["%s"] * len(record))
-        sql = f"INSERT INTO {table_name} ({columns}) VALUES ({values_placeholder})"
+        columns = tuple(record.keys())
 
+        self.ensure_connection()
         if self.cursor and self.connection:
-            self.cursor.execute(sql, tuple(record.values()))
-            self.connection.commit()
+            statement_cursor = self._prepared_cursor(table_name, columns)
+            with metrics.timer("AuroraSaveRecord"):
+                try:
+                    statement_cursor.execute(AuroraMysql.insert_sql(table_name, columns), tuple(record.values()))
+                except Exception:
+                    # Because a statement the server invalidated (e.g. after ALTER TABLE) should be prepared afresh
+                    self._evict_statement(table_name, columns)
+                    raise
+                self.connection.commit()
         else:
             raise Exception("Missing cursor or connection")
+
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def insert_sql(table_name, columns, rows=1):
+        row_placeholder = "(" + ", ".join(["%s"] * len(columns)) + ")"
+        return f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES " + ", ".join([row_placeholder] * rows)
+
+    def _prepared_cursor(self, table_name, columns):
+        key = (table_name, columns)
+        statement_cursor = self.statement_cache.get(key)
+        if statement_cursor is not None:
+            self.statement_cache.move_to_end(key)
+            metrics.add_count("AuroraStatementCacheHits")
+            return statement_cursor
+
+        statement_cursor = self.connection.cursor(prepared=True)
+        self.statement_cache[key] = statement_cursor
+        if len(self.statement_cache) > STATEMENT_CACHE_SIZE:
+            _, evicted_cursor = self.statement_cache.popitem(last=False)
+            evicted_cursor.close()
+        return statement_cursor
+
+    def _evict_statement(self, table_name, columns):
+        statement_cursor = self.statement_cache.pop((table_name, columns), None)
+        if statement_cursor is not None:
+            try:
+                statement_cursor.close()
+            except Exception as e:
+                logger.info(f"Error closing prepared mysql statement: {e}")
+
+    def save_records(self, table_name, records, max_rows_per_chunk=500):
+        """
+        Save many records to the specified table with multi-row inserts and one commit per chunk.
+
+        Chunks are sized to stay under the server's max_allowed_packet. When a chunk fails it is rolled back and its
+        records are retried one at a time so that only the offending records are reported.
+
+        :param table_name: The name of the table to insert the records into.
+        :param records: A list of dictionaries representing the records to insert.
+        :param max_rows_per_chunk: Upper bound on records per INSERT statement.
+        :return: A list of failures, each {"index": position in records, "record": record, "error": exception}.
+        """
+        self.ensure_connection()
+        if not (self.cursor and self.connection):
+            raise Exception("Missing cursor or connection")
+
+        failures = []
+        with metrics.timer("AuroraSaveRecords"):
+            for columns, indexed_records in self._group_records_by_columns(records).items():
+                for chunk in self._chunk_records(indexed_records, max_rows_per_chunk):
+                    failures.extend(self._save_chunk(table_name, columns, chunk))
+
+        metrics.add_count("AuroraRecordFailures", len(failures))
+        return failures
+
+    def iter_query(self, sql, params=None, chunk_size=1000, as_dict=False):
+        """
+        Stream the rows of a query in chunks of at most `chunk_size` through an unbuffered cursor, so only one chunk
+        is held in memory however many rows the query returns.
+
+        The result set must be read to the end before the connection runs another statement; closing the generator
+        early drains the remaining rows, so prefer `iter_table` for scans that may stop part way.
+
+        :param sql: The SELECT statement, with %s placeholders.
+        :param params: Values for the placeholders.
+        :param chunk_size: Rows fetched from the server per chunk.
+        :param as_dict: Yield rows as dicts keyed by column name instead of tuples.
+        :return: A generator of Query_Chunk.
+        """
+        self.ensure_connection()
+        if not self.connection:
+            raise Exception("Missing cursor or connection")
+
+        # Because the shared cursor may be buffered, and a streaming read needs a cursor of its own
+        cursor = self.connection.cursor(buffered=False)
+        rows_read = 0
+        try:
+            cursor.execute(sql, params or ())
+            column_names = tuple(cursor.column_names)
+            while True:
+                with metrics.timer("AuroraFetchChunk"):
+                    rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                rows_read += len(rows)
+                self.last_used_at = time.monotonic()
+                yield Query_Chunk(AuroraMysql._shape_rows(rows, column_names, as_dict), column_names)
+        finally:
+            metrics.add_count("AuroraRowsRead", rows_read)
+            AuroraMysql._close_streaming_cursor(self.connection, cursor)
+
+    def iter_table(
+        self,
+        table_name,
+        key_columns,
+        columns="*",
+        where=None,
+        params=None,
+        chunk_size=1000,
+        start_after=None,
+        as_dict=False,
+    ):
+        """
+        Stream a table in primary key order with keyset paging: each chunk is its own bounded
+        `... WHERE key > last key ORDER BY key LIMIT chunk_size` query, so a scan can stop at any point and resume
+        later from the `last_key` of the last chunk it finished.
+
+        :param table_name: The table to read.
+        :param key_columns: The primary key column, or a sequence of columns for a composite key.
+        :param columns: Columns to select; the key columns are added when missing.
+        :param where: Optional extra condition, with %s placeholders filled from `params`.
+        :param chunk_size: Rows per page.
+        :param start_after: A key (a tuple for a composite key) to resume after.
+        :param as_dict: Yield rows as dicts keyed by column name instead of tuples.
+        :return: A generator of Query_Chunk whose `last_key` is the key of its final row.
+        """
+        key_columns = (key_columns,) if isinstance(key_columns, str) else tuple(key_columns)
+        if columns != "*":
+            columns = list(columns) + [key for key in key_columns if key not in columns]
+            columns = ", ".join(columns)
+        key_list = ", ".join(key_columns)
+        key_placeholders = ", ".join(["%s"] * len(key_columns))
+        conditions = [f"({where})"] if where else []
+        conditions.append(f"({key_list}) > ({key_placeholders})")
+
+        first_page_sql = f"SELECT {columns} FROM {table_name}"
+        if where:
+            first_page_sql += f" WHERE ({where})"
+        first_page_sql += f" ORDER BY {key_list} LIMIT %s"
+        next_page_sql = f"SELECT {columns} FROM {table_name} WHERE {' AND '.join(conditions)}"
+        next_page_sql += f" ORDER BY {key_list} LIMIT %s"
+
+        last_key = None if start_after is None else (start_after if isinstance(start_after, tuple) else (start_after,))
+        key_indexes = None
+        while True:
+            if last_key is None:
+                page_params = (*(params or ()), chunk_size)
+                page_sql = first_page_sql
+            else:
+                page_params = (*(params or ()), *last_key, chunk_size)
+                page_sql = next_page_sql
+
+            # Because LIMIT matches chunk_size, each page arrives as a single chunk
+            pages = list(self.iter_query(page_sql, page_params, chunk_size=chunk_size))
+            if not pages:
+                return
+            page = pages[0]
+
+            # Because the key positions are found once per scan, not per row
+            if key_indexes is None:
+                key_indexes = [page.column_names.index(key) for key in key_columns]
+            last_key = tuple(page.rows[-1][index] for index in key_indexes)
+            rows = AuroraMysql._shape_rows(page.rows, page.column_names, as_dict)
+            yield Query_Chunk(rows, page.column_names, last_key[0] if len(last_key) == 1 else last_key)
+
+            if len(page.rows) < chunk_size:
+                return
+
+    @staticmethod
+    def _shape_rows(rows, column_names, as_dict):
+        if not as_dict:
+            return rows
+        return [dict(zip(column_names, row)) for row in rows]
+
+    @staticmethod
+    def _close_streaming_cursor(connection, cursor):
+        try:
+            # Because the connection refuses new statements while rows of an unbuffered result are unread
+            if getattr(connection, "unread_result", False):
+                connection.consume_results()
+            cursor.close()
+        except Exception as e:
+            logger.info(f"Error closing streaming mysql cursor: {e}")
+
+    def get_max_allowed_packet(self):
+        # Because the limit only changes with server configuration, we look it up once per connection
+        if self.max_allowed_packet is None:
+            try:
+                self.cursor.execute("SELECT @@max_allowed_packet")
+                self.max_allowed_packet = int(self.cursor.fetchone()[0])
+            except Exception as e:
+                logger.info(f"Could not read max_allowed_packet, using default: {e}")
+                self.max_allowed_packet = DEFAULT_MAX_ALLOWED_PACKET
+        return self.max_allowed_packet
+
+    @staticmethod
+    def _group_records_by_columns(records):
+        # Because one multi-row INSERT needs every row to share a column list
+        records_by_columns = {}
+        for index, record in enumerate(records):
+            records_by_columns.setdefault(tuple(record.keys()), []).append((index, record))
+        return records_by_columns
+
+    def _chunk_records(self, indexed_records, max_rows_per_chunk):
+        # Because we leave headroom for the statement text and the protocol framing
+        packet_budget = int(self.get_max_allowed_packet() * PACKET_SAFETY_RATIO)
+        chunk = []
+        chunk_size = 0
+        for indexed_record in indexed_records:
+            record_size = AuroraMysql._estimate_record_size(indexed_record[1])
+            if chunk and (len(chunk) >= max_rows_per_chunk or chunk_size + record_size > packet_budget):
+                yield chunk
+                chunk = []
+                chunk_size = 0
+            chunk.append(indexed_record)
+            chunk_size += record_size
+        if chunk:
+            yield chunk
+
+    @staticmethod
+    def _estimate_record_size(record):
+        # Because escaping can double a value, we assume the worst case plus quotes and separators
+        return sum(len(str(value).encode("utf-8")) * 2 + 4 for value in record.values()) + 4
+
+    def _save_chunk(self, table_name, columns, chunk):
+        sql = AuroraMysql.insert_sql(table_name, columns, len(chunk))
+        values = [value for _, record in chunk for value in record.values()]
+
+        try:
+            self.cursor.execute(sql, values)
+            self.connection.commit()
+            return []
+        except Exception as e:
+            logger.info(f"Multi-row insert into {table_name} failed, retrying {len(chunk)} records individually: {e}")
+            self.connection.rollback()
+
+        # isolate the failing records; each one commits on its own, because a deadlock or lock wait timeout rolls back
+        # the whole transaction and would take the rows inserted before it along
+        failures = []
+        sql = AuroraMysql.insert_sql(table_name, columns)
+        for index, record in chunk:
+            try:
+                self.cursor.execute(sql, tuple(record.values()))
+                self.connection.commit()
+            except Exception as e:
+                failures.append({"index": index, "record": record, "error": e})
+                self.connection.rollback()
+        return failures
@@ -1,14 +1,112 @@
-import json
-from typing import Dict, Any, Union
-from protocol.event_protocol import Event_Helpers
-from protocol.logger_protocol import logger
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Union
+from protocol.claim_check_protocol import Claim_Check
+from protocol.logger_protocol import log_payload, logger
+from protocol.metrics_protocol import metrics
 from static.types import RunTaskResponse
 from static.constants import get_read_only_constants
+from static.formatting import to_json
+
+# Because ECS reports throttling with these error codes on the control plane APIs
+THROTTLING_ERROR_CODES = {"ThrottlingException", "Throttling", "TooManyRequestsException", "RequestLimitExceeded"}
+
+
+class Token_Bucket:
+    """
+    Thread-safe token bucket shared by the RunTask workers.
+
+    The refill rate adapts: it halves whenever ECS throttles us and recovers additively on each success, up to the
+    configured rate.
+    """
+
+    def __init__(self, rate_per_second: float, capacity: Optional[float] = None, min_rate_per_second: float = 0.5):
+        self.max_rate_per_second = rate_per_second
+        self.min_rate_per_second = min(min_rate_per_second, rate_per_second)
+        self.rate_per_second = rate_per_second
+        self.capacity = capacity or max(1.0, rate_per_second)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_seconds = (1 - self.tokens) / self.rate_per_second
+            time.sleep(wait_seconds)
+
+    def on_throttle(self):
+        with self._lock:
+            self._refill()
+            self.rate_per_second = max(self.min_rate_per_second, self.rate_per_second / 2)
+
+    def on_success(self):
+        with self._lock:
+            self._refill()
+            self.rate_per_second = min(self.max_rate_per_second, self.rate_per_second + self.max_rate_per_second * 0.1)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate_per_second)
+        self.updated_at = now
+
+
+class Task_Batcher:
+    """
+    Groups source events of the same `event_type` into batches so one Fargate task can process many records.
+
+    A batch is released when it reaches `max_batch_size` events; `flush` releases whatever is left. The batcher lives
+    for one `request_tasks` call, so batches are bounded by size only. Batches look like
+    {"event_type": str, "source_events": list}.
+    """
+
+    def __init__(self, max_batch_size: int):
+        self.max_batch_size = max(1, max_batch_size)
+        self._open_batches: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, source_event) -> List[Dict[str, Any]]:
+        event_type = source_event["event_type"]
+        batch = self._open_batches.setdefault(event_type, {"event_type": event_type, "source_events": []})
+        batch["source_events"].append(source_event)
+
+        if len(batch["source_events"]) >= self.max_batch_size:
+            return [self._release(event_type)]
+        return []
+
+    def flush(self) -> List[Dict[str, Any]]:
+        return [self._release(event_type) for event_type in list(self._open_batches)]
+
+    def _release(self, event_type) -> Dict[str, Any]:
+        return self._open_batches.pop(event_type)
 
 
 class Request_Tasks:
+    @staticmethod
+    def task_environment(event_type, source_events):
+        # Because ECS caps the size of container overrides, large payloads are passed as a pointer to s3
+        if len(source_events) == 1:
+            source_event_name, source_event_value = "SOURCE_EVENT", to_json(source_events[0])
+        else:
+            source_event_name, source_event_value = "SOURCE_EVENTS", to_json(source_events)
+
+        # Because the container has multiple task options, TASK tells it which to execute
+        return [
+            {"name": "TASK", "value": event_type},
+            {"name": source_event_name, "value": Claim_Check.pack(source_event_value, event_type)},
+        ]
+
     @staticmethod
     def run_task_command(dynamo_record, ecs_client):
+        return Request_Tasks.run_batch_task_command(dynamo_record["event_type"], [dynamo_record], ecs_client)
+
+    @staticmethod
+    def run_batch_task_command(event_type, source_events, ecs_client, environment=None):
         constants = get_read_only_constants()
         process_tasks_cluster_name = constants["PROCESS_TASKS_CLUSTER_NAME"]
         process_tasks_task_definition_arn = constants["PROCESS_TASKS_DEFINITION_ARN"]
@@ -34,49 +132,129 @@ class Request_Tasks:
                     {
                         "name": process_tasks_container_name,  # we should name this based on the type of task it is for clarity
                         "command": ["python3", "process_task.py"],
-                        "environment": [
-                            {"name": "TASK", "value": dynamo_record["event_type"]},
-                            {"name": "SOURCE_EVENT", "value": json.dumps(dynamo_record)},
-                        ],  # Because the container has multiple task options, this tells it which to execute
+                        "environment": environment or Request_Tasks.task_environment(event_type, source_events),
                     }
                 ]
             },
         )
 
-        logger.info(f"ECS response: {task_processor_response}")
+        log_payload("ECS response", task_processor_response)
 
         return task_processor_response
 
     @staticmethod
-    def request_task(source_event, ecs_client) -> Dict[str, Union[str, Any]]:
+    def is_throttling_error(error: Exception) -> bool:
+        response = getattr(error, "response", None) or {}
+        return response.get("Error", {}).get("Code") in THROTTLING_ERROR_CODES
+
+    @staticmethod
+    def run_task_with_retries(batch, ecs_client, rate_limiter: Optional[Token_Bucket] = None):
+        constants = get_read_only_constants()
+        max_attempts = constants["ECS_RUN_TASK_MAX_ATTEMPTS"]
+        # Because a throttled retry must not upload the claim check again, the payload is packed once per batch
+        environment = Request_Tasks.task_environment(batch["event_type"], batch["source_events"])
+        attempt = 0
+        while True:
+            if rate_limiter:
+                rate_limiter.acquire()
+            try:
+                with metrics.timer("EcsRunTask"):
+                    task_processor_response = Request_Tasks.run_batch_task_command(
+                        batch["event_type"], batch["source_events"], ecs_client, environment
+                    )
+            except Exception as e:
+                attempt += 1
+                if not Request_Tasks.is_throttling_error(e) or attempt >= max_attempts:
+                    raise
+                metrics.add_count("EcsThrottles")
+                if rate_limiter:
+                    rate_limiter.on_throttle()
+                # Because full jitter keeps throttled workers from retrying in lockstep
+                delay = random.uniform(0, min(constants["ECS_RUN_TASK_MAX_BACKOFF_SECONDS"], 0.1 * 2**attempt))
+                logger.info("ECS throttled run_task (attempt %d), retrying in %.2fs", attempt, delay)
+                time.sleep(delay)
+                continue
+
+            if rate_limiter:
+                rate_limiter.on_success()
+            return task_processor_response
+
+    @staticmethod
+    def request_task(
+        source_event, ecs_client, rate_limiter: Optional[Token_Bucket] = None
+    ) -> Dict[str, Union[str, Any]]:
+        batch = {"event_type": source_event["event_type"], "source_events": [source_event]}
+        return Request_Tasks.request_batch_task(batch, ecs_client, rate_limiter)[0]
+
+    @staticmethod
+    def request_batch_task(
+        batch, ecs_client, rate_limiter: Optional[Token_Bucket] = None
+    ) -> List[Dict[str, Union[str, Any]]]:
+        """
+        Launch one task for a batch and return one receipt per source event in it.
+        """
+        source_events = batch["source_events"]
         try:
-            task_processor_response = Request_Tasks.run_task_command(source_event, ecs_client)
+            task_processor_response = Request_Tasks.run_task_with_retries(batch, ecs_client, rate_limiter)
 
         except Exception as e:
             # return condition: error
-            logger.info(f"Error: could not complete call to ECS fargate: {e}")
-            return {"outcome": "error", "error": e, "source_event": source_event}
+            logger.info("Error: could not complete call to ECS fargate: %s", e)
+            return [{"outcome": "error", "error": e, "source_event": source_event} for source_event in source_events]
 
             # return condition: failure
         if task_processor_response.get("failures"):
-            return {
-                "outcome": "failure",
-                "failures": task_processor_response.get("failures"),
-                "source_event": source_event,
-            }
+            return [
+                {
+                    "outcome": "failure",
+                    "failures": task_processor_response.get("failures"),
+                    "source_event": source_event,
+                }
+                for source_event in source_events
+            ]
         else:
             # return condition: success
-            return {
-                "outcome": "success",
-                "source_event": source_event,
-            }
+            return [
+                {
+                    "outcome": "success",
+                    "source_event": source_event,
+                }
+                for source_event in source_events
+            ]
 
     @staticmethod
     def request_tasks(task_source_events, ecs_client):
-        failures = []
+        """
+        Request tasks from a bounded worker pool, sharing one rate limiter across workers.
+
+        With TASK_BATCH_SIZE above 1, events of the same event_type are packed into batches and each batch runs in a
+        single task.
+
+        :return: The receipts whose outcome is "error" or "failure", in source event order.
+        """
+        if not task_source_events:
+            return []
+
+        constants = get_read_only_constants()
+        task_batcher = Task_Batcher(constants["TASK_BATCH_SIZE"])
+        batches = []
         for task_source_event in task_source_events:
-            receipt = Request_Tasks.request_task(task_source_event, ecs_client)
-            if receipt["outcome"] == "error" or receipt["outcome"] == "failures":
-                failures.append(receipt)
+            batches.extend(task_batcher.add(task_source_event))
+        batches.extend(task_batcher.flush())
+
+        rate_limiter = Token_Bucket(constants["ECS_RUN_TASK_RATE_PER_SECOND"])
+        max_workers = min(constants["ECS_RUN_TASK_MAX_WORKERS"], len(batches))
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="run-task") as executor:
+            receipts_by_batch = list(
+                executor.map(lambda batch: Request_Tasks.request_batch_task(batch, ecs_client, rate_limiter), batches)
+            )
+
+        # Because batching groups by event_type, we restore the order the source events arrived in
+        positions = {id(task_source_event): position for position, task_source_event in enumerate(task_source_events)}
+        receipts = sorted(
+            (receipt for batch_receipts in receipts_by_batch for receipt in batch_receipts),
+            key=lambda receipt: positions[id(receipt["source_event"])],
+        )
 
-        return failures
+        return [receipt for receipt in receipts if receipt["outcome"] in ("error", "failure")]
@@ -0,0 +1,155 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional
+from protocol.logger_protocol import logger
+from protocol.metrics_protocol import metrics
+from static.constants import get_read_only_constants
+
+# route name -> semaphore; module level so a chunk still running from an earlier invocation keeps its slot
+route_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+route_semaphores_lock = threading.Lock()
+
+
+class Route_Executor:
+    """
+    Runs independent routes concurrently so handler latency follows the slowest route rather than the sum of them.
+
+    A route is a dict:
+        name (str): Identifies the route in logs and owns its concurrency limit.
+        source_events (list): Events the route processes.
+        process (callable): Takes a list of source events and returns the ones that failed.
+        max_concurrency (int, optional): Chunks of this route allowed to run at once, defaults to 1. Routes sharing
+            a client that is not thread-safe (e.g. the mysql connection) must keep this at 1.
+        batch_size (int, optional): Source events per chunk, defaults to all of them.
+        workload (str, optional): "io" (default) chunks run on the thread pool; "cpu" chunks run one at a time on the
+            calling thread while the io chunks wait on the network, because threads only add GIL contention to
+            computation and lambda has no shared memory for a process pool.
+
+    When `context` carries a lambda deadline, chunks that have not started before it (less a safety margin) never start
+    and are reported as failed so the stream retries them. A chunk that already started is left to finish on its own
+    thread and keeps its route's slot until it actually returns; its events are reported as failed too, because lambda
+    may freeze or recycle the environment before it does, and are also listed in `unfinished` so their idempotency
+    claims can hold off the retry while the first attempt may still write.
+    """
+
+    def __init__(self, context=None, deadline_margin_ms: Optional[float] = None):
+        constants = get_read_only_constants()
+        self.deadline_margin_ms = (
+            deadline_margin_ms if deadline_margin_ms is not None else constants["ROUTE_DEADLINE_MARGIN_MS"]
+        )
+        self.deadline = Route_Executor.deadline_from_context(context, self.deadline_margin_ms)
+        self.unfinished: List[Any] = []
+        self._states_lock = threading.Lock()
+
+    @staticmethod
+    def deadline_from_context(context, deadline_margin_ms: float) -> Optional[float]:
+        get_remaining_time_in_millis = getattr(context, "get_remaining_time_in_millis", None)
+        if not callable(get_remaining_time_in_millis):
+            return None
+        return time.monotonic() + (get_remaining_time_in_millis() - deadline_margin_ms) / 1000
+
+    def remaining_seconds(self) -> Optional[float]:
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def run(self, routes: List[Dict[str, Any]]) -> List[Any]:
+        """
+        Process every route and return the merged list of failed source events, including the events of chunks still
+        running at the deadline, which are also collected in `unfinished`.
+        """
+        chunks = [
+            (route, chunk)
+            for route in routes
+            for chunk in Route_Executor.chunk_source_events(route["source_events"], route.get("batch_size"))
+        ]
+        if not chunks:
+            return []
+
+        io_chunks = [(route, chunk) for route, chunk in chunks if route.get("workload", "io") != "cpu"]
+        cpu_chunks = [(route, chunk) for route, chunk in chunks if route.get("workload", "io") == "cpu"]
+
+        executor = None
+        futures = {}
+        if io_chunks:
+            io_routes = {id(route): route for route, _ in io_chunks}.values()
+            max_workers = sum(route.get("max_concurrency", 1) for route in io_routes)
+            executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="route")
+            for route, chunk in io_chunks:
+                state = {"status": "pending"}
+                futures[executor.submit(self._run_chunk, route, chunk, state)] = (route, chunk, state)
+
+        failures = []
+        for route, chunk in cpu_chunks:
+            if self.remaining_seconds() == 0:
+                logger.info("Route %s did not start %d events before the deadline", route["name"], len(chunk))
+                failures.extend(chunk)
+                continue
+            failures.extend(self._run_chunk(route, chunk, {"status": "pending"}))
+
+        if executor is None:
+            return failures
+
+        done, not_done = wait(futures, timeout=self.remaining_seconds())
+        for future in done:
+            failures.extend(future.result())
+        for future in not_done:
+            route, chunk, state = futures[future]
+            with self._states_lock:
+                started = state["status"] == "started"
+                if not started:
+                    # Because a chunk still queued or waiting for its route's slot must not start once it is reported
+                    state["status"] = "cancelled"
+            if started:
+                logger.info("Route %s is still processing %d events at the deadline", route["name"], len(chunk))
+                self.unfinished.extend(chunk)
+                failures.extend(chunk)
+            else:
+                future.cancel()
+                logger.info("Route %s did not start %d events before the deadline", route["name"], len(chunk))
+                failures.extend(chunk)
+
+        # Because waiting on chunks past the deadline would time out the whole invocation
+        executor.shutdown(wait=not not_done, cancel_futures=True)
+        return failures
+
+    def _run_chunk(self, route: Dict[str, Any], chunk: List[Any], state: Dict[str, str]) -> List[Any]:
+        semaphore = Route_Executor.route_semaphore(route["name"], route.get("max_concurrency", 1))
+        if not semaphore.acquire(timeout=self.remaining_seconds()):
+            logger.info("Route %s had no free slot before the deadline", route["name"])
+            return list(chunk)
+
+        with self._states_lock:
+            if state["status"] == "cancelled":
+                semaphore.release()
+                return list(chunk)
+            state["status"] = "started"
+
+        started_at = time.perf_counter()
+        try:
+            return route["process"](chunk)
+        except Exception as e:
+            logger.info("Route %s failed for %d events: %s", route["name"], len(chunk), e)
+            return list(chunk)
+        finally:
+            # Because the slot is only free once the route's work has actually stopped
+            semaphore.release()
+            elapsed_seconds = time.perf_counter() - started_at
+            logger.info("Route %s processed %d events in %.3fs", route["name"], len(chunk), elapsed_seconds)
+            metrics.put_timing(f"Route.{route['name']}", elapsed_seconds * 1000)
+
+    @staticmethod
+    def route_semaphore(name: str, max_concurrency: int) -> threading.BoundedSemaphore:
+        with route_semaphores_lock:
+            if name not in route_semaphores:
+                route_semaphores[name] = threading.BoundedSemaphore(max(1, max_concurrency))
+            return route_semaphores[name]
+
+    @staticmethod
+    def chunk_source_events(source_events: List[Any], batch_size: Optional[int]) -> List[List[Any]]:
+        if not source_events:
+            return []
+        if not batch_size:
+            return [list(source_events)]
+        return [source_events[start : start + batch_size] for start in range(0, len(source_events), batch_size)]
@@ -1,10 +1,88 @@
+import os
 import json
+import time
 import base64
+import hashlib
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, Tuple
+from protocol.logger_protocol import logger
+from protocol.metrics_protocol import metrics
+
+DEFAULT_SECRET_CACHE_TTL_SECONDS = 300
+DEFAULT_SECRET_CACHE_DIRECTORY = "/tmp/secret-cache"
 
 
 class Secrets_Manager:
+    # secret name -> (monotonic expiry, secret)
+    _cache: Dict[str, Tuple[float, Any]] = {}
+    # secret name -> future shared by every caller waiting on the same fetch
+    _in_flight: Dict[str, Future] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def get_secret(secret_name: str, secret_manager_client, force_refresh: bool = False):
+        """
+        Return a secret from the in-memory cache, the encrypted /tmp cache, or Secrets Manager, in that order.
+
+        Concurrent callers for the same secret share one fetch. Use `force_refresh` after an authentication failure
+        so a rotated password is picked up without a redeploy.
+
+        Settings (environment): SECRET_CACHE_TTL_SECONDS, and SECRET_CACHE_ENCRYPTION_KEY (a Fernet key) to enable
+        persistence under SECRET_CACHE_DIRECTORY across container reuse.
+        """
+        with Secrets_Manager._lock:
+            cached = Secrets_Manager._cache.get(secret_name)
+            if cached and not force_refresh and cached[0] > time.monotonic():
+                metrics.add_count("SecretCacheHits")
+                return cached[1]
+
+            future = Secrets_Manager._in_flight.get(secret_name)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                Secrets_Manager._in_flight[secret_name] = future
+
+        if not is_owner:
+            return future.result()
+
+        try:
+            secret = None if force_refresh else Secrets_Manager._read_persisted_secret(secret_name)
+            if secret is None:
+                with metrics.timer("GetSecret"):
+                    secret = Secrets_Manager.fetch_secret(secret_name, secret_manager_client)
+                Secrets_Manager._write_persisted_secret(secret_name, secret)
+
+            with Secrets_Manager._lock:
+                expires_at = time.monotonic() + Secrets_Manager._ttl_seconds()
+                Secrets_Manager._cache[secret_name] = (expires_at, secret)
+            future.set_result(secret)
+            return secret
+
+        except Exception as e:
+            future.set_exception(e)
+            raise
+
+        finally:
+            with Secrets_Manager._lock:
+                Secrets_Manager._in_flight.pop(secret_name, None)
+
+    @staticmethod
+    def invalidate(secret_name: str):
+        with Secrets_Manager._lock:
+            Secrets_Manager._cache.pop(secret_name, None)
+        try:
+            os.remove(Secrets_Manager._persisted_path(secret_name))
+        except FileNotFoundError:
+            pass
+
     @staticmethod
-    def get_secret(secret_name: str, secret_manager_client):
+    def clear_cache():
+        with Secrets_Manager._lock:
+            Secrets_Manager._cache.clear()
+
+    @staticmethod
+    def fetch_secret(secret_name: str, secret_manager_client):
         try:
             response = secret_manager_client.get_secret_value(SecretId=secret_name)
 
@@ -24,3 +102,55 @@ class Secrets_Manager:
 
         except Exception as e:
             raise ValueError(f"Error retrieving secret {secret_name}: {str(e)}")
+
+    @staticmethod
+    def _ttl_seconds() -> float:
+        return float(os.environ.get("SECRET_CACHE_TTL_SECONDS") or DEFAULT_SECRET_CACHE_TTL_SECONDS)
+
+    @staticmethod
+    def _persisted_path(secret_name: str) -> str:
+        directory = os.environ.get("SECRET_CACHE_DIRECTORY") or DEFAULT_SECRET_CACHE_DIRECTORY
+        return os.path.join(directory, hashlib.sha256(secret_name.encode("utf-8")).hexdigest())
+
+    @staticmethod
+    def _cipher():
+        encryption_key = os.environ.get("SECRET_CACHE_ENCRYPTION_KEY")
+        if not encryption_key:
+            return None
+        try:
+            # Because persistence is optional, cryptography is only needed when it is turned on
+            from cryptography.fernet import Fernet
+        except ImportError:
+            logger.info("SECRET_CACHE_ENCRYPTION_KEY is set but cryptography is not installed; not persisting secrets")
+            return None
+        return Fernet(encryption_key)
+
+    @staticmethod
+    def _read_persisted_secret(secret_name: str):
+        cipher = Secrets_Manager._cipher()
+        if not cipher:
+            return None
+        try:
+            with open(Secrets_Manager._persisted_path(secret_name), "rb") as persisted_file:
+                return json.loads(cipher.decrypt(persisted_file.read(), ttl=int(Secrets_Manager._ttl_seconds())))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            # Because an expired, corrupt or foreign cache file should never block a fresh fetch
+            logger.info(f"Ignoring persisted secret cache for {secret_name}: {e}")
+            return None
+
+    @staticmethod
+    def _write_persisted_secret(secret_name: str, secret):
+        cipher = Secrets_Manager._cipher()
+        if not cipher:
+            return
+        path = Secrets_Manager._persisted_path(secret_name)
+        try:
+            os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+            temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}"
+            with open(os.open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb") as persisted_file:
+                persisted_file.write(cipher.encrypt(json.dumps(secret).encode("utf-8")))
+            os.replace(temporary_path, path)
+        except Exception as e:
+            logger.info(f"Could not persist secret cache for {secret_name}: {e}")
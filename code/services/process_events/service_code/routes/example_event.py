@@ -1,27 +1,54 @@
 from typing import Any, List
 from protocol.logger_protocol import logger
+from protocol.dynamo_protocol import Dynamo_Batch_Writer
+from protocol.event_protocol import route_registry
+from static.formatting import to_json
 import datetime
-import json
 
 
 def process_example_events(source_events: List[Any], mysql_client, event_source_table_client):
     failures = []
-    for source_event in source_events:
-        iso_time_stamp = datetime.datetime.now().isoformat()
+    if not source_events:
+        return failures
 
-        # aurora save logic
-        try:
-            mysql_client.save_record(
-                "example",
-                {"message": f"This is a sample message on {iso_time_stamp}: {json.dumps(source_event)}"},
-            )
+    iso_time_stamp = datetime.datetime.now().isoformat()
 
-            # dynamo save logic
-            item = {"partition": "a", "sort": "b", "payload": f"example {iso_time_stamp}"}
-            event_source_table_client.put_item(Item=item)
+    # aurora save logic: one multi-row insert and commit per chunk instead of per event
+    records = [
+        {"message": f"This is a sample message on {iso_time_stamp}: {to_json(source_event)}"}
+        for source_event in source_events
+    ]
+    try:
+        failed_indexes = {failure["index"] for failure in mysql_client.save_records("example", records)}
+    except Exception as e:
+        logger.info(f"Failed to upload example records to aurora: {e}")
+        return list(source_events)
 
-        except Exception as e:
+    # dynamo save logic: collected and flushed through BatchWriteItem
+    dynamo_writer = Dynamo_Batch_Writer(event_source_table_client, key_names=("partition", "sort"))
+    for index, source_event in enumerate(source_events):
+        if index in failed_indexes:
             logger.info(f"Failed to upload example records {source_event}")
             failures.append(source_event)
+            continue
+
+        item = {"partition": "a", "sort": "b", "payload": f"example {iso_time_stamp}"}
+        dynamo_writer.put_item(item, source_event)
+
+    for failure in dynamo_writer.flush():
+        logger.info(f"Failed to upload example records {failure['source_event']}: {failure['error']}")
+        failures.append(failure["source_event"])
 
     return failures
+
+
+# Something processed in this lambda; one chunk at a time because the mysql connection is not thread-safe
+@route_registry.route(
+    "EVENT_EXAMPLE",
+    required_clients=("mysql_client", "event_source_table_client"),
+    batch_size=500,
+    max_concurrency=1,
+    workload="io",
+)
+def example_event_route(source_events: List[Any], aws_clients):
+    return process_example_events(source_events, aws_clients["mysql_client"], aws_clients["event_source_table_client"])
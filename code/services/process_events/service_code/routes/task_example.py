@@ -0,0 +1,10 @@
+from typing import Any, List
+from protocol.event_protocol import route_registry
+from protocol.request_task_protocol import Request_Tasks
+
+
+# Something processed in a fargate; request_tasks runs its own bounded pool of ECS calls
+@route_registry.route("TASK_EXAMPLE", required_clients=("ecs_client", "s3_client"), max_concurrency=1, workload="io")
+def task_example_route(source_events: List[Any], aws_clients):
+    receipts = Request_Tasks.request_tasks(source_events, aws_clients["ecs_client"])
+    return [receipt["source_event"] for receipt in receipts]
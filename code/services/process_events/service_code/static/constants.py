@@ -12,6 +12,28 @@ def get_read_only_constants():
     PROCESS_TASKS_CLUSTER_NAME = os.environ.get("PROCESS_TASKS_CLUSTER_NAME")
     PROCESS_TASKS_DEFINITION_ARN = os.environ.get("PROCESS_TASKS_TASK_DEFINITION_ARN")
     PROCESS_TASKS_CONTAINER_NAME = os.environ.get("PROCESS_TASKS_CONTAINER_NAME")
+    MYSQL_MAX_IDLE_SECONDS = os.environ.get("MYSQL_MAX_IDLE_SECONDS")
+    MYSQL_MAX_AGE_SECONDS = os.environ.get("MYSQL_MAX_AGE_SECONDS")
+    MYSQL_USE_PURE = os.environ.get("MYSQL_USE_PURE")
+    ECS_RUN_TASK_MAX_WORKERS = int(os.environ.get("ECS_RUN_TASK_MAX_WORKERS", 8))
+    ECS_RUN_TASK_RATE_PER_SECOND = float(os.environ.get("ECS_RUN_TASK_RATE_PER_SECOND", 10))
+    ECS_RUN_TASK_MAX_ATTEMPTS = int(os.environ.get("ECS_RUN_TASK_MAX_ATTEMPTS", 5))
+    ECS_RUN_TASK_MAX_BACKOFF_SECONDS = float(os.environ.get("ECS_RUN_TASK_MAX_BACKOFF_SECONDS", 5))
+    TASK_BATCH_SIZE = int(os.environ.get("TASK_BATCH_SIZE", 1))
+    PROCESS_TASKS_BUCKET_NAME = os.environ.get("PROCESS_TASKS_BUCKET_NAME")
+    # Because the 8KiB ECS override limit also has to fit the command, names and other variables
+    CLAIM_CHECK_THRESHOLD_BYTES = int(os.environ.get("CLAIM_CHECK_THRESHOLD_BYTES", 4096))
+    # Because the handler still has to build its response after the routes stop
+    ROUTE_DEADLINE_MARGIN_MS = float(os.environ.get("ROUTE_DEADLINE_MARGIN_MS", 1000))
+    # Because a large stream batch is processed in chunks, with a deadline check between them
+    STREAM_CHUNK_SIZE = int(os.environ.get("STREAM_CHUNK_SIZE", 100))
+    IDEMPOTENCY_TABLE_NAME = os.environ.get("IDEMPOTENCY_TABLE_NAME")
+    IDEMPOTENCY_CACHE_SIZE = int(os.environ.get("IDEMPOTENCY_CACHE_SIZE", 10000))
+    # Because a replay can arrive as long as the stream retains the record (24 hours)
+    IDEMPOTENCY_COMPLETED_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_COMPLETED_TTL_SECONDS", 86400))
+    # Because claims normally lapse at the invocation deadline, this only applies when there is no lambda context
+    IDEMPOTENCY_IN_PROGRESS_SECONDS = int(os.environ.get("IDEMPOTENCY_IN_PROGRESS_SECONDS", 900))
+    IDEMPOTENCY_MAX_WORKERS = int(os.environ.get("IDEMPOTENCY_MAX_WORKERS", 8))
 
     constants = {
         "DEPLOYMENT_ENVIRONMENT": DEPLOYMENT_ENVIRONMENT,
@@ -23,6 +45,23 @@ def get_read_only_constants():
         "PROCESS_TASKS_CLUSTER_NAME": PROCESS_TASKS_CLUSTER_NAME,
         "PROCESS_TASKS_DEFINITION_ARN": PROCESS_TASKS_DEFINITION_ARN,
         "PROCESS_TASKS_CONTAINER_NAME": PROCESS_TASKS_CONTAINER_NAME,
+        "MYSQL_MAX_IDLE_SECONDS": MYSQL_MAX_IDLE_SECONDS,
+        "MYSQL_MAX_AGE_SECONDS": MYSQL_MAX_AGE_SECONDS,
+        "MYSQL_USE_PURE": MYSQL_USE_PURE,
+        "ECS_RUN_TASK_MAX_WORKERS": ECS_RUN_TASK_MAX_WORKERS,
+        "ECS_RUN_TASK_RATE_PER_SECOND": ECS_RUN_TASK_RATE_PER_SECOND,
+        "ECS_RUN_TASK_MAX_ATTEMPTS": ECS_RUN_TASK_MAX_ATTEMPTS,
+        "ECS_RUN_TASK_MAX_BACKOFF_SECONDS": ECS_RUN_TASK_MAX_BACKOFF_SECONDS,
+        "TASK_BATCH_SIZE": TASK_BATCH_SIZE,
+        "PROCESS_TASKS_BUCKET_NAME": PROCESS_TASKS_BUCKET_NAME,
+        "CLAIM_CHECK_THRESHOLD_BYTES": CLAIM_CHECK_THRESHOLD_BYTES,
+        "ROUTE_DEADLINE_MARGIN_MS": ROUTE_DEADLINE_MARGIN_MS,
+        "STREAM_CHUNK_SIZE": STREAM_CHUNK_SIZE,
+        "IDEMPOTENCY_TABLE_NAME": IDEMPOTENCY_TABLE_NAME,
+        "IDEMPOTENCY_CACHE_SIZE": IDEMPOTENCY_CACHE_SIZE,
+        "IDEMPOTENCY_COMPLETED_TTL_SECONDS": IDEMPOTENCY_COMPLETED_TTL_SECONDS,
+        "IDEMPOTENCY_IN_PROGRESS_SECONDS": IDEMPOTENCY_IN_PROGRESS_SECONDS,
+        "IDEMPOTENCY_MAX_WORKERS": IDEMPOTENCY_MAX_WORKERS,
     }
 
     return constants
@@ -1,2 +1,23 @@
+import base64
+import json
+from collections.abc import Mapping
+
+
 def format_secret_key(prefix: str, deployment_environment: str) -> str:
     return prefix + "".join([part.capitalize() for part in deployment_environment.split("-")])
+
+
+def json_default(value):
+    # Because decoded stream records can hold sets, Binary and Decimal values that json cannot encode natively
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=str)
+    # Because a lazily decoded Dynamo_Image is a Mapping rather than a dict
+    if isinstance(value, Mapping):
+        return dict(value)
+    if hasattr(value, "value") and isinstance(value.value, (bytes, bytearray)):
+        return base64.b64encode(value.value).decode("ascii")
+    return str(value)
+
+
+def to_json(value) -> str:
+    return json.dumps(value, default=json_default)
@@ -1,7 +1,10 @@
-from typing import TypedDict, List, Literal, Any
-from protocol.mysql_protocol import AuroraMysql
-from mypy_boto3_dynamodb.service_resource import Table
-from mypy_boto3_dynamodb import ServiceResource
+from typing import TYPE_CHECKING, TypedDict, List, Literal, Any
+
+# Because the stub packages and the mysql connector are only needed by type checkers, they stay out of runtime imports
+if TYPE_CHECKING:
+    from protocol.mysql_protocol import AuroraMysql
+    from mypy_boto3_dynamodb.service_resource import Table
+    from mypy_boto3_dynamodb import ServiceResource
 
 
 class Container(TypedDict):
@@ -28,8 +31,8 @@ class RunTaskResponse(TypedDict):
 
 
 class AwsClientsDict(TypedDict):
-    dynamo_client: ServiceResource
-    event_source_table_client: Table
+    dynamo_client: "ServiceResource"
+    event_source_table_client: "Table"
     ecs_client: Any
     secrets_manager_client: Any
-    mysql_client: AuroraMysql
+    mysql_client: "AuroraMysql"
@@ -0,0 +1,98 @@
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+from app import handler
+from protocol.idempotency_protocol import Idempotency_Guard
+from benchmarks.synthetic_stream import build_stream_event
+
+
+@patch.dict(
+    "os.environ",
+    {
+        "PROCESS_TASKS_CLUSTER_NAME": "cluster_test",
+        "PROCESS_TASKS_CONTAINER_NAME": "container-test",
+    },
+)
+class TestHandlerBatchItemFailures(unittest.TestCase):
+    def setUp(self):
+        Idempotency_Guard.shared().clear()
+        self.ecs_client = MagicMock(name="ecs_client")
+        self.ecs_client.run_task.return_value = {"tasks": [{"taskArn": "arn"}], "failures": []}
+        self.mysql_client = MagicMock(name="mysql_client")
+        self.mysql_client.save_records.return_value = []
+        self.event_source_table_client = MagicMock(name="event_source_table_client")
+        self.event_source_table_client.meta.client.batch_write_item.return_value = {"UnprocessedItems": {}}
+        clients = {
+            "ecs_client": self.ecs_client,
+            "mysql_client": self.mysql_client,
+            "event_source_table_client": self.event_source_table_client,
+            "idempotency_table_client": None,
+        }
+        aws_clients = MagicMock(name="aws_clients")
+        aws_clients.__getitem__.side_effect = clients.__getitem__
+        patcher = patch("app.AwsClients.initialize_clients", return_value=aws_clients)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_successful_batch_reports_no_failures(self):
+        stream_event = build_stream_event(6)
+
+        self.assertEqual(handler(stream_event, {}), {"batchItemFailures": []})
+
+    def test_failed_records_are_reported_by_sequence_number(self):
+        stream_event = build_stream_event(6, event_type_mix={"EVENT_EXAMPLE": 1, "TASK_EXAMPLE": 1}, seed=3)
+        records = stream_event["Records"]
+        event_types = [record["dynamodb"]["NewImage"]["event_type"]["S"] for record in records]
+        first_event_example = event_types.index("EVENT_EXAMPLE")
+        first_task_example = event_types.index("TASK_EXAMPLE")
+        # the first EVENT_EXAMPLE row fails in aurora and every ECS call errors
+        self.mysql_client.save_records.return_value = [{"index": 0, "record": {}, "error": Exception("boom")}]
+        self.ecs_client.run_task.side_effect = Exception("AccessDenied")
+
+        response = handler(stream_event, {})
+
+        task_examples = [index for index, event_type in enumerate(event_types) if event_type == "TASK_EXAMPLE"]
+        expected = sorted([first_event_example] + task_examples)
+        self.assertIn(first_task_example, expected)
+        self.assertEqual(
+            response["batchItemFailures"],
+            [{"itemIdentifier": records[index]["dynamodb"]["SequenceNumber"]} for index in expected],
+        )
+
+    def test_replayed_records_skip_downstream_services(self):
+        stream_event = build_stream_event(6, event_type_mix={"EVENT_EXAMPLE": 1, "TASK_EXAMPLE": 1}, seed=4)
+        handler(stream_event, {})
+        self.mysql_client.save_records.reset_mock()
+        self.ecs_client.run_task.reset_mock()
+
+        self.assertEqual(handler(stream_event, {}), {"batchItemFailures": []})
+        self.mysql_client.save_records.assert_not_called()
+        self.ecs_client.run_task.assert_not_called()
+
+    @patch.dict("os.environ", {"STREAM_CHUNK_SIZE": "2", "ROUTE_DEADLINE_MARGIN_MS": "1000"})
+    def test_records_left_at_the_deadline_are_reported_for_retry(self):
+        stream_event = build_stream_event(6, event_type_mix={"EVENT_EXAMPLE": 1})
+        records = stream_event["Records"]
+        context = MagicMock(name="context")
+        # 300ms before the 1000ms margin: time for the first 200ms chunk, not for another
+        context.get_remaining_time_in_millis.return_value = 1300
+        self.mysql_client.save_records.side_effect = lambda table_name, rows: time.sleep(0.2) or []
+
+        response = handler(stream_event, context)
+
+        self.mysql_client.save_records.assert_called_once()
+        self.assertEqual(
+            response["batchItemFailures"],
+            [{"itemIdentifier": record["dynamodb"]["SequenceNumber"]} for record in records[2:]],
+        )
+
+    @patch.dict("os.environ", {"STREAM_CHUNK_SIZE": "2"})
+    def test_large_batch_is_processed_in_chunks(self):
+        stream_event = build_stream_event(6, event_type_mix={"EVENT_EXAMPLE": 1})
+
+        self.assertEqual(handler(stream_event, {}), {"batchItemFailures": []})
+        self.assertEqual(self.mysql_client.save_records.call_count, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
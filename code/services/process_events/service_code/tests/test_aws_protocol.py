@@ -0,0 +1,73 @@
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+from protocol.aws_protocol import Lazy_Aws_Clients
+
+
+class TestLazyAwsClients(unittest.TestCase):
+    def setUp(self):
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+        self.mysql_builds = []
+
+        def build_mysql():
+            self.mysql_builds.append(threading.current_thread().name)
+            self.release.wait(5)
+            return MagicMock(name="mysql_client")
+
+        self.aws_clients = Lazy_Aws_Clients({})
+        self.aws_clients._factories = {
+            "secrets_manager_client": lambda: MagicMock(name="secrets_manager_client"),
+            "ecs_client": lambda: MagicMock(name="ecs_client"),
+            "mysql_client": build_mysql,
+        }
+
+    def test_background_build_does_not_block_other_clients(self):
+        self.aws_clients.prefetch(["mysql_client", "ecs_client"])
+
+        # the ecs client was built on this thread while aurora is still connecting
+        self.assertTrue(self.aws_clients.is_initialized("ecs_client"))
+        self.assertFalse(self.aws_clients.is_initialized("mysql_client"))
+
+        self.release.set()
+        self.assertIs(self.aws_clients["mysql_client"], self.aws_clients["mysql_client"])
+        self.assertEqual(len(self.mysql_builds), 1)
+        self.assertTrue(self.mysql_builds[0].startswith("aws-clients"))
+
+    def test_lookups_do_not_wait_on_the_build_of_another_client(self):
+        building = threading.Thread(target=lambda: self.aws_clients["mysql_client"])
+        building.start()
+        self.addCleanup(building.join, 5)
+        while not self.mysql_builds:
+            time.sleep(0.01)
+
+        started_at = time.perf_counter()
+        self.aws_clients["ecs_client"]
+
+        self.assertLess(time.perf_counter() - started_at, 1)
+
+    def test_concurrent_lookups_build_a_client_once(self):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.aws_clients["mysql_client"])) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(len(self.mysql_builds), 1)
+        self.assertEqual(len({id(client) for client in results}), 1)
+
+    def test_failed_build_is_retried_by_the_next_lookup(self):
+        factory = MagicMock(side_effect=[Exception("timeout"), "ecs_client"])
+        self.aws_clients._factories["ecs_client"] = factory
+
+        with self.assertRaises(Exception):
+            self.aws_clients["ecs_client"]
+
+        self.assertEqual(self.aws_clients["ecs_client"], "ecs_client")
+
+
+if __name__ == "__main__":
+    unittest.main()
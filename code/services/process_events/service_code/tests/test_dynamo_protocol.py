@@ -0,0 +1,216 @@
+import json
+import pickle
+import unittest
+from decimal import Decimal
+from unittest.mock import patch, MagicMock
+from boto3.dynamodb.types import Binary, TypeDeserializer
+from protocol.dynamo_protocol import Dynamo_Batch_Writer, Dynamo_Decoder, Dynamo_Stream
+from benchmarks.synthetic_stream import build_stream_event
+from static.formatting import to_json
+
+
+class TestDynamoDecoder(unittest.TestCase):
+    def setUp(self):
+        self.images = [record["dynamodb"]["NewImage"] for record in build_stream_event(20)["Records"]]
+
+    def test_decimal_format_matches_type_deserializer(self):
+        deserializer = TypeDeserializer()
+        decoder = Dynamo_Decoder.shared("decimal")
+        for image in self.images:
+            expected = {key: deserializer.deserialize(value) for key, value in image.items()}
+            self.assertEqual(decoder.decode_item(image), expected)
+
+    def test_number_formats(self):
+        item = {"whole": {"N": "42"}, "fraction": {"N": "1.5"}, "numbers": {"NS": ["1", "2"]}}
+
+        self.assertEqual(
+            Dynamo_Decoder.shared("str").decode_item(item), {"whole": "42", "fraction": "1.5", "numbers": {"1", "2"}}
+        )
+        self.assertEqual(
+            Dynamo_Decoder.shared("int").decode_item(item),
+            {"whole": 42, "fraction": Decimal("1.5"), "numbers": {1, 2}},
+        )
+        self.assertEqual(
+            Dynamo_Decoder.shared("float").decode_item(item), {"whole": 42.0, "fraction": 1.5, "numbers": {1.0, 2.0}}
+        )
+        with self.assertRaises(ValueError):
+            Dynamo_Decoder("hex")
+
+    def test_nested_numbers_use_number_format(self):
+        item = {"metadata": {"M": {"version": {"N": "3"}, "steps": {"L": [{"N": "4"}]}}}}
+        decoded = Dynamo_Stream.un_marshall_dynamodb_item(item)
+        self.assertEqual(decoded, {"metadata": {"version": "3", "steps": ["4"]}})
+
+    def test_projection_only_decodes_requested_attributes(self):
+        item = {"event_type": {"S": "TASK_EXAMPLE"}, "unsupported": {"XX": "never decoded"}}
+        decoded = Dynamo_Stream.un_marshall_dynamodb_item(item, attributes=("event_type",))
+        self.assertEqual(decoded, {"event_type": "TASK_EXAMPLE"})
+
+    def test_binary_from_base64(self):
+        decoded = Dynamo_Decoder.shared().decode_item({"blob": {"B": "aGVsbG8="}, "blobs": {"BS": [b"hi"]}})
+        self.assertEqual(decoded, {"blob": Binary(b"hello"), "blobs": {Binary(b"hi")}})
+
+    def test_shared_decoders_are_reused(self):
+        self.assertIs(Dynamo_Decoder.shared("str", ["a"]), Dynamo_Decoder.shared("str", ("a",)))
+
+
+class TestDynamoStreamUnpack(unittest.TestCase):
+    def setUp(self):
+        self.stream_event = {
+            "Records": [
+                {
+                    "eventID": "1",
+                    "eventName": "INSERT",
+                    "dynamodb": {
+                        "SequenceNumber": "100",
+                        "Keys": {"id": {"S": "a"}},
+                        "NewImage": {"id": {"S": "a"}, "event_type": {"S": "KEEP"}, "blob": {"XX": "lazy"}},
+                    },
+                },
+                {
+                    "eventID": "2",
+                    "eventName": "INSERT",
+                    "dynamodb": {"SequenceNumber": "101", "NewImage": {"event_type": {"S": "SKIP"}, "bad": {"XX": 1}}},
+                },
+                {
+                    "eventID": "3",
+                    "eventName": "MODIFY",
+                    "dynamodb": {
+                        "SequenceNumber": "102",
+                        "Keys": {"id": {"S": "b"}},
+                        "NewImage": {"id": {"S": "b"}, "event_type": {"S": "KEEP"}, "count": {"N": "2"}},
+                        "OldImage": {"id": {"S": "b"}, "event_type": {"S": "KEEP"}, "count": {"N": "1"}},
+                    },
+                },
+                {
+                    "eventID": "4",
+                    "eventName": "REMOVE",
+                    "dynamodb": {
+                        "SequenceNumber": "103",
+                        "Keys": {"id": {"S": "c"}},
+                        "OldImage": {"id": {"S": "c"}, "event_type": {"S": "KEEP"}},
+                    },
+                },
+            ]
+        }
+
+    def test_filters_before_decoding_and_decodes_lazily(self):
+        unpacked = Dynamo_Stream.unpackDynamoValueFromStream(self.stream_event, event_types=("KEEP",), lazy=True)
+
+        self.assertEqual(unpacked["insert_sequence_numbers"], ["100"])
+        insert = unpacked["inserts"][0]
+        self.assertEqual(insert["id"], "a")
+        # Because the unsupported attribute is only decoded when it is read
+        with self.assertRaises(TypeError):
+            insert["blob"]
+        self.assertEqual(unpacked["updates"], [{"id": "b", "event_type": "KEEP", "count": "2"}])
+        self.assertEqual(unpacked["deletes"], [{"id": "c", "event_type": "KEEP"}])
+        self.assertIsNone(unpacked["records"][1].old_image)
+        self.assertIsNone(unpacked["records"][1].keys)
+
+    def test_event_names_and_requested_keys_and_old_images(self):
+        unpacked = Dynamo_Stream.unpackDynamoValueFromStream(
+            self.stream_event, event_names=("MODIFY",), include_keys=True, include_old_image=True, number_format="int"
+        )
+
+        self.assertEqual(unpacked["inserts"], [])
+        self.assertEqual(unpacked["deletes"], [])
+        record = unpacked["records"][0]
+        self.assertEqual((record.event_id, record.event_type), ("3", "KEEP"))
+        self.assertEqual(record.keys, {"id": "b"})
+        self.assertEqual(record.old_image["count"], 1)
+        self.assertEqual(record.new_image.to_dict()["count"], 2)
+
+    def test_images_are_plain_dicts_unless_lazy(self):
+        del self.stream_event["Records"][0]["dynamodb"]["NewImage"]["blob"]
+
+        unpacked = Dynamo_Stream.unpackDynamoValueFromStream(self.stream_event, event_types=("KEEP",))
+        lazy_insert = Dynamo_Stream.unpackDynamoValueFromStream(self.stream_event, lazy=True)["inserts"][0]
+
+        self.assertIs(type(unpacked["inserts"][0]), dict)
+        self.assertEqual(json.loads(to_json(unpacked["inserts"][0])), {"id": "a", "event_type": "KEEP"})
+        # a lazy view still serializes and pickles as the dict it decodes to
+        self.assertEqual(json.loads(to_json(lazy_insert)), {"id": "a", "event_type": "KEEP"})
+        self.assertEqual(pickle.loads(pickle.dumps(lazy_insert)), {"id": "a", "event_type": "KEEP"})
+
+    def test_records_without_a_new_image_are_left_out(self):
+        del self.stream_event["Records"][0]["dynamodb"]["NewImage"]
+        del self.stream_event["Records"][2]["dynamodb"]["NewImage"]
+
+        unpacked = Dynamo_Stream.unpackDynamoValueFromStream(
+            self.stream_event, event_names=("INSERT", "MODIFY"), lazy=True
+        )
+
+        self.assertEqual(unpacked["insert_sequence_numbers"], ["101"])
+        self.assertEqual(unpacked["inserts"][0]["event_type"], "SKIP")
+        self.assertEqual(unpacked["updates"], [])
+        self.assertEqual(len(unpacked["records"]), 3)
+
+    def test_delete_falls_back_to_keys_without_old_image(self):
+        del self.stream_event["Records"][3]["dynamodb"]["OldImage"]
+
+        unpacked = Dynamo_Stream.unpackDynamoValueFromStream(self.stream_event, event_names=("REMOVE",))
+
+        self.assertEqual(unpacked["deletes"], [{"id": "c"}])
+
+
+class TestDynamoBatchWriter(unittest.TestCase):
+    def setUp(self):
+        self.table = MagicMock(name="event_source_table_client")
+        self.table.name = "source-table-test"
+        self.client = self.table.meta.client
+
+    def test_batches_of_25_with_duplicate_keys_collapsed(self):
+        self.client.batch_write_item.return_value = {"UnprocessedItems": {}}
+        writer = Dynamo_Batch_Writer(self.table, key_names=("partition", "sort"))
+        for index in range(30):
+            writer.put_item({"partition": str(index), "sort": "a", "payload": "first"}, f"event-{index}")
+        writer.put_item({"partition": "0", "sort": "a", "payload": "second"}, "event-duplicate")
+
+        self.assertEqual(writer.flush(), [])
+
+        calls = self.client.batch_write_item.call_args_list
+        batches = [call.kwargs["RequestItems"]["source-table-test"] for call in calls]
+        self.assertEqual([len(batch) for batch in batches], [25, 5])
+        self.assertEqual(batches[0][0], {"PutRequest": {"Item": {"partition": "0", "sort": "a", "payload": "second"}}})
+
+    @patch("time.sleep")
+    def test_unprocessed_items_are_retried_and_reported_per_source_event(self, mock_sleep):
+        stuck_item = {"partition": "b", "sort": "b", "payload": "stuck"}
+        self.client.batch_write_item.return_value = {
+            "UnprocessedItems": {"source-table-test": [{"PutRequest": {"Item": stuck_item}}]}
+        }
+        writer = Dynamo_Batch_Writer(self.table, key_names=("partition", "sort"), max_attempts=3)
+        writer.put_item({"partition": "a", "sort": "a", "payload": "ok"}, "event-ok")
+        writer.put_item(stuck_item, "event-stuck-1")
+        writer.put_item(stuck_item, "event-stuck-2")
+
+        failures = writer.flush()
+
+        self.assertEqual([failure["source_event"] for failure in failures], ["event-stuck-1", "event-stuck-2"])
+        self.assertEqual(self.client.batch_write_item.call_count, 3)
+        last_batch = self.client.batch_write_item.call_args_list[-1].kwargs["RequestItems"]["source-table-test"]
+        self.assertEqual(len(last_batch), 1)
+        self.assertEqual(mock_sleep.call_count, 2)
+
+    @patch("time.sleep")
+    def test_only_throttling_errors_are_retried(self, mock_sleep):
+        throttled = Exception("Rate exceeded")
+        throttled.response = {"Error": {"Code": "ProvisionedThroughputExceededException"}}
+        invalid = Exception("One or more parameter values were invalid")
+        invalid.response = {"Error": {"Code": "ValidationException"}}
+        self.client.batch_write_item.side_effect = [throttled, invalid]
+        writer = Dynamo_Batch_Writer(self.table, key_names=("partition", "sort"), max_attempts=5)
+        writer.put_item({"partition": "a", "sort": "a"}, "event-invalid")
+
+        failures = writer.flush()
+
+        self.assertEqual(
+            [(failure["source_event"], failure["error"]) for failure in failures], [("event-invalid", invalid)]
+        )
+        self.assertEqual(self.client.batch_write_item.call_count, 2)
+        self.assertEqual(mock_sleep.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+from unittest.mock import patch
+from benchmarks.synthetic_stream import build_stream_event
+from protocol.dynamo_protocol import Dynamo_Decoder
+from protocol.event_protocol import Route_Registry
+
+
+class TestRouteRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = Route_Registry()
+        self.registry.register("EVENT_EXAMPLE", lambda source_events, aws_clients: [], required_clients=("a", "b"))
+        self.registry.register("TASK_EXAMPLE", lambda source_events, aws_clients: [], required_clients=("b", "c"))
+
+    def test_dispatch_groups_registered_inserts_in_stream_order(self):
+        stream_event = build_stream_event(
+            12, event_type_mix={"EVENT_EXAMPLE": 1, "TASK_EXAMPLE": 1, "UNROUTED": 1}, seed=5
+        )
+        records = stream_event["Records"]
+        routed = [
+            record
+            for record in records
+            if record["eventName"] == "INSERT"
+            and record["dynamodb"]["NewImage"]["event_type"]["S"] in ("EVENT_EXAMPLE", "TASK_EXAMPLE")
+        ]
+
+        dispatched = self.registry.dispatch(stream_event)
+
+        self.assertEqual(
+            dispatched["sequence_numbers"], [record["dynamodb"]["SequenceNumber"] for record in routed]
+        )
+        for event_type, source_events in dispatched["source_events_by_type"].items():
+            self.assertTrue(all(source_event["event_type"] == event_type for source_event in source_events))
+        self.assertNotIn("UNROUTED", dispatched["source_events_by_type"])
+
+    def test_unregistered_event_types_are_not_decoded(self):
+        stream_event = build_stream_event(4, event_type_mix={"UNROUTED": 1}, event_name_mix={"INSERT": 1})
+
+        with patch.object(Dynamo_Decoder, "decode_value") as decode_value:
+            dispatched = self.registry.dispatch(stream_event)
+
+        decode_value.assert_not_called()
+        self.assertEqual(dispatched["source_events"], [])
+
+    def test_routed_inserts_decode_only_the_attributes_read(self):
+        stream_event = build_stream_event(2, event_type_mix={"TASK_EXAMPLE": 1}, event_name_mix={"INSERT": 1})
+        del stream_event["Records"][1]["dynamodb"]["NewImage"]
+
+        with patch.object(Dynamo_Decoder, "decode_value", return_value="TASK_EXAMPLE") as decode_value:
+            dispatched = self.registry.dispatch(stream_event)
+            self.assertEqual(dispatched["source_events"][0]["event_type"], "TASK_EXAMPLE")
+
+        # the insert without a new image is skipped rather than failing the batch
+        self.assertEqual(len(dispatched["source_events"]), 1)
+        decode_value.assert_called_once()
+
+    def test_required_clients_cover_only_routes_with_events(self):
+        self.assertEqual(self.registry.required_clients({"TASK_EXAMPLE": ["event"], "EVENT_EXAMPLE": []}), ["b", "c"])
+        self.assertEqual(
+            self.registry.required_clients({"EVENT_EXAMPLE": ["event"], "TASK_EXAMPLE": ["event"]}), ["a", "b", "c"]
+        )
+
+    def test_built_routes_pass_the_clients_to_the_registered_process(self):
+        calls = []
+        self.registry.unregister("TASK_EXAMPLE")
+        self.registry.register("TASK_EXAMPLE", lambda source_events, aws_clients: calls.append(aws_clients) or [])
+
+        routes = self.registry.build_routes({"TASK_EXAMPLE": ["event"]}, "clients")
+
+        self.assertEqual(routes[0]["process"](["event"]), [])
+        self.assertEqual(calls, ["clients"])
+        self.assertEqual(routes[0]["workload"], "io")
+
+    def test_duplicate_registrations_are_rejected(self):
+        with self.assertRaises(ValueError):
+            self.registry.register("EVENT_EXAMPLE", lambda source_events, aws_clients: [])
+
+
+if __name__ == "__main__":
+    unittest.main()
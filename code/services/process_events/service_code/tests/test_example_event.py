@@ -1,5 +1,6 @@
 import unittest
 import json
+import mysql.connector
 from static.types import RunTaskResponse
 from unittest.mock import patch, MagicMock, call
 from app import handler
@@ -58,10 +59,11 @@ class TestProcessEventPermissions(unittest.TestCase):
                 }
             )
         }
-        mock_boto_client.side_effect = [
-            mock_ecs_client,
-            mock_secrets_manager_client,
-        ]
+        mock_boto_client.side_effect = lambda service_name, region_name: {
+            "ecs": mock_ecs_client,
+            "s3": MagicMock(name="s3_client"),
+            "secretsmanager": mock_secrets_manager_client,
+        }[service_name]
 
         # Create a mock cursor
         mock_cursor = MagicMock()
@@ -78,13 +80,28 @@ class TestProcessEventPermissions(unittest.TestCase):
                     "awsRegion": "us-west-2",
                     "dynamodb": {
                         "Keys": {"partition": {"S": "abc"}, "sort": {"S": "123"}},
-                        "NewImage": {"message": {"S": "New item!"}, "event_type": {"S": "TRANSFORM_SNAKE_DATA"}},
+                        "NewImage": {"message": {"S": "New item!"}, "event_type": {"S": "TASK_EXAMPLE"}},
                         "StreamViewType": "NEW_IMAGE",
                         "SequenceNumber": "111",
                         "SizeBytes": 26,
                     },
                     "eventSourceARN": "arn:aws:dynamodb:us-west-2:account-id:table/my-table/stream",
-                }
+                },
+                {
+                    "eventID": "2",
+                    "eventName": "INSERT",
+                    "eventVersion": "1.0",
+                    "eventSource": "aws:dynamodb",
+                    "awsRegion": "us-west-2",
+                    "dynamodb": {
+                        "Keys": {"partition": {"S": "def"}, "sort": {"S": "456"}},
+                        "NewImage": {"message": {"S": "Another item!"}, "event_type": {"S": "EVENT_EXAMPLE"}},
+                        "StreamViewType": "NEW_IMAGE",
+                        "SequenceNumber": "112",
+                        "SizeBytes": 30,
+                    },
+                    "eventSourceARN": "arn:aws:dynamodb:us-west-2:account-id:table/my-table/stream",
+                },
             ]
         }
 
@@ -96,8 +113,9 @@ class TestProcessEventPermissions(unittest.TestCase):
         mock_dynamo_resource.Table.assert_called_once_with("source-table-test")
         mock_boto_client.assert_has_calls(
             [
-                call("ecs", region_name="us-west-2-test"),  # first call
-                call("secretsmanager", region_name="us-west-2-test"),  # second call
+                call("secretsmanager", region_name="us-west-2-test"),  # first call, so aurora can connect early
+                call("ecs", region_name="us-west-2-test"),  # second call
+                call("s3", region_name="us-west-2-test"),  # prefetched for claim checks before the run-task threads
             ]
         )
         mock_mysql_connector.assert_called_once_with(
@@ -107,6 +125,7 @@ class TestProcessEventPermissions(unittest.TestCase):
             password="test_password",
             port=3306,
             connection_timeout=30,
+            use_pure=not mysql.connector.HAVE_CEXT,
         )
 
         # assert the ECS run task was called with the incoming event
@@ -136,10 +155,10 @@ class TestProcessEventPermissions(unittest.TestCase):
                         "name": process_tasks_container_name,
                         "command": ["python3", "process_task.py"],
                         "environment": [
-                            {"name": "TASK", "value": "TRANSFORM_SNAKE_DATA"},
+                            {"name": "TASK", "value": "TASK_EXAMPLE"},
                             {
                                 "name": "SOURCE_EVENT",
-                                "value": '{"message": "New item!", "event_type": "TRANSFORM_SNAKE_DATA"}',
+                                "value": '{"message": "New item!", "event_type": "TASK_EXAMPLE"}',
                             },
                         ],
                     }
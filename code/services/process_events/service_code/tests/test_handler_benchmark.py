@@ -0,0 +1,25 @@
+import unittest
+from benchmarks.handler_benchmark import percentile, run
+
+
+class TestHandlerBenchmark(unittest.TestCase):
+    def test_report_is_machine_readable(self):
+        zero_latency = {"aurora": 0, "aurora_per_row": 0, "dynamo": 0, "ecs": 0, "s3": 0}
+
+        result = run(batch_size=20, invocations=3, warmup=1, latency_ms=zero_latency)
+
+        self.assertEqual(result["reported_failures"], 0)
+        self.assertGreater(result["records_per_second"], 0)
+        self.assertEqual(set(result["handler_latency_ms"]), {"mean", "p50", "p95", "p99", "max"})
+        self.assertTrue({"dispatch", "routes", "response", "ecs"}.issubset(result["stage_ms_per_invocation"]))
+
+    def test_percentile_uses_nearest_rank(self):
+        values = list(range(1, 101))
+
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 95), 7)
+
+
+if __name__ == "__main__":
+    unittest.main()
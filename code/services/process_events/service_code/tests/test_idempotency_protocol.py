@@ -0,0 +1,139 @@
+import time
+import unittest
+from protocol.idempotency_protocol import Idempotency_Guard
+
+
+class ConditionalCheckFailed(Exception):
+    def __init__(self, item):
+        super().__init__("The conditional request failed")
+        self.response = {"Error": {"Code": "ConditionalCheckFailedException"}, "Item": item}
+
+
+class FakeIdempotencyTable:
+    """
+    Applies the claim condition (no item, or an expired one) to an in-memory table.
+    """
+
+    name = "idempotency"
+
+    def __init__(self, items=None, error=None):
+        self.items = dict(items or {})
+        self.error = error
+        # Because Dynamo_Batch_Writer calls table.meta.client.batch_write_item
+        self.meta = self
+        self.client = self
+
+    def put_item(self, Item, ConditionExpression, ExpressionAttributeValues, ReturnValuesOnConditionCheckFailure):
+        if self.error:
+            raise self.error
+        existing = self.items.get(Item["event_id"])
+        if existing and existing["expires_at"] >= ExpressionAttributeValues[":now"]:
+            raise ConditionalCheckFailed({key: {"S": str(value)} for key, value in existing.items()})
+        self.items[Item["event_id"]] = Item
+
+    def batch_write_item(self, RequestItems):
+        for request in RequestItems[self.name]:
+            item = request["PutRequest"]["Item"]
+            self.items[item["event_id"]] = item
+        return {"UnprocessedItems": {}}
+
+
+def new_guard():
+    return Idempotency_Guard(cache_size=2, completed_ttl_seconds=60, in_progress_seconds=30, max_workers=4)
+
+
+class TestIdempotencyGuard(unittest.TestCase):
+    def test_completed_records_are_skipped_from_the_cache(self):
+        guard = new_guard()
+        events = [{"n": 1}, {"n": 2}]
+
+        claims = guard.claim(events, ["a", "b"])
+        guard.settle(claims, failed_source_events=[events[1]])
+        replay = guard.claim(events, ["a", "b"])
+
+        self.assertEqual(claims["claimed"], events)
+        self.assertEqual(replay["completed"], [events[0]])
+        self.assertEqual(replay["claimed"], [events[1]])
+
+    def test_cache_evicts_the_least_recently_used(self):
+        guard = new_guard()
+        for event_id in ("a", "b", "c"):
+            guard.remember(event_id)
+
+        self.assertFalse(guard.is_completed("a"))
+        self.assertTrue(guard.is_completed("c"))
+
+    def test_table_claims_follow_the_existing_record(self):
+        now = int(time.time())
+        table = FakeIdempotencyTable(
+            {
+                "done": {"event_id": "done", "status": "COMPLETED", "expires_at": now + 60},
+                "held": {"event_id": "held", "status": "IN_PROGRESS", "expires_at": now + 60},
+                "lapsed": {"event_id": "lapsed", "status": "IN_PROGRESS", "expires_at": now - 1},
+            }
+        )
+        events = [{"id": event_id} for event_id in ("done", "held", "lapsed", "new")]
+
+        claims = new_guard().claim(events, ["done", "held", "lapsed", "new"], table, expires_at=now + 5)
+
+        self.assertEqual(claims["completed"], [events[0]])
+        self.assertEqual(claims["in_progress"], [events[1]])
+        self.assertEqual(claims["claimed"], events[2:])
+        self.assertEqual(table.items["new"], {"event_id": "new", "status": "IN_PROGRESS", "expires_at": now + 5})
+
+    def test_settle_completes_successes_and_releases_failures(self):
+        table = FakeIdempotencyTable()
+        guard = new_guard()
+        events = [{"n": 1}, {"n": 2}]
+        claims = guard.claim(events, ["a", "b"], table)
+
+        guard.settle(claims, [events[1]], table)
+        retry = new_guard().claim(events, ["a", "b"], table)
+
+        self.assertEqual(table.items["a"]["status"], "COMPLETED")
+        self.assertEqual(retry["completed"], [events[0]])
+        self.assertEqual(retry["claimed"], [events[1]])
+
+    def test_unfinished_records_reported_as_failed_stay_in_progress(self):
+        table = FakeIdempotencyTable()
+        guard = new_guard()
+        events = [{"n": 1}, {"n": 2}, {"n": 3}]
+        now = int(time.time())
+        claims = guard.claim(events, ["done", "failed", "running"], table, expires_at=now + 5)
+
+        guard.settle(claims, [events[1], events[2]], table, unfinished_source_events=[events[2]])
+        retry = new_guard().claim(events[1:], ["failed", "running"], table)
+
+        self.assertEqual(table.items["done"]["status"], "COMPLETED")
+        self.assertEqual(table.items["running"]["status"], "IN_PROGRESS")
+        self.assertGreaterEqual(table.items["running"]["expires_at"], now + 30)
+        self.assertEqual(retry["claimed"], [events[1]])
+        self.assertEqual(retry["in_progress"], [events[2]])
+
+    def test_unfinished_records_not_reported_as_failed_are_released(self):
+        table = FakeIdempotencyTable()
+        guard = new_guard()
+        events = [{"n": 1}]
+        claims = guard.claim(events, ["running"], table)
+
+        guard.settle(claims, [], table, unfinished_source_events=events)
+
+        self.assertEqual(table.items["running"]["status"], "RELEASED")
+        self.assertEqual(new_guard().claim(events, ["running"], table)["claimed"], events)
+
+    def test_unreachable_table_processes_records_unclaimed(self):
+        table = FakeIdempotencyTable(error=Exception("ProvisionedThroughputExceeded"))
+        events = [{"n": 1}]
+
+        self.assertEqual(new_guard().claim(events, ["a"], table)["claimed"], events)
+
+    def test_keep_claimed_filters_each_route(self):
+        first, second = {"n": 1}, {"n": 2}
+
+        kept = Idempotency_Guard.keep_claimed({"EVENT_EXAMPLE": [first, second], "TASK_EXAMPLE": [second]}, [first])
+
+        self.assertEqual(kept, {"EVENT_EXAMPLE": [first], "TASK_EXAMPLE": []})
+
+
+if __name__ == "__main__":
+    unittest.main()
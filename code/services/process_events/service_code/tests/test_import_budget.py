@@ -0,0 +1,13 @@
+import unittest
+from benchmarks.import_time_benchmark import measure
+
+
+class TestImportBudget(unittest.TestCase):
+    def test_heavy_packages_are_not_imported_at_init(self):
+        result = measure(module="app", repeat=1)
+
+        self.assertEqual(result["deferred_packages_loaded"], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
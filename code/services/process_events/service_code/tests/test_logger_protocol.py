@@ -0,0 +1,30 @@
+import logging
+import unittest
+from protocol.logger_protocol import Payload_Summary, flush_logs, log_payload, log_queue, logger
+
+
+class TestLoggerProtocol(unittest.TestCase):
+    def test_payload_summary_is_capped(self):
+        summary = str(Payload_Summary({"message": "x" * 100}, max_chars=20))
+
+        self.assertEqual(summary, '{"message":"xxxxxxxx...(94 more chars)')
+        self.assertEqual(str(Payload_Summary({"a": 1})), '{"a":1}')
+        self.assertEqual(str(Payload_Summary({"a": {1, 2}}, max_chars=100)), "{\"a\":\"{1, 2}\"}")
+
+    def test_payload_logs_are_sampled(self):
+        with self.assertLogs(logger, level=logging.INFO) as captured:
+            log_payload("dropped", {"a": 1}, sample_rate=0)
+            log_payload("kept", {"a": 1}, sample_rate=1)
+
+        self.assertEqual(captured.output, ['INFO:Run-Lambda:kept: {"a":1}'])
+
+    def test_flush_drains_the_queue(self):
+        logging.getLogger("Run-Lambda.flush-test").info("queued %s", "record")
+
+        flush_logs()
+
+        self.assertEqual(log_queue.unfinished_tasks, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import io
+import json
+import unittest
+from contextlib import redirect_stdout
+from protocol.metrics_protocol import MAX_VALUES_PER_METRIC, Invocation_Metrics
+
+
+class TestInvocationMetrics(unittest.TestCase):
+    def flush(self, metrics):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            metrics.flush()
+        return [json.loads(line) for line in output.getvalue().splitlines()]
+
+    def test_flush_writes_one_emf_document_per_invocation(self):
+        metrics = Invocation_Metrics("Namespace", "service")
+        with metrics.timer("Dispatch"):
+            pass
+        metrics.add_count("FailedRecords", 2)
+        metrics.add_count("FailedRecords", 1)
+
+        documents = self.flush(metrics)
+
+        self.assertEqual(len(documents), 1)
+        directive = documents[0]["_aws"]["CloudWatchMetrics"][0]
+        self.assertEqual(directive["Namespace"], "Namespace")
+        self.assertEqual(directive["Dimensions"], [["Service", "ColdStart"]])
+        self.assertIn({"Name": "Dispatch", "Unit": "Milliseconds"}, directive["Metrics"])
+        self.assertIn({"Name": "FailedRecords", "Unit": "Count"}, directive["Metrics"])
+        self.assertEqual(documents[0]["FailedRecords"], 3)
+        self.assertEqual(documents[0]["ColdStart"], "cold")
+
+    def test_later_invocations_are_warm_and_start_empty(self):
+        metrics = Invocation_Metrics("Namespace", "service")
+        metrics.add_count("Records", 1)
+        self.flush(metrics)
+
+        self.assertEqual(self.flush(metrics), [])
+        metrics.add_count("Records", 1)
+        self.assertEqual(self.flush(metrics)[0]["ColdStart"], "warm")
+
+    def test_timings_over_the_value_limit_span_several_documents(self):
+        metrics = Invocation_Metrics("Namespace", "service")
+        for _ in range(MAX_VALUES_PER_METRIC + 5):
+            metrics.put_timing("AuroraSaveRecord", 1)
+        metrics.add_count("Records", 105)
+
+        documents = self.flush(metrics)
+
+        self.assertEqual([len(document["AuroraSaveRecord"]) for document in documents], [MAX_VALUES_PER_METRIC, 5])
+        self.assertEqual(documents[0]["Records"], 105)
+        self.assertNotIn("Records", documents[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,221 @@
+import json
+import unittest
+from unittest.mock import patch, MagicMock
+import mysql.connector
+from protocol.mysql_protocol import AuroraMysql
+from protocol.secrets_manager_protocol import Secrets_Manager
+
+
+def build_aurora(mock_mysql_connector):
+    secrets_manager_client = MagicMock(name="secrets_manager_client")
+    secrets_manager_client.get_secret_value.return_value = {
+        "SecretString": json.dumps(
+            {"host": "localhost", "dbname": "test_db", "username": "test_user", "port": 3306, "password": "test"}
+        )
+    }
+    cursor = MagicMock(name="cursor")
+    mock_mysql_connector.return_value.cursor.return_value = cursor
+    return AuroraMysql({"DEPLOYMENT_ENVIRONMENT": "local-test"}, secrets_manager_client), cursor
+
+
+class TestAuroraMysqlSaveRecords(unittest.TestCase):
+    def setUp(self):
+        Secrets_Manager.clear_cache()
+
+    @patch("mysql.connector.connect")
+    def test_chunks_by_row_count_and_commits_once_per_chunk(self, mock_mysql_connector):
+        aurora, cursor = build_aurora(mock_mysql_connector)
+        aurora.max_allowed_packet = 1024 * 1024
+        records = [{"message": f"message {index}"} for index in range(5)]
+
+        failures = aurora.save_records("example", records, max_rows_per_chunk=2)
+
+        self.assertEqual(failures, [])
+        statements = [call.args for call in cursor.execute.call_args_list]
+        self.assertEqual(len(statements), 3)
+        self.assertEqual(statements[0][0], "INSERT INTO example (message) VALUES (%s), (%s)")
+        self.assertEqual(statements[0][1], ["message 0", "message 1"])
+        self.assertEqual(statements[2][0], "INSERT INTO example (message) VALUES (%s)")
+        self.assertEqual(aurora.connection.commit.call_count, 3)
+
+    @patch("mysql.connector.connect")
+    def test_chunks_respect_max_allowed_packet(self, mock_mysql_connector):
+        aurora, cursor = build_aurora(mock_mysql_connector)
+        cursor.fetchone.return_value = (300,)
+        records = [{"message": "x" * 50} for _ in range(4)]
+
+        aurora.save_records("example", records)
+
+        # each record is estimated at 108 bytes against a 240 byte budget
+        self.assertEqual(cursor.execute.call_args_list[0].args, ("SELECT @@max_allowed_packet",))
+        self.assertEqual(aurora.connection.commit.call_count, 2)
+
+    @patch("mysql.connector.connect")
+    def test_failed_chunk_reports_individual_records(self, mock_mysql_connector):
+        aurora, cursor = build_aurora(mock_mysql_connector)
+        aurora.max_allowed_packet = 1024 * 1024
+        records = [{"message": "ok"}, {"message": "bad"}, {"message": "ok"}]
+
+        def execute(sql, values):
+            if "bad" in values:
+                raise Exception("Data too long")
+
+        cursor.execute.side_effect = execute
+
+        failures = aurora.save_records("example", records)
+
+        self.assertEqual([(failure["index"], failure["record"]) for failure in failures], [(1, {"message": "bad"})])
+        self.assertEqual(aurora.connection.rollback.call_count, 2)
+        self.assertEqual(aurora.connection.commit.call_count, 2)
+
+    @patch("mysql.connector.connect")
+    def test_retried_records_commit_before_a_later_deadlock(self, mock_mysql_connector):
+        aurora, cursor = build_aurora(mock_mysql_connector)
+        aurora.max_allowed_packet = 1024 * 1024
+        records = [{"message": "first"}, {"message": "bad"}, {"message": "deadlock"}]
+        calls = []
+
+        def execute(sql, values):
+            calls.append(values)
+            if "bad" in values:
+                raise Exception("Data too long")
+            if "deadlock" in values:
+                raise mysql.connector.errors.DatabaseError(msg="Deadlock found", errno=1213)
+
+        cursor.execute.side_effect = execute
+        aurora.connection.commit.side_effect = lambda: calls.append("commit")
+
+        failures = aurora.save_records("example", records)
+
+        # the deadlock rolls back only its own row; "first" was already committed
+        self.assertEqual([failure["index"] for failure in failures], [1, 2])
+        self.assertEqual(calls[1:], [("first",), "commit", ("bad",), ("deadlock",)])
+
+
+class TestAuroraMysqlSaveRecord(unittest.TestCase):
+    def setUp(self):
+        Secrets_Manager.clear_cache()
+
+    @patch("mysql.connector.connect")
+    def test_prepared_statement_is_cached_per_table_and_columns(self, mock_mysql_connector):
+        aurora, _ = build_aurora(mock_mysql_connector)
+        connection = aurora.connection
+        prepared_cursors = []
+
+        def cursor(**kwargs):
+            prepared_cursors.append(MagicMock(name=f"prepared_cursor_{len(prepared_cursors)}"))
+            return prepared_cursors[-1]
+
+        connection.cursor.side_effect = cursor
+
+        aurora.save_record("example", {"id": 1, "message": "a"})
+        aurora.save_record("example", {"id": 2, "message": "b"})
+        aurora.save_record("example", {"message": "c"})
+
+        connection.cursor.assert_called_with(prepared=True)
+        self.assertEqual(len(prepared_cursors), 2)
+        self.assertEqual(
+            [call.args for call in prepared_cursors[0].execute.call_args_list],
+            [
+                ("INSERT INTO example (id, message) VALUES (%s, %s)", (1, "a")),
+                ("INSERT INTO example (id, message) VALUES (%s, %s)", (2, "b")),
+            ],
+        )
+        self.assertEqual(connection.commit.call_count, 3)
+
+        aurora.close_connection()
+
+        prepared_cursors[0].close.assert_called_once()
+        self.assertEqual(len(aurora.statement_cache), 0)
+
+    @patch("mysql.connector.connect")
+    def test_failed_statement_is_evicted(self, mock_mysql_connector):
+        aurora, _ = build_aurora(mock_mysql_connector)
+        prepared_cursor = MagicMock(name="prepared_cursor")
+        prepared_cursor.execute.side_effect = Exception("Prepared statement needs to be re-prepared")
+        aurora.connection.cursor.side_effect = lambda **kwargs: prepared_cursor
+
+        with self.assertRaises(Exception):
+            aurora.save_record("example", {"message": "a"})
+
+        prepared_cursor.close.assert_called_once()
+        self.assertEqual(len(aurora.statement_cache), 0)
+
+    @patch("mysql.connector.connect")
+    def test_connects_with_the_c_extension_when_available(self, mock_mysql_connector):
+        build_aurora(mock_mysql_connector)
+
+        self.assertEqual(mock_mysql_connector.call_args.kwargs["use_pure"], not mysql.connector.HAVE_CEXT)
+
+
+class TestAuroraMysqlConnectionLifecycle(unittest.TestCase):
+    def setUp(self):
+        Secrets_Manager.clear_cache()
+
+    @patch("mysql.connector.connect")
+    def test_recent_connection_is_reused_without_ping(self, mock_mysql_connector):
+        aurora, _ = build_aurora(mock_mysql_connector)
+
+        aurora.ensure_connection()
+
+        mock_mysql_connector.assert_called_once()
+        aurora.connection.ping.assert_not_called()
+
+    @patch("mysql.connector.connect")
+    def test_idle_connection_is_pinged_and_reopened_on_failure(self, mock_mysql_connector):
+        aurora, _ = build_aurora(mock_mysql_connector)
+        aurora.last_used_at -= 10
+        aurora.connection.ping.side_effect = Exception("MySQL server has gone away")
+
+        aurora.ensure_connection()
+
+        self.assertEqual(mock_mysql_connector.call_count, 2)
+
+    @patch("mysql.connector.connect")
+    def test_connection_is_recycled_after_max_age(self, mock_mysql_connector):
+        aurora, _ = build_aurora(mock_mysql_connector)
+        aurora.connected_at -= aurora.max_age_seconds + 1
+
+        aurora.ensure_connection()
+
+        self.assertEqual(mock_mysql_connector.call_count, 2)
+        aurora.connection.ping.assert_not_called()
+
+    @patch("time.sleep")
+    @patch("mysql.connector.connect")
+    def test_connect_retries_with_bounded_backoff(self, mock_mysql_connector, mock_sleep):
+        connection = MagicMock(name="connection")
+        mock_mysql_connector.side_effect = [Exception("timeout"), Exception("timeout"), connection]
+        secrets_manager_client = MagicMock(name="secrets_manager_client")
+        secrets_manager_client.get_secret_value.return_value = {
+            "SecretString": json.dumps({"host": "h", "dbname": "d", "username": "u", "port": 3306, "password": "p"})
+        }
+
+        aurora = AuroraMysql({"DEPLOYMENT_ENVIRONMENT": "local-test"}, secrets_manager_client)
+
+        self.assertIs(aurora.connection, connection)
+        self.assertEqual([call.args[0] for call in mock_sleep.call_args_list], [0.2, 0.4])
+
+    @patch("mysql.connector.connect")
+    def test_access_denied_refreshes_the_secret_once(self, mock_mysql_connector):
+        aurora, _ = build_aurora(mock_mysql_connector)
+        rotated_connection = MagicMock(name="rotated_connection")
+        mock_mysql_connector.side_effect = [
+            mysql.connector.errors.ProgrammingError(msg="Access denied", errno=1045),
+            rotated_connection,
+        ]
+        aurora._secret_manager_client.get_secret_value.return_value = {
+            "SecretString": json.dumps(
+                {"host": "localhost", "dbname": "test_db", "username": "test_user", "port": 3306, "password": "new"}
+            )
+        }
+
+        aurora.connect()
+
+        self.assertIs(aurora.connection, rotated_connection)
+        self.assertEqual(mock_mysql_connector.call_args.kwargs["password"], "new")
+        self.assertEqual(aurora._secret_manager_client.get_secret_value.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import gzip
+import json
+from protocol.request_task_protocol import Request_Tasks, Task_Batcher, Token_Bucket
+
+
+class ThrottlingError(Exception):
+    response = {"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded"}}
+
+
+@patch.dict(
+    "os.environ",
+    {
+        "PROCESS_TASKS_CLUSTER_NAME": "cluster_test",
+        "PROCESS_TASKS_CONTAINER_NAME": "container-test",
+        "ECS_RUN_TASK_MAX_WORKERS": "4",
+        "ECS_RUN_TASK_RATE_PER_SECOND": "1000",
+    },
+)
+class TestRequestTasks(unittest.TestCase):
+    def test_receipts_keep_source_event_order_and_report_failures(self):
+        ecs_client = MagicMock(name="ecs_client")
+
+        def run_task(**kwargs):
+            task = kwargs["overrides"]["containerOverrides"][0]["environment"][1]["value"]
+            if '"id": 1' in task:
+                raise Exception("AccessDenied")
+            if '"id": 2' in task:
+                return {"tasks": [], "failures": [{"arn": "arn", "reason": "RESOURCE:MEMORY"}]}
+            return {"tasks": [{"taskArn": "arn"}], "failures": []}
+
+        ecs_client.run_task.side_effect = run_task
+        source_events = [{"event_type": "TASK_EXAMPLE", "id": index} for index in range(6)]
+
+        failures = Request_Tasks.request_tasks(source_events, ecs_client)
+
+        self.assertEqual(ecs_client.run_task.call_count, 6)
+        outcomes = [(failure["outcome"], failure["source_event"]["id"]) for failure in failures]
+        self.assertEqual(outcomes, [("error", 1), ("failure", 2)])
+
+    @patch("time.sleep")
+    def test_throttling_is_retried_and_slows_the_rate_limiter(self, mock_sleep):
+        ecs_client = MagicMock(name="ecs_client")
+        ecs_client.run_task.side_effect = [ThrottlingError(), {"tasks": [{"taskArn": "arn"}], "failures": []}]
+        rate_limiter = Token_Bucket(10)
+
+        receipt = Request_Tasks.request_task({"event_type": "TASK_EXAMPLE"}, ecs_client, rate_limiter)
+
+        self.assertEqual(receipt["outcome"], "success")
+        self.assertEqual(ecs_client.run_task.call_count, 2)
+        self.assertLess(rate_limiter.rate_per_second, 10)
+
+    @patch.dict("os.environ", {"PROCESS_TASKS_BUCKET_NAME": "bucket-test", "CLAIM_CHECK_THRESHOLD_BYTES": "64"})
+    @patch("protocol.claim_check_protocol.AwsClients.initialize_clients")
+    @patch("time.sleep")
+    def test_throttled_retries_reuse_the_claim_check(self, mock_sleep, mock_initialize_clients):
+        mock_s3_client = MagicMock(name="s3_client")
+        mock_initialize_clients.return_value = {"s3_client": mock_s3_client}
+        ecs_client = MagicMock(name="ecs_client")
+        ecs_client.run_task.side_effect = [ThrottlingError(), {"tasks": [{"taskArn": "arn"}], "failures": []}]
+
+        receipt = Request_Tasks.request_task({"event_type": "TASK_EXAMPLE", "message": "x" * 100}, ecs_client)
+
+        self.assertEqual(receipt["outcome"], "success")
+        mock_s3_client.put_object.assert_called_once()
+        overrides = [call.kwargs["overrides"]["containerOverrides"][0] for call in ecs_client.run_task.call_args_list]
+        self.assertEqual(overrides[0]["environment"], overrides[1]["environment"])
+
+    @patch("time.sleep")
+    def test_throttling_gives_up_after_max_attempts(self, mock_sleep):
+        ecs_client = MagicMock(name="ecs_client")
+        ecs_client.run_task.side_effect = ThrottlingError()
+
+        receipt = Request_Tasks.request_task({"event_type": "TASK_EXAMPLE"}, ecs_client)
+
+        self.assertEqual(receipt["outcome"], "error")
+        self.assertEqual(ecs_client.run_task.call_count, 5)
+
+    @patch.dict("os.environ", {"TASK_BATCH_SIZE": "2"})
+    def test_batch_mode_launches_one_task_per_batch_of_same_event_type(self):
+        ecs_client = MagicMock(name="ecs_client")
+        ecs_client.run_task.return_value = {"tasks": [{"taskArn": "arn"}], "failures": []}
+        source_events = [
+            {"event_type": "TASK_A", "id": 0},
+            {"event_type": "TASK_B", "id": 1},
+            {"event_type": "TASK_A", "id": 2},
+            {"event_type": "TASK_A", "id": 3},
+        ]
+
+        self.assertEqual(Request_Tasks.request_tasks(source_events, ecs_client), [])
+
+        batches = []
+        for call in ecs_client.run_task.call_args_list:
+            environment = call.kwargs["overrides"]["containerOverrides"][0]["environment"]
+            variables = {variable["name"]: variable["value"] for variable in environment}
+            batches.append((variables["TASK"], variables.get("SOURCE_EVENTS", variables.get("SOURCE_EVENT"))))
+        batches.sort()
+        self.assertEqual(
+            batches,
+            [
+                ("TASK_A", json.dumps([source_events[0], source_events[2]])),
+                ("TASK_A", json.dumps(source_events[3])),
+                ("TASK_B", json.dumps(source_events[1])),
+            ],
+        )
+
+    @patch.dict("os.environ", {"TASK_BATCH_SIZE": "10"})
+    def test_batch_failure_is_reported_for_every_source_event(self):
+        ecs_client = MagicMock(name="ecs_client")
+        ecs_client.run_task.side_effect = Exception("AccessDenied")
+        source_events = [{"event_type": "TASK_A", "id": index} for index in range(3)]
+
+        failures = Request_Tasks.request_tasks(source_events, ecs_client)
+
+        ecs_client.run_task.assert_called_once()
+        self.assertEqual([failure["source_event"] for failure in failures], source_events)
+
+    @patch.dict("os.environ", {"PROCESS_TASKS_BUCKET_NAME": "bucket-test", "CLAIM_CHECK_THRESHOLD_BYTES": "64"})
+    @patch("protocol.claim_check_protocol.AwsClients.initialize_clients")
+    def test_large_payloads_are_offloaded_to_s3(self, mock_initialize_clients):
+        mock_s3_client = MagicMock(name="s3_client")
+        mock_initialize_clients.return_value = {"s3_client": mock_s3_client}
+        small_event = {"event_type": "TASK_A", "message": "small"}
+        large_event = {"event_type": "TASK_A", "message": "x" * 100}
+
+        small_environment = Request_Tasks.task_environment("TASK_A", [small_event])
+        large_environment = Request_Tasks.task_environment("TASK_A", [large_event])
+
+        self.assertEqual(small_environment[1]["value"], json.dumps(small_event))
+        pointer = json.loads(large_environment[1]["value"])["claim_check"]
+        self.assertEqual(pointer["bucket"], "bucket-test")
+        put_object = mock_s3_client.put_object.call_args.kwargs
+        self.assertEqual((put_object["Bucket"], put_object["Key"]), (pointer["bucket"], pointer["key"]))
+        self.assertEqual(json.loads(gzip.decompress(put_object["Body"])), large_event)
+
+
+class TestTaskBatcher(unittest.TestCase):
+    def test_batches_are_released_by_size_and_flushed(self):
+        task_batcher = Task_Batcher(max_batch_size=2)
+        source_events = [{"event_type": "TASK_A", "id": 1}, {"event_type": "TASK_B"}, {"event_type": "TASK_A", "id": 2}]
+
+        ready_batches = [batch for source_event in source_events for batch in task_batcher.add(source_event)]
+
+        self.assertEqual(
+            ready_batches, [{"event_type": "TASK_A", "source_events": [source_events[0], source_events[2]]}]
+        )
+        self.assertEqual(task_batcher.flush(), [{"event_type": "TASK_B", "source_events": [source_events[1]]}])
+        self.assertEqual(task_batcher.flush(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+import threading
+import time
+import unittest
+from protocol.route_protocol import Route_Executor
+
+
+class FakeContext:
+    def __init__(self, remaining_ms):
+        self.remaining_ms = remaining_ms
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_ms
+
+
+def slow_route(name, source_events, seconds, failed=(), **options):
+    def process(chunk):
+        time.sleep(seconds)
+        return [source_event for source_event in chunk if source_event in failed]
+
+    return {"name": name, "source_events": source_events, "process": process, **options}
+
+
+class TestRouteExecutor(unittest.TestCase):
+    def test_routes_overlap_and_failures_are_merged(self):
+        routes = [
+            slow_route("overlap-a", ["a1", "a2"], 0.2, failed=("a2",)),
+            slow_route("overlap-b", ["b1"], 0.2, failed=("b1",)),
+            slow_route("overlap-empty", [], 5),
+        ]
+
+        started_at = time.perf_counter()
+        failures = Route_Executor(deadline_margin_ms=0).run(routes)
+
+        self.assertLess(time.perf_counter() - started_at, 0.35)
+        self.assertEqual(sorted(failures), ["a2", "b1"])
+
+    def test_route_concurrency_limit_is_respected(self):
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def process(chunk):
+            with lock:
+                running.append(chunk)
+                peak.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.remove(chunk)
+            return []
+
+        route = {"name": "limited", "source_events": list(range(6)), "process": process}
+        route.update({"max_concurrency": 2, "batch_size": 1})
+
+        self.assertEqual(Route_Executor(deadline_margin_ms=0).run([route]), [])
+        self.assertEqual(max(peak), 2)
+
+    def test_started_chunks_are_left_to_finish_and_reported_at_the_deadline(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def blocked(chunk):
+            release.wait(5)
+            return []
+
+        routes = [
+            slow_route("deadline-fast", ["fast"], 0),
+            {"name": "deadline-slow", "source_events": ["slow-1", "slow-2"], "process": blocked, "batch_size": 1},
+        ]
+        executor = Route_Executor(FakeContext(remaining_ms=300), deadline_margin_ms=100)
+
+        started_at = time.perf_counter()
+        failures = executor.run(routes)
+
+        self.assertLess(time.perf_counter() - started_at, 0.5)
+        # the first slow chunk started and may still write, the second was waiting for the route's only slot; both
+        # are retried because lambda may never thaw the first
+        self.assertEqual(sorted(failures), ["slow-1", "slow-2"])
+        self.assertEqual(executor.unfinished, ["slow-1"])
+
+        semaphore = Route_Executor.route_semaphore("deadline-slow", 1)
+        self.assertFalse(semaphore.acquire(blocking=False))
+        release.set()
+        self.assertTrue(semaphore.acquire(timeout=1))
+        semaphore.release()
+
+    def test_cancelled_chunks_never_start(self):
+        processed = []
+        route = {"name": "deadline-cancelled", "source_events": ["late"], "process": processed.extend}
+
+        failures = Route_Executor(deadline_margin_ms=0)._run_chunk(route, ["late"], {"status": "cancelled"})
+
+        self.assertEqual(failures, ["late"])
+        self.assertEqual(processed, [])
+        self.assertTrue(Route_Executor.route_semaphore("deadline-cancelled", 1).acquire(blocking=False))
+
+    def test_route_exceptions_fail_the_whole_chunk(self):
+        def process(chunk):
+            raise Exception("boom")
+
+        route = {"name": "raises", "source_events": ["x", "y"], "process": process}
+
+        self.assertEqual(Route_Executor(deadline_margin_ms=0).run([route]), ["x", "y"])
+
+    def test_cpu_routes_run_on_the_calling_thread_alongside_io_routes(self):
+        threads = {}
+
+        def record_thread(name):
+            def process(chunk):
+                threads[name] = threading.current_thread()
+                time.sleep(0.2)
+                return []
+
+            return process
+
+        routes = [
+            {"name": "mixed-io", "source_events": ["io"], "process": record_thread("io")},
+            {"name": "mixed-cpu", "source_events": ["cpu"], "process": record_thread("cpu"), "workload": "cpu"},
+        ]
+
+        started_at = time.perf_counter()
+        self.assertEqual(Route_Executor(deadline_margin_ms=0).run(routes), [])
+
+        self.assertLess(time.perf_counter() - started_at, 0.35)
+        self.assertIs(threads["cpu"], threading.current_thread())
+        self.assertIsNot(threads["io"], threading.current_thread())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import json
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+from cryptography.fernet import Fernet
+from protocol.secrets_manager_protocol import Secrets_Manager
+
+
+def build_secrets_manager_client(password="test_password", delay_seconds=0):
+    secrets_manager_client = MagicMock(name="secrets_manager_client")
+
+    def get_secret_value(SecretId):
+        time.sleep(delay_seconds)
+        return {"SecretString": json.dumps({"password": password})}
+
+    secrets_manager_client.get_secret_value.side_effect = get_secret_value
+    return secrets_manager_client
+
+
+class TestSecretsManagerCache(unittest.TestCase):
+    def setUp(self):
+        Secrets_Manager.clear_cache()
+
+    def test_secret_is_served_from_memory_until_ttl_expires(self):
+        secrets_manager_client = build_secrets_manager_client()
+
+        with patch.dict("os.environ", {"SECRET_CACHE_TTL_SECONDS": "300"}):
+            Secrets_Manager.get_secret("mysqlSecretTest", secrets_manager_client)
+            Secrets_Manager.get_secret("mysqlSecretTest", secrets_manager_client)
+        self.assertEqual(secrets_manager_client.get_secret_value.call_count, 1)
+
+        with patch.dict("os.environ", {"SECRET_CACHE_TTL_SECONDS": "0"}):
+            Secrets_Manager.get_secret("mysqlSecretTest", secrets_manager_client, force_refresh=True)
+            Secrets_Manager.get_secret("mysqlSecretTest", secrets_manager_client)
+        self.assertEqual(secrets_manager_client.get_secret_value.call_count, 3)
+
+    def test_concurrent_callers_share_one_fetch(self):
+        secrets_manager_client = build_secrets_manager_client(delay_seconds=0.05)
+        results = []
+
+        def get_secret():
+            results.append(Secrets_Manager.get_secret("shared", secrets_manager_client))
+
+        threads = [threading.Thread(target=get_secret) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(secrets_manager_client.get_secret_value.call_count, 1)
+        self.assertEqual(results, [{"password": "test_password"}] * 8)
+
+    def test_encrypted_persistence_survives_a_cold_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            environment = {
+                "SECRET_CACHE_ENCRYPTION_KEY": Fernet.generate_key().decode(),
+                "SECRET_CACHE_DIRECTORY": directory,
+            }
+            with patch.dict("os.environ", environment):
+                Secrets_Manager.get_secret("persisted", build_secrets_manager_client())
+                Secrets_Manager.clear_cache()
+
+                secrets_manager_client = build_secrets_manager_client(password="unused")
+                secret = Secrets_Manager.get_secret("persisted", secrets_manager_client)
+
+                self.assertEqual(secret, {"password": "test_password"})
+                secrets_manager_client.get_secret_value.assert_not_called()
+                with open(Secrets_Manager._persisted_path("persisted"), "rb") as persisted_file:
+                    self.assertNotIn(b"test_password", persisted_file.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
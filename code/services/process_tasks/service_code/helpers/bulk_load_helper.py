@@ -0,0 +1,109 @@
+import csv
+import io
+import itertools
+import os
+import tempfile
+import uuid
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+from helpers.s3_stream_helper import S3_Ranged_Reader
+
+# Because mysql.connector only sends LOCAL INFILE files from this directory (allow_local_infile_in_path)
+BULK_LOAD_DIRECTORY = os.path.join(tempfile.gettempdir(), "aurora-bulk-load")
+# Because LOAD DATA reads "\N" as NULL and backslash escapes in its default (tab separated) format
+INFILE_NULL = "\\N"
+INFILE_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r", "\0": "\\0"})
+
+ColumnMapping = Union[Dict[str, str], Sequence[Optional[str]]]
+
+
+def open_delimited_source(source, s3_client=None, encoding: str = "utf-8") -> io.TextIOBase:
+    """
+    Open a local path, an "s3://bucket/key" url or a {"bucket": ..., "key": ...} dict as a text stream.
+
+    S3 objects stream through parallel ranged GETs, so a large object is never held whole in memory.
+    """
+    if isinstance(source, str) and source.startswith("s3://"):
+        bucket, _, key = source[len("s3://") :].partition("/")
+        source = {"bucket": bucket, "key": key}
+    if isinstance(source, dict):
+        if s3_client is None:
+            raise Exception("An s3_client is required to load from s3")
+        reader = io.BufferedReader(S3_Ranged_Reader(s3_client, source["bucket"], source["key"]))
+        return io.TextIOWrapper(reader, encoding=encoding, newline="")
+    return open(source, encoding=encoding, newline="")
+
+
+def read_mapped_rows(
+    text_stream,
+    delimiter: str = ",",
+    has_header: bool = True,
+    column_mapping: Optional[ColumnMapping] = None,
+    null_value: Optional[str] = None,
+) -> Tuple[List[str], Iterator[Tuple[Optional[str], ...]]]:
+    """
+    Parse delimited text into the target column names and an iterator of rows holding only the mapped columns.
+
+    :param column_mapping: {source header: target column} to pick and rename columns by header, or a sequence of
+        target columns by position with None for source columns to skip. Defaults to the header as is.
+    :param null_value: A field value (e.g. "" or "NULL") to load as NULL.
+    """
+    rows = csv.reader(text_stream, delimiter=delimiter)
+    header = next(rows, None) if has_header else None
+
+    if column_mapping is None:
+        if header is None:
+            raise Exception("A column_mapping is required when the source has no header")
+        column_mapping = header
+    if isinstance(column_mapping, dict):
+        if header is None:
+            raise Exception("Mapping columns by name requires a header")
+        missing = [column for column in column_mapping if column not in header]
+        if missing:
+            raise Exception(f"Columns not found in the header: {missing}")
+        # Because the positions are resolved once from the header, not per row
+        positions = [header.index(column) for column in column_mapping]
+        target_columns = list(column_mapping.values())
+    else:
+        positions = [position for position, column in enumerate(column_mapping) if column is not None]
+        target_columns = [column for column in column_mapping if column is not None]
+    last_position = max(positions, default=-1)
+
+    def mapped_rows():
+        for row in rows:
+            if not row:
+                continue
+            if len(row) <= last_position:
+                raise Exception(
+                    f"Line {rows.line_num} has {len(row)} fields, but the column mapping reads field "
+                    f"{last_position + 1}"
+                )
+            yield tuple(None if row[position] == null_value else row[position] for position in positions)
+
+    return target_columns, mapped_rows()
+
+
+def iter_chunks(rows: Iterator[Any], rows_per_chunk: int) -> Iterator[List[Any]]:
+    while True:
+        chunk = list(itertools.islice(rows, rows_per_chunk))
+        if not chunk:
+            return
+        yield chunk
+
+
+def write_infile_chunk(rows: Sequence[Sequence[Optional[str]]], directory: str = BULK_LOAD_DIRECTORY) -> str:
+    """
+    Write rows in LOAD DATA's default format (tab separated, backslash escaped, "\\N" for NULL) to a new file.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{uuid.uuid4()}.tsv")
+    with open(path, "w", encoding="utf-8", newline="") as chunk_file:
+        for row in rows:
+            chunk_file.write("\t".join(escape_infile_value(value) for value in row))
+            chunk_file.write("\n")
+    return path
+
+
+def escape_infile_value(value) -> str:
+    if value is None:
+        return INFILE_NULL
+    return str(value).translate(INFILE_ESCAPES)
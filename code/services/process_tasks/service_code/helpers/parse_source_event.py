@@ -1,5 +1,9 @@
+import gzip
 import json
 
+# Because process_events replaces large payloads with {"claim_check": {...}} (see protocol/claim_check_protocol.py)
+CLAIM_CHECK_KEY = "claim_check"
+
 
 def parse_source_event(raw_source_event: str):
     if raw_source_event:
@@ -7,3 +11,36 @@ def parse_source_event(raw_source_event: str):
 
     else:
         return ""
+
+
+def parse_source_event_value(value):
+    # Because work items may carry the payload as the JSON string a task environment would, or as the object itself
+    if isinstance(value, str):
+        return parse_source_event(value)
+    return value if value is not None else ""
+
+
+def is_claim_check(source_event) -> bool:
+    return isinstance(source_event, dict) and set(source_event.keys()) == {CLAIM_CHECK_KEY}
+
+
+def resolve_source_event(source_event, s3_client):
+    """
+    Return the payload a claim check points at, or the source event unchanged when it was passed inline.
+
+    The object is decompressed while it streams from s3, so the compressed body is never held in memory.
+    """
+    if not is_claim_check(source_event):
+        return source_event
+
+    claim_check = source_event[CLAIM_CHECK_KEY]
+    response = s3_client.get_object(Bucket=claim_check["bucket"], Key=claim_check["key"])
+    body = response["Body"]
+    try:
+        if claim_check.get("compression") == "gzip":
+            with gzip.GzipFile(fileobj=body, mode="rb") as decompressed_body:
+                return json.load(decompressed_body)
+        return json.load(body)
+
+    finally:
+        body.close()
@@ -0,0 +1,172 @@
+import atexit
+import importlib
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from static.logger import flush_logs, logger
+from static.metrics import metrics
+
+CGROUP_V2_CPU_MAX = "/sys/fs/cgroup/cpu.max"
+CGROUP_V1_CFS_QUOTA = "/sys/fs/cgroup/cpu/cpu.cfs_quota_us"
+CGROUP_V1_CFS_PERIOD = "/sys/fs/cgroup/cpu/cpu.cfs_period_us"
+
+# Because each pool process builds its own clients, and only the ones its work units read
+worker_clients = None
+
+
+def available_cpus(
+    cpu_max_path: str = CGROUP_V2_CPU_MAX,
+    cfs_quota_path: str = CGROUP_V1_CFS_QUOTA,
+    cfs_period_path: str = CGROUP_V1_CFS_PERIOD,
+) -> int:
+    """
+    CPUs the container may use: the cgroup CPU quota when one is set (what an ECS task's cpu units become), otherwise
+    the CPUs this process may be scheduled on. os.cpu_count() alone reports the host's CPUs, not the task's.
+    """
+    quota = _read_cgroup_v2_quota(cpu_max_path)
+    if quota is None:
+        quota = _read_cgroup_v1_quota(cfs_quota_path, cfs_period_path)
+
+    try:
+        schedulable = len(os.sched_getaffinity(0))
+    except AttributeError:
+        schedulable = os.cpu_count() or 1
+
+    if quota is None:
+        return max(1, schedulable)
+    # Because a fractional quota (e.g. 1.5 CPUs) still leaves one process mostly idle, round down
+    return max(1, min(schedulable, int(quota)))
+
+
+def _read_cgroup_v2_quota(cpu_max_path: str) -> Optional[float]:
+    try:
+        with open(cpu_max_path) as cpu_max_file:
+            quota, period = cpu_max_file.read().split()[:2]
+    except (OSError, ValueError):
+        return None
+    if quota == "max":
+        return None
+    return int(quota) / int(period)
+
+
+def _read_cgroup_v1_quota(cfs_quota_path: str, cfs_period_path: str) -> Optional[float]:
+    try:
+        with open(cfs_quota_path) as quota_file, open(cfs_period_path) as period_file:
+            quota, period = int(quota_file.read()), int(period_file.read())
+    except (OSError, ValueError):
+        return None
+    if quota <= 0 or period <= 0:
+        return None
+    return quota / period
+
+
+def initialize_worker():
+    """
+    Runs once in each pool process: set up lazy clients and close whatever was opened when the process exits.
+    """
+    global worker_clients
+    from static.aws_clients import Lazy_Aws_Clients
+    from static.constants import get_read_only_env_variables
+
+    worker_clients = Lazy_Aws_Clients(get_read_only_env_variables())
+    atexit.register(clean_up_worker)
+
+
+def clean_up_worker():
+    if worker_clients is not None and "mysql_client" in worker_clients:
+        worker_clients["mysql_client"].close_connection()
+    metrics.flush()
+    flush_logs()
+
+
+def run_work_unit(module_name: str, task_name: str, index: int, source_event) -> Dict[str, Any]:
+    """
+    Runs in a pool process: process one source event with the registered task and report how it went.
+    """
+    from helpers.task_registry_helper import task_registry
+
+    # Because the pool process starts fresh, the task's module is imported here to register it
+    importlib.import_module(module_name)
+    registration = task_registry.get(task_name)
+
+    started_at = time.perf_counter()
+    try:
+        if registration is None:
+            raise Exception(f"Task not matched in process_task_fargate. Task provided: {task_name}")
+        value = registration["process"](source_event, worker_clients)
+        result = {"index": index, "outcome": "success"}
+        if value is not None:
+            result["value"] = value
+    except Exception as e:
+        logger.error("Failed to process record for task %s: %s", task_name, e)
+        result = {"index": index, "outcome": "error", "error": str(e)}
+
+    result["elapsed_ms"] = (time.perf_counter() - started_at) * 1000
+    return result
+
+
+class Process_Pool_Engine:
+    """
+    Fans a task's source events out across a pool of processes, one work unit per source event, for CPU-bound tasks
+    that threads cannot speed up.
+
+    Processes are spawned rather than forked because the parent runs the log listener thread (and may hold a MySQL
+    connection), which a forked child would inherit in an unknown state. The pool is kept for the life of the
+    container so a worker reuses it, and each pool process keeps its own clients between work units.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.broken = False
+        self._executor = ProcessPoolExecutor(
+            max_workers=size,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=initialize_worker,
+        )
+
+    def run(self, registration: Dict[str, Any], source_events: List[Any]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Yield (index, result) for every source event as soon as its work unit finishes, in completion order.
+        """
+        module_name, task_name = registration["module"], registration["name"]
+        futures = {
+            self._executor.submit(run_work_unit, module_name, task_name, index, source_event): index
+            for index, source_event in enumerate(source_events)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # Because a pool process that dies (or an unpicklable source event) fails the unit, not the task
+                self.broken = self.broken or isinstance(e, BrokenProcessPool)
+                logger.error("Work unit %d of task %s did not complete: %s", index, task_name, e)
+                result = {"index": index, "outcome": "error", "error": str(e), "elapsed_ms": 0}
+            metrics.put_timing("ProcessTask", result.pop("elapsed_ms"))
+            yield result.pop("index"), result
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+shared_engine: Optional[Process_Pool_Engine] = None
+
+
+def shared_process_pool(size: int) -> Process_Pool_Engine:
+    global shared_engine
+    if shared_engine is not None and (shared_engine.size != size or shared_engine.broken):
+        shutdown_process_pool()
+    if shared_engine is None:
+        logger.info("Starting a process pool of %d processes", size)
+        shared_engine = Process_Pool_Engine(size)
+    return shared_engine
+
+
+def shutdown_process_pool():
+    global shared_engine
+    if shared_engine is not None:
+        shared_engine.shutdown()
+        shared_engine = None
@@ -0,0 +1,302 @@
+import io
+import mmap
+import os
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from static.logger import logger
+from static.metrics import metrics
+
+# Because S3 rejects multipart parts under 5 MiB (except the last), the default leaves headroom above that
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+DEFAULT_MAX_CONCURRENCY = 4
+# Because a ranged GET body is copied to the spill file in slices, not held whole
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class S3_Multipart_Writer:
+    """
+    Writable stream that uploads to S3 as a multipart upload, sending parts on a thread pool while the caller keeps
+    writing.
+
+    At most `max_concurrency` parts are in flight; `write` blocks until one finishes, so memory stays around
+    (max_concurrency + 1) * part_size however large the object is. An object smaller than one part is sent with a single
+    PutObject. Leaving the `with` block on an exception aborts the upload so no orphaned parts are billed.
+    """
+
+    def __init__(
+        self,
+        s3_client,
+        bucket: str,
+        key: str,
+        part_size: int = DEFAULT_PART_SIZE,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        extra_args: Optional[Dict[str, Any]] = None,
+    ):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.extra_args = extra_args or {}
+        self.upload_id: Optional[str] = None
+        self.bytes_written = 0
+        self.closed = False
+        self._buffer = bytearray()
+        self._futures: List[Future] = []
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+
+    def __enter__(self) -> "S3_Multipart_Writer":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, data) -> int:
+        view = memoryview(data).cast("B")
+        written = len(view)
+        while view:
+            take = self.part_size - len(self._buffer)
+            self._buffer += view[:take]
+            view = view[take:]
+            if len(self._buffer) >= self.part_size:
+                self._send_part()
+        self.bytes_written += written
+        return written
+
+    def close(self):
+        """
+        Send what is buffered and complete the upload.
+        """
+        if self.closed:
+            return
+        try:
+            if self.upload_id is None:
+                body = bytes(self._buffer)
+                with metrics.timer("S3PutObject"):
+                    self.s3_client.put_object(Bucket=self.bucket, Key=self.key, Body=body, **self.extra_args)
+            else:
+                if self._buffer:
+                    self._send_part()
+                parts = [future.result() for future in self._futures]
+                self.s3_client.complete_multipart_upload(
+                    Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, MultipartUpload={"Parts": parts}
+                )
+        except Exception:
+            self.abort()
+            raise
+        self._finish()
+
+    def abort(self):
+        if self.closed:
+            return
+        self._finish()
+        if self.upload_id is not None:
+            try:
+                self.s3_client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+            except Exception as e:
+                logger.error("Failed to abort multipart upload to s3://%s/%s: %s", self.bucket, self.key, e)
+
+    def _finish(self):
+        self.closed = True
+        self._buffer = bytearray()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def _send_part(self):
+        if self.upload_id is None:
+            response = self.s3_client.create_multipart_upload(Bucket=self.bucket, Key=self.key, **self.extra_args)
+            self.upload_id = response["UploadId"]
+
+        # Because a part that already failed dooms the upload, stop before buffering more
+        for future in self._futures:
+            if future.done() and future.exception():
+                raise future.exception()
+
+        self._slots.acquire()
+        part_number = len(self._futures) + 1
+        body, self._buffer = bytes(self._buffer), bytearray()
+        future = self._executor.submit(self._upload_part, part_number, body)
+        future.add_done_callback(lambda _: self._slots.release())
+        self._futures.append(future)
+
+    def _upload_part(self, part_number: int, body: bytes) -> Dict[str, Any]:
+        with metrics.timer("S3UploadPart"):
+            response = self.s3_client.upload_part(
+                Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, PartNumber=part_number, Body=body
+            )
+        return {"PartNumber": part_number, "ETag": response["ETag"]}
+
+
+def upload_fileobj(s3_client, fileobj, bucket: str, key: str, **options) -> int:
+    """
+    Stream a readable file object to S3 through `S3_Multipart_Writer`; returns the number of bytes uploaded.
+    """
+    with S3_Multipart_Writer(s3_client, bucket, key, **options) as writer:
+        while True:
+            chunk = fileobj.read(writer.part_size)
+            if not chunk:
+                break
+            writer.write(chunk)
+    return writer.bytes_written
+
+
+class S3_Ranged_Reader(io.RawIOBase):
+    """
+    Readable stream over an S3 object, fetched as parallel ranged GETs that are handed back in order.
+
+    Up to `max_concurrency` ranges are fetched ahead of the reader, so memory stays around
+    max_concurrency * part_size. Every range is requested with the ETag seen when the stream was opened, so an object
+    overwritten mid-read fails rather than mixing two versions. Wrap it in io.BufferedReader (or io.TextIOWrapper) for
+    line-by-line reads.
+    """
+
+    def __init__(
+        self,
+        s3_client,
+        bucket: str,
+        key: str,
+        part_size: int = DEFAULT_PART_SIZE,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    ):
+        super().__init__()
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.max_concurrency = max_concurrency
+        self._pending: Deque[Future] = deque()
+        self._current = memoryview(b"")
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        head = s3_client.head_object(Bucket=bucket, Key=key)
+        self.size = head["ContentLength"]
+        self.etag = head.get("ETag")
+        self._ranges: Deque[Tuple[int, int]] = deque(object_ranges(self.size, part_size))
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if not self._current:
+            self._fill()
+            if not self._pending:
+                return 0
+            self._current = memoryview(self._pending.popleft().result())
+        count = min(len(buffer), len(self._current))
+        buffer[:count] = self._current[:count]
+        self._current = self._current[count:]
+        return count
+
+    def close(self):
+        if not self.closed:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._pending.clear()
+            self._current = memoryview(b"")
+        super().close()
+
+    def _fill(self):
+        while self._ranges and len(self._pending) < self.max_concurrency:
+            start, end = self._ranges.popleft()
+            self._pending.append(self._executor.submit(self._get_range, start, end))
+
+    def _get_range(self, start: int, end: int) -> bytes:
+        with metrics.timer("S3GetRange"):
+            response = get_object_range(self.s3_client, self.bucket, self.key, start, end, self.etag)
+            body = response["Body"]
+            try:
+                return body.read()
+            finally:
+                body.close()
+
+
+class Mapped_Object:
+    """
+    An S3 object spilled to a temp file and memory-mapped read-only; `data` supports slicing and `find` like bytes
+    while the pages stay in the page cache rather than on the heap. Closing it unmaps and deletes the file.
+    """
+
+    def __init__(self, spill_file, size: int):
+        self.size = size
+        self._spill_file = spill_file
+        # Because mmap cannot map an empty file
+        self.data = mmap.mmap(spill_file.fileno(), size, access=mmap.ACCESS_READ) if size else b""
+
+    def __enter__(self) -> "Mapped_Object":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.data = b""
+        self._spill_file.close()
+
+
+def download_to_mapped_file(
+    s3_client,
+    bucket: str,
+    key: str,
+    part_size: int = DEFAULT_PART_SIZE,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    directory: Optional[str] = None,
+) -> Mapped_Object:
+    """
+    Download an object with parallel ranged GETs straight into a temp file (in `directory`, else TMPDIR) and map it.
+
+    Each range is written at its own offset as it streams in, so ranges may finish in any order and no part is held
+    whole in memory.
+    """
+    head = s3_client.head_object(Bucket=bucket, Key=key)
+    size, etag = head["ContentLength"], head.get("ETag")
+    spill_file = tempfile.TemporaryFile(dir=directory)
+    try:
+        spill_file.truncate(size)
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            futures = [
+                executor.submit(_spill_range, s3_client, bucket, key, start, end, etag, spill_file.fileno())
+                for start, end in object_ranges(size, part_size)
+            ]
+            for future in futures:
+                future.result()
+        return Mapped_Object(spill_file, size)
+
+    except Exception:
+        spill_file.close()
+        raise
+
+
+def _spill_range(s3_client, bucket: str, key: str, start: int, end: int, etag: Optional[str], file_descriptor: int):
+    with metrics.timer("S3GetRange"):
+        body = get_object_range(s3_client, bucket, key, start, end, etag)["Body"]
+        try:
+            offset = start
+            while True:
+                chunk = body.read(COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                view = memoryview(chunk)
+                while view:
+                    written = os.pwrite(file_descriptor, view, offset)
+                    view = view[written:]
+                    offset += written
+        finally:
+            body.close()
+
+
+def get_object_range(s3_client, bucket: str, key: str, start: int, end: int, etag: Optional[str] = None):
+    arguments = {"Bucket": bucket, "Key": key, "Range": f"bytes={start}-{end}"}
+    if etag:
+        arguments["IfMatch"] = etag
+    return s3_client.get_object(**arguments)
+
+
+def object_ranges(size: int, part_size: int) -> List[Tuple[int, int]]:
+    """
+    Inclusive (start, end) byte ranges covering an object of `size` bytes.
+    """
+    return [(start, min(start + part_size, size) - 1) for start in range(0, size, part_size)]
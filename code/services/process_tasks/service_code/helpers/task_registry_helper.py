@@ -0,0 +1,52 @@
+from typing import Any, Callable, Dict, Optional
+
+EXECUTORS = ("thread", "process")
+
+
+class Task_Registry:
+    """
+    Maps TASK names to the function that processes one source event.
+
+    A registration declares:
+        process (callable): Takes (source_event, aws_clients); its return value is passed back in the record result.
+        executor (str): "thread" runs in this process on the shared clients (sequentially or on TASK_PARALLELISM
+            threads); "process" fans the task's source events out across the process pool, for CPU-heavy work.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[str, Dict[str, Any]] = {}
+
+    def register(self, task_name: str, process: Callable[[Any, Any], Any], executor: str = "thread"):
+        if executor not in EXECUTORS:
+            raise ValueError(f"Unsupported executor: {executor}")
+        if task_name in self._tasks:
+            raise ValueError(f"A task is already registered for {task_name}")
+
+        # Because a pool process imports the module by name to find the registration
+        self._tasks[task_name] = {
+            "name": task_name,
+            "process": process,
+            "executor": executor,
+            "module": process.__module__,
+        }
+        return process
+
+    def task(self, task_name: str, **options) -> Callable:
+        """
+        Decorator form of `register`.
+        """
+
+        def decorator(process):
+            return self.register(task_name, process, **options)
+
+        return decorator
+
+    def get(self, task_name: str) -> Optional[Dict[str, Any]]:
+        return self._tasks.get(task_name)
+
+    def unregister(self, task_name: str):
+        self._tasks.pop(task_name, None)
+
+
+# Because task modules register themselves on import, process_task and the pool processes share this registry
+task_registry = Task_Registry()
@@ -0,0 +1,194 @@
+import json
+import os
+import queue
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+# Because an item is claimed by renaming it, a crashed worker leaves it behind under this suffix
+PROCESSING_SUFFIX = ".processing"
+FAILED_SUFFIX = ".failed"
+
+
+class Work_Item:
+    def __init__(self, item_id: str, body: Dict[str, Any], receipt: Any = None):
+        self.item_id = item_id
+        self.body = body
+        self.receipt = receipt
+
+
+class Memory_Work_Queue:
+    """
+    In-process queue for tests and local runs.
+    """
+
+    def __init__(self):
+        self._items: "queue.Queue[Work_Item]" = queue.Queue()
+        self.acked: List[Work_Item] = []
+        self.failed: List[Work_Item] = []
+
+    def send(self, body: Dict[str, Any]) -> str:
+        item_id = str(uuid.uuid4())
+        self._items.put(Work_Item(item_id, body))
+        return item_id
+
+    def receive(self, max_items: int, wait_seconds: float) -> List[Work_Item]:
+        items = []
+        try:
+            items.append(self._items.get(timeout=wait_seconds) if wait_seconds else self._items.get_nowait())
+            while len(items) < max_items:
+                items.append(self._items.get_nowait())
+        except queue.Empty:
+            pass
+        return items
+
+    def ack(self, item: Work_Item):
+        self.acked.append(item)
+
+    def nack(self, item: Work_Item):
+        self._items.put(item)
+
+    def fail(self, item: Work_Item):
+        self.failed.append(item)
+
+    def extend(self, item: Work_Item):
+        return None
+
+
+class File_Work_Queue:
+    """
+    Queue backed by a directory of JSON files, one per item, for local runs without AWS.
+
+    An item is claimed by renaming it, so several local workers can share a directory; ack deletes the claimed file,
+    nack renames it back and fail parks it under FAILED_SUFFIX for inspection.
+    """
+
+    def __init__(self, directory: str, poll_seconds: float = 0.5):
+        self.directory = directory
+        self.poll_seconds = poll_seconds
+        os.makedirs(directory, exist_ok=True)
+
+    def send(self, body: Dict[str, Any]) -> str:
+        item_id = f"{time.time_ns()}-{uuid.uuid4()}"
+        temporary_path = os.path.join(self.directory, f".{item_id}.tmp")
+        with open(temporary_path, "w") as item_file:
+            json.dump(body, item_file)
+        # Because a reader must never see a half written item
+        os.replace(temporary_path, os.path.join(self.directory, f"{item_id}.json"))
+        return item_id
+
+    def receive(self, max_items: int, wait_seconds: float) -> List[Work_Item]:
+        deadline = time.monotonic() + wait_seconds
+        while True:
+            items = self._claim(max_items)
+            if items or time.monotonic() >= deadline:
+                return items
+            time.sleep(min(self.poll_seconds, max(0.0, deadline - time.monotonic())))
+
+    def _claim(self, max_items: int) -> List[Work_Item]:
+        items = []
+        for file_name in sorted(os.listdir(self.directory)):
+            if len(items) >= max_items:
+                break
+            if not file_name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, file_name)
+            claimed_path = path + PROCESSING_SUFFIX
+            try:
+                os.rename(path, claimed_path)
+            except FileNotFoundError:
+                # Because another worker claimed it first
+                continue
+            with open(claimed_path) as item_file:
+                items.append(Work_Item(file_name[: -len(".json")], json.load(item_file), claimed_path))
+        return items
+
+    def ack(self, item: Work_Item):
+        os.remove(item.receipt)
+
+    def nack(self, item: Work_Item):
+        os.rename(item.receipt, item.receipt[: -len(PROCESSING_SUFFIX)])
+
+    def fail(self, item: Work_Item):
+        os.rename(item.receipt, item.receipt[: -len(PROCESSING_SUFFIX)] + FAILED_SUFFIX)
+
+    def extend(self, item: Work_Item):
+        # Because a claimed file stays claimed until it is acked, nacked or failed
+        return None
+
+
+class Sqs_Work_Queue:
+    """
+    Amazon SQS queue.
+
+    Messages are received with `visibility_timeout_seconds`, and while the worker holds them `extend` pushes the
+    timeout out again (the worker calls it every `heartbeat_seconds`), so a task that runs longer than the timeout is
+    not delivered to a second worker. A nack (an item the worker never started) makes the message visible again right
+    away. A failed message is left alone, so it comes back after its visibility timeout and the queue's redrive policy
+    moves it to a dead letter queue once it keeps failing.
+    """
+
+    # Because SQS caps ReceiveMessage at 10 messages and long polling at 20 seconds
+    MAX_ITEMS = 10
+    MAX_WAIT_SECONDS = 20
+
+    def __init__(self, sqs_client, queue_url: str, visibility_timeout_seconds: int = 60):
+        if visibility_timeout_seconds < 3:
+            raise ValueError("visibility_timeout_seconds must leave room for a heartbeat, use at least 3")
+        self.sqs_client = sqs_client
+        self.queue_url = queue_url
+        self.visibility_timeout_seconds = int(visibility_timeout_seconds)
+        # Because an extension that arrives after the timeout lapsed is too late, two are sent per timeout period
+        self.heartbeat_seconds = self.visibility_timeout_seconds / 3
+
+    def send(self, body: Dict[str, Any]) -> str:
+        return self.sqs_client.send_message(QueueUrl=self.queue_url, MessageBody=json.dumps(body))["MessageId"]
+
+    def receive(self, max_items: int, wait_seconds: float) -> List[Work_Item]:
+        response = self.sqs_client.receive_message(
+            QueueUrl=self.queue_url,
+            MaxNumberOfMessages=min(max_items, Sqs_Work_Queue.MAX_ITEMS),
+            WaitTimeSeconds=int(min(wait_seconds, Sqs_Work_Queue.MAX_WAIT_SECONDS)),
+            VisibilityTimeout=self.visibility_timeout_seconds,
+        )
+        return [
+            Work_Item(message["MessageId"], json.loads(message["Body"]), message["ReceiptHandle"])
+            for message in response.get("Messages", [])
+        ]
+
+    def ack(self, item: Work_Item):
+        self.sqs_client.delete_message(QueueUrl=self.queue_url, ReceiptHandle=item.receipt)
+
+    def nack(self, item: Work_Item):
+        self.sqs_client.change_message_visibility(
+            QueueUrl=self.queue_url, ReceiptHandle=item.receipt, VisibilityTimeout=0
+        )
+
+    def fail(self, item: Work_Item):
+        return None
+
+    def extend(self, item: Work_Item):
+        self.sqs_client.change_message_visibility(
+            QueueUrl=self.queue_url, ReceiptHandle=item.receipt, VisibilityTimeout=self.visibility_timeout_seconds
+        )
+
+
+def create_work_queue(environment_variables, sqs_client_factory=None) -> Optional[Any]:
+    """
+    Build the queue named by WORK_QUEUE_BACKEND: "sqs" (WORK_QUEUE_URL), "file" (WORK_QUEUE_DIRECTORY) or "memory".
+    """
+    backend = environment_variables["WORK_QUEUE_BACKEND"]
+    if backend == "sqs":
+        if not environment_variables["WORK_QUEUE_URL"]:
+            raise Exception("WORK_QUEUE_BACKEND is sqs but WORK_QUEUE_URL is not set")
+        return Sqs_Work_Queue(
+            sqs_client_factory(),
+            environment_variables["WORK_QUEUE_URL"],
+            environment_variables["WORK_QUEUE_VISIBILITY_TIMEOUT_SECONDS"],
+        )
+    if backend == "file":
+        return File_Work_Queue(environment_variables["WORK_QUEUE_DIRECTORY"])
+    if backend == "memory":
+        return Memory_Work_Queue()
+
+    raise Exception(f"Unsupported WORK_QUEUE_BACKEND: {backend}")
@@ -0,0 +1,127 @@
+import signal
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+from static.logger import flush_logs, logger
+from static.metrics import metrics
+
+
+class Worker:
+    """
+    Keeps the task container up and processes work items from a queue, so the container start, secret fetch and
+    MySQL handshake are paid once rather than per event.
+
+    Items are acked when `process_item` returns and handed to the queue's `fail` when it raises; until then a
+    `Visibility_Heartbeat` keeps the batch hidden from other workers. The worker stops once
+    no item has arrived for `idle_timeout_seconds`, or after SIGTERM/SIGINT (e.g. ECS stopping the task), in which
+    case it finishes the current item and returns the rest of its batch to the queue.
+    """
+
+    def __init__(
+        self,
+        work_queue,
+        process_item: Callable[[Any], None],
+        idle_timeout_seconds: float,
+        wait_seconds: float = 20,
+        max_items: int = 1,
+    ):
+        self.work_queue = work_queue
+        self.process_item = process_item
+        self.idle_timeout_seconds = idle_timeout_seconds
+        self.wait_seconds = wait_seconds
+        self.max_items = max_items
+        self.stopping = False
+
+    def install_signal_handlers(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+    def stop(self, signal_number=None, frame=None):
+        logger.info("Worker stopping after the current item (signal %s)", signal_number)
+        self.stopping = True
+
+    def run(self) -> Dict[str, int]:
+        counts = {"processed": 0, "failed": 0, "returned": 0}
+        last_item_at = time.monotonic()
+
+        while not self.stopping:
+            idle_seconds = time.monotonic() - last_item_at
+            if idle_seconds >= self.idle_timeout_seconds:
+                logger.info("Worker idle for %.0fs, shutting down", idle_seconds)
+                break
+
+            items = self.work_queue.receive(
+                self.max_items, min(self.wait_seconds, self.idle_timeout_seconds - idle_seconds)
+            )
+            with Visibility_Heartbeat(self.work_queue, items) as heartbeat:
+                for item in items:
+                    if self.stopping:
+                        heartbeat.release(item)
+                        self.work_queue.nack(item)
+                        counts["returned"] += 1
+                        continue
+                    counts[self._process(item, heartbeat)] += 1
+            if items:
+                last_item_at = time.monotonic()
+
+        logger.info("Worker finished: %s", counts)
+        return counts
+
+    def _process(self, item, heartbeat: "Visibility_Heartbeat") -> str:
+        try:
+            self.process_item(item)
+            heartbeat.release(item)
+            self.work_queue.ack(item)
+            return "processed"
+
+        except Exception as e:
+            logger.error("Work item %s failed: %s", item.item_id, e)
+            heartbeat.release(item)
+            self.work_queue.fail(item)
+            return "failed"
+
+        finally:
+            # Because each item is reported like a one-shot task run, and the first one carries the cold start
+            metrics.flush()
+            flush_logs()
+
+
+class Visibility_Heartbeat:
+    """
+    Extends the queue visibility of a received batch every `heartbeat_seconds` on a background thread, until each item
+    is released, so an item that runs (or waits behind its batch) longer than the queue's visibility timeout is not
+    delivered to another worker. Queues without a visibility timeout have no `heartbeat_seconds` and get no thread.
+    """
+
+    def __init__(self, work_queue, items: List[Any]):
+        self.work_queue = work_queue
+        self.interval_seconds = getattr(work_queue, "heartbeat_seconds", None)
+        self._held = list(items)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "Visibility_Heartbeat":
+        if self.interval_seconds and self._held:
+            self._thread = threading.Thread(target=self._beat, name="visibility-heartbeat", daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+
+    def release(self, item):
+        # Because the lock is held while extending, an item is never extended after it is acked, failed or returned
+        with self._lock:
+            self._held = [held for held in self._held if held is not item]
+
+    def _beat(self):
+        while not self._stopped.wait(self.interval_seconds):
+            with self._lock:
+                for item in self._held:
+                    try:
+                        self.work_queue.extend(item)
+                    except Exception as e:
+                        logger.error("Could not extend the visibility of work item %s: %s", item.item_id, e)
@@ -1,40 +1,221 @@
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from static.constants import get_read_only_env_variables
-from static.logger import logger
-from static.aws_clients import AwsClients
+from static.logger import flush_logs, log_payload, logger
+from static.metrics import metrics
+from static.aws_clients import AwsClients, Thread_Aws_Clients
+from helpers.parse_source_event import parse_source_event_value, resolve_source_event
+from helpers.process_pool_helper import available_cpus, shared_process_pool, shutdown_process_pool
+from helpers.task_registry_helper import task_registry
+from helpers.work_queue_helper import create_work_queue
+from helpers.worker_helper import Worker
+
+# Because task modules register themselves on import
+import tasks.example_task  # noqa: F401
 
 
 def handler():
+    try:
+        run_handler()
+    finally:
+        # Because the task exits after the handler, its metrics are written once whether it succeeded or not
+        metrics.flush()
+        flush_logs()
+
+
+def run_handler():
     environment_variables = get_read_only_env_variables()
 
     # identify task
     TASK = environment_variables["TASK"] or ""
-    logger.info(f"Called to process task: {TASK}")
+    logger.info("Called to process task: %s", TASK)
+    metrics.set_dimension("Task", TASK)
+
+    parallelism = environment_variables["TASK_PARALLELISM"]
+    pool_size = environment_variables["TASK_PROCESS_POOL_SIZE"]
 
     # instantiate clients
-    aws_clients = AwsClients.initialize_clients()
+    with metrics.timer("ClientSetup"):
+        aws_clients = AwsClients.initialize_clients()
     aurora = aws_clients["mysql_client"]
-    s3_client = aws_clients["s3_client"]
 
-    # execute single task based on environment variable
     try:
-        if TASK == "EXAMPLE":
-            print("Do a thing")
+        source_event = environment_variables["SOURCE_EVENT"]
+        run_task(TASK, source_event, environment_variables["SOURCE_EVENTS"], aws_clients, parallelism, pool_size)
+
+    finally:
+        clean_up_handler(aurora)
+
+
+def run_worker():
+    """
+    Worker mode: keep the container and its clients up and run the tasks described by work items from the queue.
+    """
+    environment_variables = get_read_only_env_variables()
+    logger.info("Starting worker on the %s work queue", environment_variables["WORK_QUEUE_BACKEND"])
+
+    # Because every work item reuses these clients, the secret fetch and mysql handshake happen once per container
+    with metrics.timer("ClientSetup"):
+        aws_clients = AwsClients.initialize_clients()
+    work_queue = create_work_queue(environment_variables, lambda: AwsClients.sqs_client(environment_variables))
+    parallelism = environment_variables["TASK_PARALLELISM"]
+    pool_size = environment_variables["TASK_PROCESS_POOL_SIZE"]
+    worker = Worker(
+        work_queue,
+        lambda item: process_work_item(item, aws_clients, parallelism, pool_size),
+        idle_timeout_seconds=environment_variables["WORKER_IDLE_TIMEOUT_SECONDS"],
+        wait_seconds=environment_variables["WORKER_WAIT_SECONDS"],
+        max_items=environment_variables["WORKER_MAX_ITEMS"],
+    )
+    worker.install_signal_handlers()
+
+    try:
+        return worker.run()
+
+    finally:
+        clean_up_handler(aws_clients["mysql_client"])
+        metrics.flush()
+        flush_logs()
+
 
+def process_work_item(item, aws_clients, parallelism=1, pool_size=None):
+    # a work item carries the TASK, SOURCE_EVENT and SOURCE_EVENTS values a one-shot task reads from its environment
+    TASK = item.body.get("TASK") or ""
+    logger.info("Called to process task: %s (work item %s)", TASK, item.item_id)
+    metrics.set_dimension("Task", TASK)
+
+    source_event = parse_source_event_value(item.body.get("SOURCE_EVENT"))
+    source_events = parse_source_event_value(item.body.get("SOURCE_EVENTS")) or []
+    run_task(TASK, source_event, source_events, aws_clients, parallelism, pool_size)
+
+
+def run_task(TASK, source_event, source_events, aws_clients, parallelism=1, pool_size=None):
+    """
+    Resolve the task's source events and process them, raising when any record failed.
+    """
+    s3_client = aws_clients["s3_client"]
+
+    # a batched task receives SOURCE_EVENTS, a single-record task receives SOURCE_EVENT; either may be a claim check
+    with metrics.timer("ResolveSourceEvent"):
+        if source_events:
+            source_events = resolve_source_event(source_events, s3_client)
         else:
-            raise Exception(f"Task not matched in process_task_fargate. Task provided: {TASK}")
+            source_events = [resolve_source_event(source_event, s3_client)]
+
+    # execute every record in the batch and report each result
+    try:
+        results = process_source_events(TASK, source_events, aws_clients, parallelism, pool_size)
+        failures = [result for result in results if result["outcome"] == "error"]
+        logger.info("Processed %d records for task %s with %d failures", len(results), TASK, len(failures))
+        metrics.add_count("Records", len(results))
+        metrics.add_count("FailedRecords", len(failures))
+        if failures:
+            raise Exception(f"{len(failures)} of {len(results)} records failed")
 
     except Exception as e:
         error_message = f"Failed to process task for source_event: {TASK}. EXCEPTION: {e}"
         raise Exception(error_message) from e
 
+
+def process_source_events(TASK, source_events, aws_clients, parallelism=1, pool_size=None):
+    """
+    Run TASK for every source event and return one result per record in input order:
+    {"outcome": "success" | "error", "source_event": ..., "error"?: str, "value"?: ...}.
+
+    Results are logged as each record finishes rather than once the whole batch is done.
+    """
+    results = [None] * len(source_events)
+    for index, result in iter_source_event_results(TASK, source_events, aws_clients, parallelism, pool_size):
+        result["source_event"] = source_events[index]
+        log_payload("Record result", result)
+        results[index] = result
+
+    return results
+
+
+def iter_source_event_results(TASK, source_events, aws_clients, parallelism=1, pool_size=None):
+    """
+    Yield (index, result) per source event in completion order: on the process pool for tasks registered with the
+    "process" executor, otherwise on `parallelism` threads or in sequence.
+    """
+    registration = task_registry.get(TASK)
+    pool_size = pool_size or available_cpus()
+
+    # Because a single process pool worker would only add pickling and a second interpreter
+    if registration and registration["executor"] == "process" and pool_size > 1 and len(source_events) > 1:
+        yield from shared_process_pool(pool_size).run(registration, source_events)
+
+    elif parallelism > 1 and len(source_events) > 1:
+        yield from iter_threaded_results(TASK, source_events, aws_clients, parallelism)
+
+    else:
+        for index, source_event in enumerate(source_events):
+            yield index, process_source_event(TASK, source_event, aws_clients)
+
+
+def iter_threaded_results(TASK, source_events, aws_clients, parallelism):
+    # Because the shared mysql connection is not thread-safe, each thread opens its own when its task first reads it
+    environment_variables = get_read_only_env_variables()
+    thread_state = threading.local()
+    opened_clients = []
+    opened_clients_lock = threading.Lock()
+
+    def process_on_thread(source_event):
+        thread_clients = getattr(thread_state, "clients", None)
+        if thread_clients is None:
+            thread_clients = thread_state.clients = Thread_Aws_Clients(aws_clients, environment_variables)
+            with opened_clients_lock:
+                opened_clients.append(thread_clients)
+        return process_source_event(TASK, source_event, thread_clients)
+
+    try:
+        with ThreadPoolExecutor(max_workers=min(parallelism, len(source_events))) as executor:
+            futures = {
+                executor.submit(process_on_thread, source_event): index
+                for index, source_event in enumerate(source_events)
+            }
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
     finally:
-        clean_up_handler(aurora)
+        for thread_clients in opened_clients:
+            if "mysql_client" in thread_clients:
+                thread_clients["mysql_client"].close_connection()
+
+
+def process_source_event(TASK, source_event, aws_clients):
+    try:
+        with metrics.timer("ProcessTask"):
+            value = process_task(TASK, source_event, aws_clients)
+        result = {"outcome": "success", "source_event": source_event}
+        if value is not None:
+            result["value"] = value
+        return result
+
+    except Exception as e:
+        logger.error("Failed to process record for task %s: %s", TASK, e)
+        return {"outcome": "error", "source_event": source_event, "error": str(e)}
+
+
+def process_task(TASK, source_event, aws_clients):
+    # execute single task based on environment variable
+    registration = task_registry.get(TASK)
+    if registration is None:
+        raise Exception(f"Task not matched in process_task_fargate. Task provided: {TASK}")
+
+    return registration["process"](source_event, aws_clients)
 
 
 def clean_up_handler(aurora):
+    shutdown_process_pool()
     if aurora:
         aurora.close_connection()
 
 
 if __name__ == "__main__":
-    handler()
+    # Because the same image runs one-shot tasks and long-lived workers: `python3 process_task.py worker`
+    if "worker" in sys.argv[1:] or get_read_only_env_variables()["WORKER_MODE"]:
+        run_worker()
+    else:
+        handler()
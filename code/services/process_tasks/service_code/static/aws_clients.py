@@ -1,5 +1,3 @@
-import boto3
-from static.mysql_connection import AuroraMysql
 from static.types import AwsClientsDict
 from static.constants import get_read_only_env_variables
 from typing import Optional
@@ -8,6 +6,7 @@ from typing import Optional
 aws_clients: Optional[AwsClientsDict] = None
 
 
+# Because boto3 and mysql.connector dominate container start, each factory imports them only when it builds a client
 class AwsClients:
     @staticmethod
     # We set global inside handler because of the limitations in (my understanding of) python testing.
@@ -39,6 +38,8 @@ class AwsClients:
 
     @staticmethod
     def dynamo_client(constants):
+        import boto3
+
         aws_region = constants["AWS_REGION"]
         return boto3.resource("dynamodb", region_name=aws_region)
 
@@ -49,19 +50,86 @@ class AwsClients:
 
     @staticmethod
     def ecs_client(constants):
+        import boto3
+
         aws_region = constants["AWS_REGION"]
         return boto3.client("ecs", region_name=aws_region)
 
     @staticmethod
     def secret_manager_client(constants):
+        import boto3
+
         aws_region = constants["AWS_REGION"]
         return boto3.client("secretsmanager", region_name=aws_region)
 
     @staticmethod
     def s3_client(constants):
+        import boto3
+
         aws_region = constants["AWS_REGION"]
         return boto3.client("s3", region_name=aws_region)
 
+    @staticmethod
+    def sqs_client(constants):
+        import boto3
+
+        aws_region = constants["AWS_REGION"]
+        return boto3.client("sqs", region_name=aws_region)
+
     @staticmethod
     def mysql_client(constants, secrets_manager_client):
+        from static.mysql_connection import AuroraMysql
+
         return AuroraMysql(constants, secrets_manager_client)
+
+
+class Lazy_Aws_Clients(dict):
+    """
+    aws_clients mapping that builds each client the first time it is read.
+
+    A process pool worker uses it so a work unit that never touches MySQL never fetches the secret or opens a
+    connection; `"mysql_client" in clients` tells whether a client has been built yet.
+    """
+
+    def __init__(self, environment_variables):
+        super().__init__()
+        self.environment_variables = environment_variables
+
+    def __missing__(self, client_name):
+        constants = self.environment_variables
+        if client_name == "event_source_table_client":
+            client = AwsClients.event_source_table_client(constants, self["dynamo_client"])
+        elif client_name == "mysql_client":
+            client = AwsClients.mysql_client(constants, self["secrets_manager_client"])
+        elif client_name == "secrets_manager_client":
+            client = AwsClients.secret_manager_client(constants)
+        elif client_name in ("dynamo_client", "ecs_client", "s3_client", "sqs_client"):
+            client = getattr(AwsClients, client_name)(constants)
+        else:
+            raise KeyError(client_name)
+
+        self[client_name] = client
+        return client
+
+
+class Thread_Aws_Clients(dict):
+    """
+    aws_clients mapping for one of a task's `TASK_PARALLELISM` threads.
+
+    The boto3 clients are shared with `shared_clients`, but the thread opens its own MySQL connection the first time it
+    reads "mysql_client", because a connection and its cursor must not be used by two threads at once.
+    """
+
+    def __init__(self, shared_clients, environment_variables):
+        super().__init__()
+        self.shared_clients = shared_clients
+        self.environment_variables = environment_variables
+
+    def __missing__(self, client_name):
+        if client_name == "mysql_client":
+            client = AwsClients.mysql_client(self.environment_variables, self.shared_clients["secrets_manager_client"])
+        else:
+            client = self.shared_clients[client_name]
+
+        self[client_name] = client
+        return client
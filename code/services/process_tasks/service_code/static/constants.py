@@ -5,6 +5,11 @@ from helpers.parse_source_event import parse_source_event
 def get_read_only_env_variables():
     SOURCE_EVENT_RAW = os.getenv("SOURCE_EVENT") or ""
     SOURCE_EVENT = parse_source_event(SOURCE_EVENT_RAW)
+    SOURCE_EVENTS_RAW = os.getenv("SOURCE_EVENTS") or ""
+    SOURCE_EVENTS = parse_source_event(SOURCE_EVENTS_RAW) or []
+    TASK_PARALLELISM = int(os.getenv("TASK_PARALLELISM") or 1)
+    # Because 0 (the default) sizes the process pool to the container's CPU quota
+    TASK_PROCESS_POOL_SIZE = int(os.getenv("TASK_PROCESS_POOL_SIZE") or 0)
     DEPLOYMENT_ENVIRONMENT = os.getenv("DEPLOYMENT_ENVIRONMENT") or ""
     AWS_REGION = os.getenv("AWS_REGION") or ""
     TASK = os.getenv("TASK") or ""
@@ -12,6 +17,18 @@ def get_read_only_env_variables():
     BUCKET_NAME = os.getenv("BUCKET_NAME") or ""
     IS_LOCAL = os.getenv("IS_LOCAL") or ""
     IS_LOCAL = bool(IS_LOCAL)
+    MYSQL_MAX_IDLE_SECONDS = os.getenv("MYSQL_MAX_IDLE_SECONDS") or ""
+    MYSQL_MAX_AGE_SECONDS = os.getenv("MYSQL_MAX_AGE_SECONDS") or ""
+    MYSQL_USE_PURE = os.getenv("MYSQL_USE_PURE") or ""
+    WORKER_MODE = (os.getenv("WORKER_MODE") or "").lower() in ("1", "true", "yes")
+    WORK_QUEUE_BACKEND = os.getenv("WORK_QUEUE_BACKEND") or "sqs"
+    WORK_QUEUE_URL = os.getenv("WORK_QUEUE_URL") or ""
+    WORK_QUEUE_DIRECTORY = os.getenv("WORK_QUEUE_DIRECTORY") or "/tmp/work-queue"
+    # Because the worker extends it while an item runs, this only bounds how long a crashed worker holds a message
+    WORK_QUEUE_VISIBILITY_TIMEOUT_SECONDS = int(os.getenv("WORK_QUEUE_VISIBILITY_TIMEOUT_SECONDS") or 60)
+    WORKER_IDLE_TIMEOUT_SECONDS = float(os.getenv("WORKER_IDLE_TIMEOUT_SECONDS") or 300)
+    WORKER_WAIT_SECONDS = float(os.getenv("WORKER_WAIT_SECONDS") or 20)
+    WORKER_MAX_ITEMS = int(os.getenv("WORKER_MAX_ITEMS") or 1)
 
     return {
         "TASK": TASK,
@@ -20,5 +37,19 @@ def get_read_only_env_variables():
         "AWS_REGION": AWS_REGION,
         "BUCKET_NAME": BUCKET_NAME,
         "SOURCE_EVENT": SOURCE_EVENT,
+        "SOURCE_EVENTS": SOURCE_EVENTS,
+        "TASK_PARALLELISM": TASK_PARALLELISM,
+        "TASK_PROCESS_POOL_SIZE": TASK_PROCESS_POOL_SIZE,
         "IS_LOCAL": IS_LOCAL,
+        "MYSQL_MAX_IDLE_SECONDS": MYSQL_MAX_IDLE_SECONDS,
+        "MYSQL_MAX_AGE_SECONDS": MYSQL_MAX_AGE_SECONDS,
+        "MYSQL_USE_PURE": MYSQL_USE_PURE,
+        "WORKER_MODE": WORKER_MODE,
+        "WORK_QUEUE_BACKEND": WORK_QUEUE_BACKEND,
+        "WORK_QUEUE_URL": WORK_QUEUE_URL,
+        "WORK_QUEUE_DIRECTORY": WORK_QUEUE_DIRECTORY,
+        "WORK_QUEUE_VISIBILITY_TIMEOUT_SECONDS": WORK_QUEUE_VISIBILITY_TIMEOUT_SECONDS,
+        "WORKER_IDLE_TIMEOUT_SECONDS": WORKER_IDLE_TIMEOUT_SECONDS,
+        "WORKER_WAIT_SECONDS": WORKER_WAIT_SECONDS,
+        "WORKER_MAX_ITEMS": WORKER_MAX_ITEMS,
     }
@@ -0,0 +1,6 @@
+from helpers.task_registry_helper import task_registry
+
+
+@task_registry.task("EXAMPLE")
+def example_task(source_event, aws_clients):
+    print("Do a thing")
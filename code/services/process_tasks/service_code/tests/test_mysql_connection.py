@@ -0,0 +1,226 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+import mysql.connector
+from helpers.secrets_manager_helper import Secrets_Manager
+from static.mysql_connection import AuroraMysql
+from test_s3_stream import Stand_In_S3
+
+ROWS = [(index, f"name {index}") for index in range(1, 8)]
+
+
+class Stand_In_Cursor:
+    """
+    Unbuffered cursor stand-in over ROWS that understands the keyset page queries `iter_table` builds.
+    """
+
+    def __init__(self, statements):
+        self.statements = statements
+        self.column_names = ("id", "name")
+        self.closed = False
+        self._rows = []
+
+    def execute(self, sql, params=()):
+        self.statements.append((sql, tuple(params)))
+        rows = ROWS
+        if "> (%s)" in sql:
+            rows = [row for row in rows if row[0] > params[-2]]
+        if sql.endswith("LIMIT %s"):
+            rows = rows[: params[-1]]
+        self._rows = list(rows)
+
+    def fetchmany(self, size):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def close(self):
+        self.closed = True
+
+
+def build_aurora(mock_mysql_connector, cursor_factory):
+    secrets_manager_client = MagicMock(name="secrets_manager_client")
+    secrets_manager_client.get_secret_value.return_value = {
+        "SecretString": json.dumps(
+            {"host": "localhost", "dbname": "test_db", "username": "test_user", "port": 3306, "password": "test"}
+        )
+    }
+    connection = mock_mysql_connector.return_value
+    connection.unread_result = False
+    connection.cursor.side_effect = lambda **kwargs: cursor_factory()
+    return AuroraMysql({"DEPLOYMENT_ENVIRONMENT": "local-test"}, secrets_manager_client)
+
+
+class TestAuroraMysqlStreamingReads(unittest.TestCase):
+    def setUp(self):
+        Secrets_Manager.clear_cache()
+        self.statements = []
+
+    @patch("mysql.connector.connect")
+    def test_iter_query_yields_bounded_chunks(self, mock_mysql_connector):
+        aurora = build_aurora(mock_mysql_connector, lambda: Stand_In_Cursor(self.statements))
+
+        chunks = list(aurora.iter_query("SELECT id, name FROM example", chunk_size=3))
+
+        self.assertEqual([len(chunk) for chunk in chunks], [3, 3, 1])
+        self.assertEqual([row for chunk in chunks for row in chunk], ROWS)
+        self.assertEqual(chunks[0].column_names, ("id", "name"))
+        aurora.connection.cursor.assert_called_with(buffered=False)
+
+    @patch("mysql.connector.connect")
+    def test_iter_query_can_yield_dicts(self, mock_mysql_connector):
+        aurora = build_aurora(mock_mysql_connector, lambda: Stand_In_Cursor(self.statements))
+
+        chunk = next(aurora.iter_query("SELECT id, name FROM example", chunk_size=2, as_dict=True))
+
+        self.assertEqual(chunk.rows, [{"id": 1, "name": "name 1"}, {"id": 2, "name": "name 2"}])
+
+    @patch("mysql.connector.connect")
+    def test_iter_table_pages_by_key_and_resumes(self, mock_mysql_connector):
+        aurora = build_aurora(mock_mysql_connector, lambda: Stand_In_Cursor(self.statements))
+
+        chunks = list(aurora.iter_table("example", "id", columns=["name"], where="name IS NOT NULL", chunk_size=3))
+
+        self.assertEqual([chunk.last_key for chunk in chunks], [3, 6, 7])
+        self.assertEqual(
+            self.statements[0],
+            ("SELECT name, id FROM example WHERE (name IS NOT NULL) ORDER BY id LIMIT %s", (3,)),
+        )
+        self.assertEqual(
+            self.statements[1],
+            ("SELECT name, id FROM example WHERE (name IS NOT NULL) AND (id) > (%s) ORDER BY id LIMIT %s", (3, 3)),
+        )
+
+        resumed = list(aurora.iter_table("example", "id", chunk_size=3, start_after=chunks[0].last_key, as_dict=True))
+
+        self.assertEqual([row["id"] for chunk in resumed for row in chunk], [4, 5, 6, 7])
+
+
+class Recording_Cursor:
+    """
+    Cursor stand-in that keeps each LOAD DATA file's contents (the file is deleted once the chunk commits).
+    """
+
+    def __init__(self, load_data_error=None, insert_error=None):
+        self.load_data_error = load_data_error
+        self.insert_error = insert_error
+        self.statements = []
+        self.loaded_files = []
+        self.rowcount = 0
+
+    def execute(self, sql, params=()):
+        self.statements.append((sql, params))
+        if sql.startswith("LOAD DATA"):
+            if self.load_data_error:
+                raise self.load_data_error
+            with open(params[0], encoding="utf-8") as chunk_file:
+                contents = chunk_file.read()
+            self.loaded_files.append(contents)
+            self.rowcount = contents.count("\n")
+        elif sql.startswith("INSERT") and self.insert_error:
+            raise self.insert_error
+        elif sql == "SELECT @@max_allowed_packet":
+            self.rowcount = 1
+
+    def fetchone(self):
+        return (1024 * 1024,)
+
+    def close(self):
+        return None
+
+
+class TestAuroraMysqlBulkLoad(unittest.TestCase):
+    def setUp(self):
+        Secrets_Manager.clear_cache()
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "rows.csv")
+        with open(self.path, "w", newline="") as source_file:
+            source_file.write('id,name,ignored\n1,"tab\there",x\n2,,y\n3,"line\nbreak",z\n')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    @patch("mysql.connector.connect")
+    def test_load_data_in_chunked_transactions(self, mock_mysql_connector):
+        cursor = Recording_Cursor()
+        aurora = build_aurora(mock_mysql_connector, lambda: cursor)
+
+        reports = aurora.bulk_load(
+            "example", self.path, column_mapping={"id": "id", "name": "message"}, null_value="", rows_per_chunk=2
+        )
+
+        self.assertEqual(
+            reports,
+            [
+                {"rows": 2, "loaded": 2, "method": "load_data", "chunk": 0},
+                {"rows": 1, "loaded": 1, "method": "load_data", "chunk": 1},
+            ],
+        )
+        self.assertEqual(cursor.loaded_files, ["1\ttab\\there\n2\t\\N\n", "3\tline\\nbreak\n"])
+        self.assertTrue(cursor.statements[0][0].startswith("LOAD DATA LOCAL INFILE %s INTO TABLE example"))
+        self.assertTrue(cursor.statements[0][0].endswith("(id, message)"))
+        self.assertEqual(aurora.connection.commit.call_count, 2)
+        self.assertFalse(os.path.exists(cursor.statements[0][1][0]))
+        self.assertIn("allow_local_infile_in_path", mock_mysql_connector.call_args.kwargs)
+
+    @patch("mysql.connector.connect")
+    def test_falls_back_to_multi_row_insert_when_local_infile_is_disabled(self, mock_mysql_connector):
+        error = mysql.connector.errors.DatabaseError(msg="Loading local data is disabled", errno=3948)
+        cursor = Recording_Cursor(load_data_error=error)
+        aurora = build_aurora(mock_mysql_connector, lambda: cursor)
+
+        reports = aurora.bulk_load("example", self.path, column_mapping=["id", None, "source"], has_header=True)
+
+        self.assertEqual(reports, [{"rows": 3, "loaded": 3, "method": "insert", "chunk": 0}])
+        insert = [statement for statement in cursor.statements if statement[0].startswith("INSERT")]
+        self.assertEqual(insert[0][0], "INSERT INTO example (id, source) VALUES (%s, %s), (%s, %s), (%s, %s)")
+        self.assertEqual(insert[0][1], ["1", "x", "2", "y", "3", "z"])
+        aurora.connection.rollback.assert_called_once()
+        aurora.connection.commit.assert_called_once()
+
+    @patch("mysql.connector.connect")
+    def test_failed_insert_chunk_is_rolled_back_as_a_whole(self, mock_mysql_connector):
+        error = mysql.connector.errors.DatabaseError(msg="Deadlock found", errno=1213)
+        cursor = Recording_Cursor(insert_error=error)
+        aurora = build_aurora(mock_mysql_connector, lambda: cursor)
+        aurora.max_allowed_packet = 64
+
+        with self.assertRaises(mysql.connector.errors.DatabaseError):
+            aurora.bulk_load("example", self.path, column_mapping=["id", None, "source"], method="insert")
+
+        aurora.connection.commit.assert_not_called()
+        aurora.connection.rollback.assert_called_once()
+
+    @patch("mysql.connector.connect")
+    def test_short_rows_are_reported_with_their_line(self, mock_mysql_connector):
+        with open(self.path, "w", newline="") as source_file:
+            source_file.write("id,name,source\n1,a,x\n2,b\n")
+        aurora = build_aurora(mock_mysql_connector, lambda: Recording_Cursor())
+
+        with self.assertRaisesRegex(Exception, "Line 3 has 2 fields"):
+            aurora.bulk_load("example", self.path, column_mapping={"id": "id", "source": "source"})
+
+    @patch("mysql.connector.connect")
+    def test_other_load_data_errors_are_raised(self, mock_mysql_connector):
+        cursor = Recording_Cursor(load_data_error=mysql.connector.errors.DatabaseError(msg="Deadlock", errno=1213))
+        aurora = build_aurora(mock_mysql_connector, lambda: cursor)
+
+        with self.assertRaises(mysql.connector.errors.DatabaseError):
+            aurora.bulk_load("example", self.path)
+
+    @patch("mysql.connector.connect")
+    def test_load_from_s3_streams_the_object(self, mock_mysql_connector):
+        cursor = Recording_Cursor()
+        aurora = build_aurora(mock_mysql_connector, lambda: cursor)
+        s3_client = Stand_In_S3(latency_seconds=0)
+        s3_client.objects[("bucket", "rows.tsv")] = b"a\tb\n1\t2\n3\t4\n"
+
+        reports = aurora.bulk_load("example", "s3://bucket/rows.tsv", s3_client=s3_client, delimiter="\t")
+
+        self.assertEqual([report["loaded"] for report in reports], [2])
+        self.assertEqual(cursor.loaded_files, ["1\t2\n3\t4\n"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,167 @@
+import hashlib
+import io
+import os
+import threading
+import time
+import unittest
+from helpers.s3_stream_helper import (
+    S3_Multipart_Writer,
+    S3_Ranged_Reader,
+    download_to_mapped_file,
+    object_ranges,
+    upload_fileobj,
+)
+
+
+class Stand_In_Body:
+    def __init__(self, data: bytes):
+        self._stream = io.BytesIO(data)
+
+    def read(self, amount=None):
+        return self._stream.read(amount)
+
+    def close(self):
+        self._stream.close()
+
+
+class Stand_In_S3:
+    """
+    Local S3 client stand-in covering the calls the stream helpers make, recording how many run at once.
+    """
+
+    def __init__(self, latency_seconds: float = 0.005):
+        self.latency_seconds = latency_seconds
+        self.objects = {}
+        self.uploads = {}
+        self.aborted = []
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def _call(self, name):
+        with self._lock:
+            self.calls.append(name)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.latency_seconds)
+        with self._lock:
+            self.in_flight -= 1
+
+    @staticmethod
+    def _etag(data: bytes) -> str:
+        return f'"{hashlib.md5(data).hexdigest()}"'
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self._call("put_object")
+        self.objects[(Bucket, Key)] = bytes(Body)
+        return {"ETag": self._etag(Body)}
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        upload_id = f"upload-{len(self.uploads) + 1}"
+        self.uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self._call("upload_part")
+        if len(Body) == 0:
+            raise Exception("empty part")
+        self.uploads[UploadId][PartNumber] = bytes(Body)
+        return {"ETag": self._etag(Body)}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self.uploads.pop(UploadId)
+        numbers = [part["PartNumber"] for part in MultipartUpload["Parts"]]
+        if numbers != sorted(parts):
+            raise Exception("parts out of order or missing")
+        self.objects[(Bucket, Key)] = b"".join(parts[number] for number in numbers)
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads.pop(UploadId, None)
+        self.aborted.append(UploadId)
+
+    def head_object(self, Bucket, Key):
+        data = self.objects[(Bucket, Key)]
+        return {"ContentLength": len(data), "ETag": self._etag(data)}
+
+    def get_object(self, Bucket, Key, Range=None, IfMatch=None):
+        self._call("get_object")
+        data = self.objects[(Bucket, Key)]
+        if IfMatch is not None and IfMatch != self._etag(data):
+            raise Exception("PreconditionFailed")
+        if Range:
+            start, end = (int(bound) for bound in Range[len("bytes=") :].split("-"))
+            data = data[start : end + 1]
+        return {"Body": Stand_In_Body(data)}
+
+
+class TestS3Stream(unittest.TestCase):
+    def setUp(self):
+        self.s3 = Stand_In_S3()
+        self.payload = os.urandom(10 * 1024 + 17)
+
+    def test_object_ranges_cover_every_byte_once(self):
+        self.assertEqual(object_ranges(10, 4), [(0, 3), (4, 7), (8, 9)])
+        self.assertEqual(object_ranges(0, 4), [])
+
+    def test_multipart_upload_bounds_parts_in_flight(self):
+        with S3_Multipart_Writer(self.s3, "bucket", "key", part_size=1024, max_concurrency=3) as writer:
+            for start in range(0, len(self.payload), 700):
+                writer.write(self.payload[start : start + 700])
+
+        self.assertEqual(self.s3.objects[("bucket", "key")], self.payload)
+        self.assertEqual(self.s3.calls.count("upload_part"), 11)
+        self.assertLessEqual(self.s3.max_in_flight, 3)
+        self.assertGreater(self.s3.max_in_flight, 1)
+
+    def test_small_object_uses_a_single_put(self):
+        self.assertEqual(upload_fileobj(self.s3, io.BytesIO(b"small"), "bucket", "key", part_size=1024), 5)
+
+        self.assertEqual(self.s3.calls, ["put_object"])
+        self.assertEqual(self.s3.objects[("bucket", "key")], b"small")
+
+    def test_failure_inside_the_block_aborts_the_upload(self):
+        with self.assertRaises(ValueError):
+            with S3_Multipart_Writer(self.s3, "bucket", "key", part_size=1024) as writer:
+                writer.write(self.payload)
+                raise ValueError("task failed")
+
+        self.assertEqual(self.s3.aborted, ["upload-1"])
+        self.assertNotIn(("bucket", "key"), self.s3.objects)
+
+    def test_ranged_reader_streams_the_object_in_order(self):
+        self.s3.objects[("bucket", "key")] = self.payload
+        reader = io.BufferedReader(
+            S3_Ranged_Reader(self.s3, "bucket", "key", part_size=1000, max_concurrency=4), buffer_size=333
+        )
+
+        chunks = []
+        while True:
+            chunk = reader.read(333)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        reader.close()
+
+        self.assertEqual(b"".join(chunks), self.payload)
+        self.assertEqual(self.s3.calls.count("get_object"), 11)
+        self.assertLessEqual(self.s3.max_in_flight, 4)
+
+    def test_download_spills_to_a_mapped_file(self):
+        self.s3.objects[("bucket", "key")] = self.payload
+
+        with download_to_mapped_file(self.s3, "bucket", "key", part_size=1000, max_concurrency=4) as mapped:
+            self.assertEqual(mapped.size, len(self.payload))
+            self.assertEqual(mapped.data[:], self.payload)
+            self.assertEqual(mapped.data[5000:5010], self.payload[5000:5010])
+        self.assertEqual(mapped.data, b"")
+
+    def test_download_of_an_empty_object(self):
+        self.s3.objects[("bucket", "key")] = b""
+
+        with download_to_mapped_file(self.s3, "bucket", "key") as mapped:
+            self.assertEqual(mapped.data, b"")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+from helpers.process_pool_helper import available_cpus, shutdown_process_pool
+from helpers.task_registry_helper import Task_Registry, task_registry
+import process_task
+
+
+@task_registry.task("TEST_PROCESS_POOL", executor="process")
+def report_worker(source_event, aws_clients):
+    if source_event.get("fail"):
+        raise Exception("asked to fail")
+    return {"pid": os.getpid(), "square": source_event["n"] ** 2, "built_clients": sorted(aws_clients)}
+
+
+class TestAvailableCpus(unittest.TestCase):
+    def write(self, directory, name, content):
+        path = os.path.join(directory, name)
+        with open(path, "w") as cgroup_file:
+            cgroup_file.write(content)
+        return path
+
+    def test_cgroup_v2_quota_limits_the_count(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cpu_max = self.write(directory, "cpu.max", "100000 100000\n")
+            self.assertEqual(available_cpus(cpu_max, "/missing", "/missing"), 1)
+
+    def test_cgroup_v1_quota_is_read_when_v2_is_unlimited(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cpu_max = self.write(directory, "cpu.max", "max 100000\n")
+            quota = self.write(directory, "quota", "50000\n")
+            period = self.write(directory, "period", "100000\n")
+            self.assertEqual(available_cpus(cpu_max, quota, period), 1)
+
+    def test_without_a_quota_the_schedulable_cpus_are_used(self):
+        self.assertEqual(available_cpus("/missing", "/missing", "/missing"), len(os.sched_getaffinity(0)))
+
+
+class TestTaskRegistry(unittest.TestCase):
+    def test_registration_and_lookup(self):
+        registry = Task_Registry()
+        registry.register("A", report_worker)
+
+        self.assertEqual(registry.get("A")["executor"], "thread")
+        self.assertEqual(registry.get("A")["module"], __name__)
+        self.assertIsNone(registry.get("B"))
+        with self.assertRaises(ValueError):
+            registry.register("A", report_worker)
+        with self.assertRaises(ValueError):
+            registry.register("C", report_worker, executor="gpu")
+
+    def test_unregistered_task_fails_each_record(self):
+        results = process_task.process_source_events("UNKNOWN", [{"n": 1}], {})
+
+        self.assertEqual(results[0]["outcome"], "error")
+        self.assertIn("Task not matched", results[0]["error"])
+
+
+@task_registry.task("TEST_THREADED_MYSQL")
+def record_mysql_client(source_event, aws_clients):
+    time.sleep(0.05)
+    return {"thread": threading.get_ident(), "mysql": id(aws_clients["mysql_client"]), "s3": id(aws_clients["s3_client"])}
+
+
+class TestThreadedTasks(unittest.TestCase):
+    def test_each_thread_opens_its_own_mysql_connection(self):
+        opened = []
+
+        def open_mysql_client(*args):
+            opened.append(MagicMock(name=f"mysql_client_{len(opened)}"))
+            return opened[-1]
+
+        shared_mysql_client = MagicMock(name="shared_mysql_client")
+        aws_clients = {"mysql_client": shared_mysql_client, "s3_client": MagicMock(), "secrets_manager_client": None}
+
+        with patch("static.aws_clients.AwsClients.mysql_client", side_effect=open_mysql_client):
+            results = process_task.process_source_events(
+                "TEST_THREADED_MYSQL", [{"n": n} for n in range(6)], aws_clients, parallelism=3
+            )
+
+        values = [result["value"] for result in results]
+        mysql_by_thread = {value["thread"]: value["mysql"] for value in values}
+        self.assertEqual(sorted(mysql_by_thread.values()), sorted(id(client) for client in opened))
+        self.assertEqual({value["s3"] for value in values}, {id(aws_clients["s3_client"])})
+        for client in opened:
+            client.close_connection.assert_called_once()
+        shared_mysql_client.close_connection.assert_not_called()
+
+
+class TestProcessPoolEngine(unittest.TestCase):
+    def tearDown(self):
+        shutdown_process_pool()
+
+    def test_work_units_run_in_pool_processes_with_lazy_clients(self):
+        source_events = [{"n": n} for n in range(6)] + [{"fail": True}]
+        aws_clients = MagicMock()
+
+        results = process_task.process_source_events("TEST_PROCESS_POOL", source_events, aws_clients, pool_size=2)
+
+        self.assertEqual([result["source_event"] for result in results], source_events)
+        self.assertEqual([result["value"]["square"] for result in results[:6]], [n**2 for n in range(6)])
+        self.assertEqual(results[6]["outcome"], "error")
+        self.assertEqual(results[6]["error"], "asked to fail")
+        for result in results[:6]:
+            self.assertNotEqual(result["value"]["pid"], os.getpid())
+            # Because no work unit read a client, no pool process opened a mysql connection
+            self.assertEqual(result["value"]["built_clients"], [])
+        aws_clients.__getitem__.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+from helpers.work_queue_helper import File_Work_Queue, Memory_Work_Queue, Sqs_Work_Queue
+from helpers.worker_helper import Worker
+import process_task
+
+
+class TestWorker(unittest.TestCase):
+    def test_items_are_processed_with_shared_clients_until_idle(self):
+        work_queue = Memory_Work_Queue()
+        work_queue.send({"TASK": "EXAMPLE", "SOURCE_EVENT": '{"id": 1}'})
+        work_queue.send({"TASK": "EXAMPLE", "SOURCE_EVENTS": [{"id": 2}, {"id": 3}]})
+        work_queue.send({"TASK": "UNKNOWN", "SOURCE_EVENT": {"id": 4}})
+        aws_clients = {"mysql_client": MagicMock(), "s3_client": MagicMock()}
+        seen = []
+
+        def fake_process_task(TASK, source_event, clients):
+            if TASK != "EXAMPLE":
+                raise Exception("unknown task")
+            self.assertIs(clients, aws_clients)
+            seen.append(source_event["id"])
+
+        with patch.object(process_task, "process_task", side_effect=fake_process_task):
+            worker = Worker(
+                work_queue,
+                lambda item: process_task.process_work_item(item, aws_clients),
+                idle_timeout_seconds=0.2,
+                wait_seconds=0.05,
+            )
+            started_at = time.monotonic()
+            counts = worker.run()
+
+        self.assertEqual(counts, {"processed": 2, "failed": 1, "returned": 0})
+        self.assertEqual(sorted(seen), [1, 2, 3])
+        self.assertEqual(len(work_queue.acked), 2)
+        self.assertEqual(len(work_queue.failed), 1)
+        self.assertLess(time.monotonic() - started_at, 1)
+
+    def test_stop_returns_unstarted_items(self):
+        work_queue = Memory_Work_Queue()
+        for index in range(3):
+            work_queue.send({"index": index})
+        worker = Worker(work_queue, lambda item: worker.stop(), idle_timeout_seconds=5, wait_seconds=0.05, max_items=3)
+
+        counts = worker.run()
+
+        self.assertEqual(counts, {"processed": 1, "failed": 0, "returned": 2})
+        self.assertEqual(len(work_queue.receive(10, 0)), 2)
+
+
+    def test_visibility_is_extended_while_items_are_held(self):
+        work_queue = Memory_Work_Queue()
+        work_queue.heartbeat_seconds = 0.02
+        extended = []
+        work_queue.extend = lambda item: extended.append((item.body["n"], time.monotonic()))
+        acked_at = {}
+        work_queue.ack = lambda item: acked_at.setdefault(item.body["n"], time.monotonic())
+        work_queue.send({"n": 1})
+        work_queue.send({"n": 2})
+
+        worker = Worker(
+            work_queue, lambda item: time.sleep(0.1), idle_timeout_seconds=0.15, wait_seconds=0.05, max_items=2
+        )
+        worker.run()
+
+        # the second item is kept hidden while it waits behind the first, and nothing is extended once acked
+        self.assertGreaterEqual(len([n for n, _ in extended if n == 2]), 4)
+        self.assertTrue(all(at < acked_at[n] for n, at in extended))
+        self.assertEqual(sorted(acked_at), [1, 2])
+
+
+class TestSqsWorkQueue(unittest.TestCase):
+    def test_messages_are_received_and_extended_with_the_visibility_timeout(self):
+        sqs_client = MagicMock(name="sqs_client")
+        sqs_client.receive_message.return_value = {
+            "Messages": [{"MessageId": "m-1", "Body": '{"TASK": "EXAMPLE"}', "ReceiptHandle": "r-1"}]
+        }
+        work_queue = Sqs_Work_Queue(sqs_client, "queue-url", visibility_timeout_seconds=30)
+
+        (item,) = work_queue.receive(1, 20)
+        work_queue.extend(item)
+
+        self.assertEqual(work_queue.heartbeat_seconds, 10)
+        self.assertEqual(sqs_client.receive_message.call_args.kwargs["VisibilityTimeout"], 30)
+        sqs_client.change_message_visibility.assert_called_once_with(
+            QueueUrl="queue-url", ReceiptHandle="r-1", VisibilityTimeout=30
+        )
+
+
+class TestFileWorkQueue(unittest.TestCase):
+    def test_items_are_claimed_once_and_acked_or_parked(self):
+        with tempfile.TemporaryDirectory() as directory:
+            work_queue = File_Work_Queue(directory, poll_seconds=0.01)
+            work_queue.send({"n": 1})
+            work_queue.send({"n": 2})
+
+            first, second = work_queue.receive(2, 0)
+            self.assertEqual([first.body, second.body], [{"n": 1}, {"n": 2}])
+            self.assertEqual(work_queue.receive(2, 0.05), [])
+
+            work_queue.ack(first)
+            work_queue.fail(second)
+            self.assertEqual([name for name in os.listdir(directory)], [f"{second.item_id}.json.failed"])
+
+    def test_receive_waits_for_an_item(self):
+        with tempfile.TemporaryDirectory() as directory:
+            work_queue = File_Work_Queue(directory, poll_seconds=0.01)
+            threading.Timer(0.05, lambda: work_queue.send({"late": True})).start()
+
+            items = work_queue.receive(1, 1)
+
+            self.assertEqual([item.body for item in items], [{"late": True}])
+
+
+if __name__ == "__main__":
+    unittest.main()